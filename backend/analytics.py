@@ -0,0 +1,203 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, Float, Integer, case, cast, func, null, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from backend.extensions import db
+from backend.lazy import LazyModule
+from backend.models import Department, Doctor, Patient
+
+np = LazyModule('numpy')  # Imported on first use, not at startup
+
+
+class seconds_between(FunctionElement):
+    """Number of seconds from the first to the second datetime expression, computed by the database."""
+    type = Float()
+    name = 'seconds_between'
+    inherit_cache = True
+
+
+@compiles(seconds_between)
+def _seconds_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'EXTRACT(EPOCH FROM (%s - %s))' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(seconds_between, 'sqlite')
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return '((julianday(%s) - julianday(%s)) * 86400.0)' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(seconds_between, 'mysql')
+def _seconds_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'TIMESTAMPDIFF(MICROSECOND, %s, %s) / 1000000.0' % (compiler.process(start, **kw), compiler.process(end, **kw))
+
+
+class hour_of_week(FunctionElement):
+    """Hour of the week (0 = Monday 00:00 .. 167) of a datetime expression, computed by the database."""
+    type = Integer()
+    name = 'hour_of_week'
+    inherit_cache = True
+
+
+@compiles(hour_of_week)
+def _hour_of_week_default(element, compiler, **kw):
+    ts = compiler.process(list(element.clauses)[0], **kw)
+    return 'CAST((EXTRACT(ISODOW FROM %s) - 1) * 24 + EXTRACT(HOUR FROM %s) AS INTEGER)' % (ts, ts)
+
+
+@compiles(hour_of_week, 'sqlite')
+def _hour_of_week_sqlite(element, compiler, **kw):
+    ts = compiler.process(list(element.clauses)[0], **kw)
+    return "((CAST(strftime('%%w', %s) AS INTEGER) + 6) %% 7 * 24 + CAST(strftime('%%H', %s) AS INTEGER))" % (ts, ts)
+
+
+@compiles(hour_of_week, 'mysql')
+def _hour_of_week_mysql(element, compiler, **kw):
+    ts = compiler.process(list(element.clauses)[0], **kw)
+    return '(WEEKDAY(%s) * 24 + HOUR(%s))' % (ts, ts)
+
+
+def _waiting_figures():
+    """Waiting count, first/last arrival and mean arrival interval, to be grouped by department."""
+    first_arrival = func.min(Patient.arrival_time)
+    last_arrival = func.max(Patient.arrival_time)
+    waiting_count = func.count(Patient.id)
+    return (
+        waiting_count.label('waiting_patients'),
+        first_arrival.label('first_arrival'),
+        last_arrival.label('last_arrival'),
+        # The mean gap between sorted arrivals telescopes to (last - first) / (n - 1)
+        case(
+            (waiting_count > 1, seconds_between(first_arrival, last_arrival) / (waiting_count - 1)),
+            else_=None
+        ).label('mean_arrival_interval')
+    )
+
+
+def department_queue_stats(department_ids: Optional[Iterable[int]] = None,
+                           departments: Optional[Sequence[Tuple[int, str]]] = None) -> List[Dict[str, Any]]:
+    """Doctors on duty, waiting count and arrival-interval statistics per department in one query.
+
+    Covers every department unless ``department_ids`` narrows it down. Given ``departments`` as
+    (id, name) pairs, e.g. from the reference cache, the department table is not read at all.
+    """
+    if departments is not None:
+        return _cached_department_stats(departments, department_ids)
+
+    doctors = db.select(
+        Doctor.department_id,
+        func.count(Doctor.id).label('available_doctors')
+    ).where(Doctor.is_available == True).group_by(Doctor.department_id).subquery()
+
+    waiting = db.select(Patient.department_id, *_waiting_figures()) \
+        .where(Patient.status == 'Waiting').group_by(Patient.department_id).subquery()
+
+    query = (
+        db.select(
+            Department.id,
+            Department.name,
+            func.coalesce(doctors.c.available_doctors, 0).label('available_doctors'),
+            func.coalesce(waiting.c.waiting_patients, 0).label('waiting_patients'),
+            waiting.c.first_arrival,
+            waiting.c.last_arrival,
+            waiting.c.mean_arrival_interval
+        )
+        .outerjoin(doctors, doctors.c.department_id == Department.id)
+        .outerjoin(waiting, waiting.c.department_id == Department.id)
+        .order_by(Department.id)
+    )
+    if department_ids is not None:
+        query = query.where(Department.id.in_(list(department_ids)))
+    rows = db.session.execute(query).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def _cached_department_stats(departments: Sequence[Tuple[int, str]],
+                             department_ids: Optional[Iterable[int]]) -> List[Dict[str, Any]]:
+    """``department_queue_stats`` for known departments: doctor and waiting figures come back as one
+    UNION ALL (doctor rows have no waiting figures and vice versa) and are merged here."""
+    if department_ids is not None:
+        wanted = set(department_ids)
+        departments = [(id_, name) for id_, name in departments if id_ in wanted]
+    ids = [id_ for id_, _ in departments]
+    if not ids:
+        return []
+
+    no_time = cast(null(), DateTime)
+    combined = union_all(
+        db.select(Doctor.department_id, func.count(Doctor.id), cast(null(), Integer), no_time, no_time, cast(null(), Float))
+        .where(Doctor.is_available == True, Doctor.department_id.in_(ids)).group_by(Doctor.department_id),
+        db.select(Patient.department_id, null(), *_waiting_figures())
+        .where(Patient.status == 'Waiting', Patient.department_id.in_(ids)).group_by(Patient.department_id)
+    )
+    stats = {id_: {'id': id_, 'name': name, 'available_doctors': 0, 'waiting_patients': 0, 'first_arrival': None,
+                   'last_arrival': None, 'mean_arrival_interval': None} for id_, name in sorted(departments)}
+    for department_id, doctors, waiting, first, last, interval in db.session.execute(combined):
+        row = stats.get(department_id)
+        if row is None:
+            continue
+        if doctors is not None:
+            row['available_doctors'] = doctors
+        else:
+            row.update(waiting_patients=waiting, first_arrival=first, last_arrival=last, mean_arrival_interval=interval)
+    return list(stats.values())
+
+
+def daily_department_counts(start: datetime) -> List[Dict[str, Any]]:
+    """Patient arrivals per (day, department) since ``start``, grouped in the database."""
+    day = func.date(Patient.arrival_time)
+    rows = db.session.execute(
+        db.select(
+            day.label('day'),
+            Department.name.label('department'),
+            func.count(Patient.id).label('patients')
+        )
+        .join(Department, Department.id == Patient.department_id)
+        .where(Patient.arrival_time >= start)
+        .group_by(day, Department.name)
+        .order_by(day)
+    ).all()
+    return [{'day': str(row.day), 'department': row.department, 'patients': row.patients} for row in rows]
+
+
+def hour_of_week_counts(start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Patient arrivals per (department, hour of the week) in ``[start, end)``, grouped in the database."""
+    hour = hour_of_week(Patient.arrival_time)
+    rows = db.session.execute(
+        db.select(Patient.department_id, hour.label('hour'), func.count(Patient.id).label('patients'))
+        .where(Patient.arrival_time >= start, Patient.arrival_time < end)
+        .group_by(Patient.department_id, hour)
+    ).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def flow_statistics(counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-column statistics of a (days x departments) count matrix.
+
+    Days without arrivals for a department are NaN and excluded, and the trend is the least-squares
+    slope over the department's observed days in order.
+    """
+    observed = ~np.isnan(counts)
+    n = observed.sum(axis=0)
+    x = np.where(observed, np.cumsum(observed, axis=0) - 1, 0)
+    y = np.where(observed, counts, 0)
+
+    sum_x, sum_y = x.sum(axis=0), y.sum(axis=0)
+    denominator = n * (x * x).sum(axis=0) - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trend = np.where(denominator > 0, (n * (x * y).sum(axis=0) - sum_x * sum_y) / denominator, 0.0)
+
+    return {
+        'mean': np.nanmean(counts, axis=0),
+        'median': np.nanmedian(counts, axis=0),
+        'std_dev': np.nanstd(counts, axis=0),
+        'min': np.nanmin(counts, axis=0),
+        'max': np.nanmax(counts, axis=0),
+        'trend': trend
+    }
@@ -1,53 +1,123 @@
 from __future__ import annotations
 import os
-import math
 import logging
-import numpy as np
-import requests
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from queue import PriorityQueue
+from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter, defaultdict
 from dataclasses import dataclass
 
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Flask, Response, send_from_directory, jsonify, request, stream_with_context
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import check_password_hash
 from werkzeug.exceptions import HTTPException
-from marshmallow import Schema, fields, validate
+from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load, validate
 from sqlalchemy import func
 from sqlalchemy.orm import Mapped, relationship
 
+from backend import analytics, beds, broadcast, cache, compression, database, estimators, expenses, flow, identity, metrics, migrations, pagination, queueing, rollups, rooms, routes, scheduler, serialization, simulation, snapshot, stock, triage
+from backend.config import Config
 from backend.extensions import db
-from backend.models import User, Department, Patient, Doctor, Bed, Inventory, City, Hospital, OPDQueue, Expense, Medicine
+from backend.lazy import LazyModule
+from backend.models import User, Department, Patient, Doctor, Bed, City, Hospital, OPDQueue, Expense, Medicine, StockMovement
+
+np = LazyModule('numpy')  # Imported on first use, not at startup
 
 # Create the Flask application
-def create_app():
+def create_app(config: Optional[Dict[str, Any]] = None):
+    """Build a new app and its SocketIO; ``config`` overrides app config before anything is set up."""
     app = Flask(__name__, static_folder='../frontend/build/static', static_url_path='/static')  # Adjust if needed
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///swasthyaflow.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.secret_key = 'your_secret_key_here'
+    app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = Config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.secret_key = Config.SECRET_KEY
+    app.config['STORAGE_PROFILE'] = Config.STORAGE_PROFILE
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = Config.SQLITE_BUSY_TIMEOUT_MS
+    app.config['SQLITE_MMAP_SIZE'] = Config.SQLITE_MMAP_SIZE
+    app.config['DB_POOL_SIZE'] = Config.DB_POOL_SIZE
+    app.config['DB_MAX_OVERFLOW'] = Config.DB_MAX_OVERFLOW
+    app.config['DB_POOL_RECYCLE'] = Config.DB_POOL_RECYCLE
+    app.config['BROADCAST_TICK_SECONDS'] = Config.BROADCAST_TICK_SECONDS
+    app.config['WAIT_TIME_CHANGE_THRESHOLD'] = Config.WAIT_TIME_CHANGE_THRESHOLD
+    app.config['MAX_PATIENT_BATCH'] = Config.MAX_PATIENT_BATCH
+    app.config['MAX_STOCK_MOVEMENT_BATCH'] = Config.MAX_STOCK_MOVEMENT_BATCH
+    app.config['THREAD_POOL_WORKERS'] = Config.THREAD_POOL_WORKERS
+    app.config['WORK_QUEUE_LIMIT'] = Config.WORK_QUEUE_LIMIT
+    app.config['SIMULATION_WORKERS'] = Config.SIMULATION_WORKERS
+    app.config['SIMULATION_CACHE_SIZE'] = Config.SIMULATION_CACHE_SIZE
+    app.config['SIMULATION_MAX_REPLICATIONS'] = Config.SIMULATION_MAX_REPLICATIONS
+    app.config['METRICS_QUERY_WARN_THRESHOLD'] = Config.METRICS_QUERY_WARN_THRESHOLD
+    app.config['REFERENCE_CACHE_TTL_SECONDS'] = Config.REFERENCE_CACHE_TTL_SECONDS
+    app.config['REFERENCE_CACHE_MAX_ENTRIES'] = Config.REFERENCE_CACHE_MAX_ENTRIES
+    app.config['USER_CACHE_TTL_SECONDS'] = Config.USER_CACHE_TTL_SECONDS
+    app.config['USER_CACHE_MAX_ENTRIES'] = Config.USER_CACHE_MAX_ENTRIES
+    app.config['COMPRESSION_MIN_BYTES'] = Config.COMPRESSION_MIN_BYTES
+    app.config['COMPRESSION_GZIP_LEVEL'] = Config.COMPRESSION_GZIP_LEVEL
+    app.config['COMPRESSION_BROTLI_QUALITY'] = Config.COMPRESSION_BROTLI_QUALITY
+    app.config['AUTO_MIGRATE'] = Config.AUTO_MIGRATE
+    app.config.update(config or {})
 
     db.init_app(app)
-    socketio = SocketIO(app, cors_allowed_origins="*")  # Create an instance of SocketIO
+    serialization.init_app(app)
+    # Packets share the HTTP encoder; polling payloads over the threshold are compressed by Engine.IO
+    socketio = SocketIO(app, cors_allowed_origins="*", json=serialization, http_compression=True,
+                        compression_threshold=app.config['COMPRESSION_MIN_BYTES'])
     CORS(app)
 
+    # Latency, SQL and emit counters for every request and socket event, served at /metrics
+    app_metrics = metrics.Metrics(query_warn_threshold=app.config['METRICS_QUERY_WARN_THRESHOLD'])
+    app_metrics.init_app(app)
+    app_metrics.init_socketio(socketio)
+    with app.app_context():
+        app_metrics.install_engine(db.engine)
+
+    # Registered after the metrics hooks, so request latency includes compression time
+    compression.Compressor(min_size=app.config['COMPRESSION_MIN_BYTES'], gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+                           brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'], metrics=app_metrics).init_app(app)
+
+    # Cities, hospitals and departments change a few times a day; reads come from here
+    reference_cache = cache.ReferenceCache(ttl=app.config['REFERENCE_CACHE_TTL_SECONDS'],
+                                           max_entries=app.config['REFERENCE_CACHE_MAX_ENTRIES'], metrics=app_metrics)
+    reference_cache.init_app(app)
+
+    def departments():
+        """(id, name) of every department, from the reference cache."""
+        return reference_cache.get('departments', 'all', lambda: [
+            tuple(row) for row in db.session.execute(db.select(Department.id, Department.name)).all()])
+
     # Configure logging
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
-    # Thread pool for concurrent processing
-    thread_pool = ThreadPoolExecutor(max_workers=4)
+    # Socket events that write to the database run here: bounded, ordered per key, one app context per task
+    work_scheduler = scheduler.WorkScheduler(app, workers=app.config['THREAD_POOL_WORKERS'],
+                                             max_pending=app.config['WORK_QUEUE_LIMIT'], metrics=app_metrics)
+    app.extensions['work_scheduler'] = work_scheduler
+
+    # Per-department arrival/service rate estimates, updated on patient events
+    rate_store = estimators.RateEstimatorStore()
+
+    # Dashboard figures served to new connections without touching the database
+    dashboard = snapshot.DashboardSnapshot()
+    dashboard.init_app(app)
+
+    # Triage queue persisted in the database, indexed by in-memory heaps
+    patient_queue = triage.TriageQueue()
+
+    # Free-bed counters and free lists per department
+    bed_allocator = beds.BedAllocator()
+
+    # What-if simulations run in a process pool, results cached by scenario hash
+    simulator = simulation.Simulator(workers=app.config['SIMULATION_WORKERS'], cache_size=app.config['SIMULATION_CACHE_SIZE'])
 
     login_manager = LoginManager()
     login_manager.init_app(app)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Logged-in users are reloaded from here on each request, not from the database
+    user_cache = identity.UserCache(ttl=app.config['USER_CACHE_TTL_SECONDS'],
+                                    max_entries=app.config['USER_CACHE_MAX_ENTRIES'], metrics=app_metrics)
+    user_cache.init_app(app, login_manager)
 
     @app.route('/login', methods=['POST'])
     def login():
@@ -72,125 +142,60 @@ def create_app():
             return jsonify({'error': 'Access denied'}), 403
         return jsonify({'message': 'Welcome, staff member!'})
 
-    class QueuingModel:
-        def __init__(self, num_doctors: int, num_beds: int, arrival_rate: float, service_rate: float):
-            self.num_doctors = num_doctors
-            self.num_beds = num_beds
-            self.arrival_rate = arrival_rate
-            self.service_rate = service_rate
-
-        def calculate_wait_time(self) -> float:
-            rho = self.arrival_rate / (self.num_doctors * self.service_rate)
-            if rho >= 1:
-                return float('inf')  # System is unstable
-            
-            p0 = 1 / (sum([
-                (self.num_doctors * rho) ** n / math.factorial(n)
-                for n in range(self.num_doctors)
-            ]) + (self.num_doctors * rho) ** self.num_doctors / (
-                math.factorial(self.num_doctors) * (1 - rho)
-            ))
-            
-            lq = (p0 * (self.num_doctors * rho) ** self.num_doctors * rho) / (
-                math.factorial(self.num_doctors) * (1 - rho) ** 2
-            )
-            
-            wq = lq / self.arrival_rate
-            return wq * 60  # Convert to minutes
-
-        def calculate_utilization(self) -> float:
-            return self.arrival_rate / (self.num_doctors * self.service_rate)
-
-        def calculate_probability_of_waiting(self) -> float:
-            rho = self.arrival_rate / (self.num_doctors * self.service_rate)
-            if rho >= 1:
-                return 1.0  # System is unstable
-            
-            p0 = 1 / (sum([
-                (self.num_doctors * rho) ** n / math.factorial(n)
-                for n in range(self.num_doctors)
-            ]) + (self.num_doctors * rho) ** self.num_doctors / (
-                math.factorial(self.num_doctors) * (1 - rho)
-            ))
-            
-            return (self.num_doctors * rho) ** self.num_doctors * p0 / (
-                math.factorial(self.num_doctors) * (1 - rho)
-            )
-
     @app.route('/api/queue_data')
     def get_queue_data() -> Dict[str, Any]:
         """API endpoint to get queue data for all departments."""
-        departments = db.session.execute(db.select(Department)).scalars().all()
-        queue_data = []
-
-        for dept in departments:
-            num_doctors = db.session.execute(db.select(func.count(Doctor.id)).filter_by(department_id=dept.id, is_available=True)).scalar()
-            patients = db.session.execute(db.select(Patient).filter_by(department_id=dept.id, status='Waiting')).scalars().all()
-            num_patients = len(patients)
-            
-            if num_doctors > 0 and num_patients > 0:
-                arrival_times = [p.arrival_time for p in patients]
-                arrival_intervals = np.diff([t.timestamp() for t in arrival_times])
-                arrival_rate = 1 / np.mean(arrival_intervals) if len(arrival_intervals) > 0 else 0
-                
-                service_rate = 1 / 15  # Assume average service time of 15 minutes
-                
-                model = QueuingModel(num_doctors, 0, arrival_rate, service_rate)
-                wait_time = model.calculate_wait_time()
-                utilization = model.calculate_utilization()
-                prob_of_waiting = model.calculate_probability_of_waiting()
-            else:
-                wait_time = 0
-                utilization = 0
-                prob_of_waiting = 0
-
-            queue_data.append({
-                'department': dept.name,
-                'waiting_patients': num_patients,
-                'available_doctors': num_doctors,
-                'estimated_wait_time': round(wait_time, 2),
-                'utilization': round(utilization, 2),
-                'probability_of_waiting': round(prob_of_waiting, 2)
-            })
+        stats = analytics.department_queue_stats(departments=departments())
+
+        arrival_rates, service_rates = rate_store.rates([row['id'] for row in stats])
+        for i, row in enumerate(stats):
+            if row['available_doctors'] == 0:
+                arrival_rates[i] = 0
+            elif not rate_store.has_estimate(row['id']) and row['mean_arrival_interval']:
+                arrival_rates[i] = 60 / row['mean_arrival_interval']  # Cold start: patients per minute from the queue itself
+        scores = queueing.engine.batch([row['available_doctors'] for row in stats], arrival_rates, service_rates)
+        queue_data = [{
+            'department': row['name'],
+            'waiting_patients': row['waiting_patients'],
+            'available_doctors': row['available_doctors'],
+            'estimated_wait_time': round(scores.wait_time[i], 2),
+            'utilization': round(scores.utilization[i], 2),
+            'probability_of_waiting': round(scores.probability_of_waiting[i], 2)
+        } for i, row in enumerate(stats)]
 
         return jsonify(queue_data)
 
-    def simple_trend(x, y):
-        n = len(x)
-        sum_x = sum(x)
-        sum_y = sum(y)
-        sum_xy = sum(x[i] * y[i] for i in range(n))
-        sum_xx = sum(x[i] ** 2 for i in range(n))
-        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
-        return slope
+    FLOW_WINDOWS = (7, 30, 90)
 
     @app.route('/api/patient_flow')
     def get_patient_flow() -> Dict[str, Any]:
-        """API endpoint to get patient flow data for the last 7 days."""
-        start_date = datetime.utcnow() - timedelta(days=7)
-        patients = db.session.execute(db.select(Patient).filter(Patient.arrival_time >= start_date)).scalars().all()
-
-        daily_flow = defaultdict(lambda: defaultdict(int))
-        for patient in patients:
-            day = patient.arrival_time.date()
-            dept = db.session.get(Department, patient.department_id).name
-            daily_flow[str(day)][dept] += 1
-
-        # Calculate statistics
-        dept_totals = defaultdict(list)
-        for day_data in daily_flow.values():
-            for dept, count in day_data.items():
-                dept_totals[dept].append(count)
+        """API endpoint to get patient flow data for the last 7, 30 or 90 days."""
+        days = request.args.get('days', 7, type=int)
+        if days not in FLOW_WINDOWS:
+            return jsonify({'error': f'days must be one of {list(FLOW_WINDOWS)}'}), 400
+
+        start_date = datetime.utcnow() - timedelta(days=days)
+        rows = analytics.daily_department_counts(start_date)
+
+        daily_flow = defaultdict(dict)
+        for row in rows:
+            daily_flow[row['day']][row['department']] = row['patients']
 
+        # Calculate statistics over a (days x departments) matrix in one pass
+        day_labels = list(daily_flow)
+        dept_names = sorted({row['department'] for row in rows})
         statistics = {}
-        for dept, counts in dept_totals.items():
-            statistics[dept] = {
-                'mean': sum(counts) / len(counts),
-                'median': sorted(counts)[len(counts) // 2],
-                'std_dev': (sum((x - (sum(counts) / len(counts))) ** 2 for x in counts) / len(counts)) ** 0.5,
-                'min': min(counts),
-                'max': max(counts),
-                'trend': simple_trend(range(len(counts)), counts)
+        if rows:
+            counts = np.full((len(day_labels), len(dept_names)), np.nan)
+            day_index = {day: i for i, day in enumerate(day_labels)}
+            dept_index = {dept: j for j, dept in enumerate(dept_names)}
+            for row in rows:
+                counts[day_index[row['day']], dept_index[row['department']]] = row['patients']
+
+            stats = analytics.flow_statistics(counts)
+            statistics = {
+                dept: {name: float(values[j]) for name, values in stats.items()}
+                for j, dept in enumerate(dept_names)
             }
 
         return jsonify({
@@ -198,125 +203,399 @@ def create_app():
             'statistics': statistics
         })
 
-    @app.route('/api/update_inventory', methods=['POST'])
-    def update_inventory() -> Dict[str, Any]:
-        """API endpoint to update inventory."""
-        data = request.json
-        medicine_count = data.get('medicines')
-        consumables_count = data.get('consumables')
-        
-        inventory = db.session.execute(db.select(Inventory).limit(1)).scalar_one_or_none()
-        if inventory:
-            inventory.medicines = medicine_count
-            inventory.consumables = consumables_count
-            db.session.commit()
-            return jsonify({"message": "Inventory updated successfully"}), 200
-        else:
-            return jsonify({"error": "Inventory not found"}), 404
+    class StockMovementSchema(Schema):
+        class Meta:
+            unknown = EXCLUDE
+
+        hospital_id = fields.Int(required=True)
+        item_name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+        delta = fields.Int(required=True)
+        unit_price = fields.Float(validate=validate.Range(min=0))
+        reason = fields.Str(validate=validate.Length(max=50))
+        reference = fields.Str(validate=validate.Length(max=100))
+
+    stock_movements_schema = StockMovementSchema(many=True)
+
+    @app.route('/api/inventory/movements', methods=['POST'])
+    @app.route('/api/update_inventory', methods=['POST'])  # Old URL, new payload: see the check below
+    def post_stock_movements():
+        """API endpoint to apply a batch of stock movements (receipts, dispensing, adjustments) in one transaction."""
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict) and 'movements' not in payload and {'medicines', 'consumables'} & payload.keys():
+            # The old {medicines, consumables} totals never matched a column and were never stored
+            return jsonify({'error': 'The {medicines, consumables} payload was removed; '
+                                     'post {"movements": [{hospital_id, item_name, delta, ...}]} instead'}), 400
+        rows = payload.get('movements') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'error': 'Expected a non-empty list of movements'}), 400
+        if len(rows) > app.config['MAX_STOCK_MOVEMENT_BATCH']:
+            return jsonify({'error': f"At most {app.config['MAX_STOCK_MOVEMENT_BATCH']} movements per batch"}), 400
+        try:
+            movements = stock_movements_schema.load(rows)
+        except ValidationError as err:
+            return jsonify({'errors': err.messages}), 400
+
+        try:
+            quantities = stock.apply_movements(movements)
+        except stock.StockError as e:
+            return jsonify({'error': str(e), 'errors': e.errors}), 409
+
+        dashboard.adjust('inventory', consumables=sum(m['delta'] for m in movements))
+        items = stock.by_hospital(quantities)
+        for hospital_id, hospital_items in items.items():
+            rooms.publish(socketio, 'inventory_update', {'hospital_id': hospital_id, 'items': hospital_items},
+                          hospital_id=hospital_id)
+        return jsonify({'applied': len(movements), 'items': items})
+
+    @app.route('/api/inventory/movements', methods=['GET'])
+    def get_stock_movements():
+        """API endpoint to page through the stock ledger, optionally for one hospital and item."""
+        query = db.select(StockMovement.id, StockMovement.hospital_id, StockMovement.item_name, StockMovement.delta,
+                          StockMovement.quantity_after, StockMovement.reason, StockMovement.reference,
+                          StockMovement.created_at)
+        hospital_id = request.args.get('hospital_id', type=int)
+        if hospital_id is not None:
+            query = query.where(StockMovement.hospital_id == hospital_id)
+        if request.args.get('item_name'):
+            query = query.where(StockMovement.item_name == request.args['item_name'])
+        try:
+            return pagination.paginate(db.session, query, StockMovement.id, lambda m: {
+                'id': m.id,
+                'hospital_id': m.hospital_id,
+                'item_name': m.item_name,
+                'delta': m.delta,
+                'quantity_after': m.quantity_after,
+                'reason': m.reason,
+                'reference': m.reference,
+                'created_at': m.created_at.isoformat()
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
     @socketio.on('connect')
     def handle_connect():
         """Handle new WebSocket connections."""
         logger.info("New client connected")
-        emit_updates()
+        emit('dashboard_snapshot', dashboard.payload(), to=request.sid)
 
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle WebSocket disconnections."""
         logger.info("Client disconnected")
 
+    rooms.register_subscription_handlers(socketio)
+
+    # Cities, hospitals, patients, OPD queue, inventory and expenses per hospital, plus the /socket namespace
+    routes.init_app(app, socketio)
+
+    def schedule(event: str, key, task, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a socket event's work; when the queue is full, tell the sender when to retry."""
+        if work_scheduler.submit(key, task, data, request.sid):
+            return {'accepted': True}
+        retry_after = work_scheduler.retry_after()
+        logger.warning(f"Shedding {event}: background queue is full")
+        emit('busy', {'event': event, 'retry_after': retry_after}, to=request.sid)
+        return {'accepted': False, 'retry_after': retry_after}
+
     @socketio.on('new_patient')
     def handle_new_patient(data: Dict[str, Any]):
         """Handle new patient arrival."""
         try:
-            thread_pool.submit(process_new_patient, data)
+            return schedule('new_patient', ('department', data.get('department_id')), process_new_patient, data)
         except Exception as e:
             logger.error(f"Error submitting new patient task: {str(e)}")
-            socketio.emit('error', {'message': 'Failed to process new patient'})
+            socketio.emit('error', {'message': 'Failed to process new patient'}, to=request.sid)
 
-    def process_new_patient(data: Dict[str, Any]):
-        """Process new patient data in a separate thread."""
+    def process_new_patient(data: Dict[str, Any], sid: Optional[str] = None):
+        """Process new patient data on a scheduler worker."""
         try:
-            with app.app_context():
-                patient = Patient(name=data['name'], department_id=data['department_id'])
-                db.session.add(patient)
-                db.session.commit()
-
-                queue = db.session.execute(db.select(OPDQueue).order_by(OPDQueue.id.desc()).limit(1)).scalar_one_or_none()
-                if queue:
-                    queue.length += 1
-                else:
-                    queue = OPDQueue(length=1)
-                db.session.add(queue)
-                db.session.commit()
-
-                update_wait_times()
-                socketio.emit('patient_added', {'name': patient.name, 'department': patient.department.name})
+            patient = Patient(name=data['name'], hospital_id=data.get('hospital_id'), department_id=data['department_id'])
+            db.session.add(patient)
+            db.session.commit()
+            rate_store.record_arrival(patient.department_id, patient.arrival_time)
+            dashboard.adjust('queue', length=1)
+            rollups.enqueue(patient.id, patient.hospital_id)
+
+            wait_time_broadcaster.mark_dirty([patient.department_id])
+            rooms.publish(socketio, 'patient_added', {'name': patient.name, 'department': patient.department.name},
+                          hospital_id=patient.hospital_id, department_id=patient.department_id)
         except Exception as e:
             logger.error(f"Error processing new patient: {str(e)}")
-            socketio.emit('error', {'message': 'Failed to add new patient'})
+            socketio.emit('error', {'message': 'Failed to add new patient'}, to=sid)
+
+    class PatientRegistrationSchema(Schema):
+        class Meta:
+            unknown = EXCLUDE
+
+        name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+        hospital_id = fields.Int(required=True)
+        department_id = fields.Int(required=True)
+        age = fields.Int(validate=validate.Range(min=0, max=150))
+        gender = fields.Str(validate=validate.Length(max=10))
+        arrival_time = fields.DateTime()
+
+    registration_schema = PatientRegistrationSchema()
+
+    def batch_rows(payload) -> List[Dict[str, Any]]:
+        """Pull the patient list out of a batch payload, enforcing the batch size limit."""
+        rows = payload.get('patients') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list) or not rows:
+            raise ValueError('Expected a non-empty list of patients')
+        if len(rows) > app.config['MAX_PATIENT_BATCH']:
+            raise ValueError(f"At most {app.config['MAX_PATIENT_BATCH']} patients per batch")
+        return rows
+
+    def insert_patients(rows: List[Dict[str, Any]]) -> List[int]:
+        """Insert patients and return their ids in row order.
+
+        Drivers that return rows from an executemany (psycopg2) do it in one statement.
+        Elsewhere each row is its own INSERT and its id comes from the driver's lastrowid,
+        still within the one transaction; reading back "the newest N ids" would pick up
+        another worker's rows whenever inserts interleave.
+        """
+        if db.engine.dialect.insert_executemany_returning:
+            return list(db.session.execute(db.insert(Patient).returning(Patient.id), rows).scalars())
+        return [db.session.execute(db.insert(Patient), row).inserted_primary_key[0] for row in rows]
+
+    def register_patients(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Validate a batch of patients, then insert the valid ones and queue them in a single transaction."""
+        results, loaded = [], []
+        for index, row in enumerate(rows):
+            try:
+                loaded.append((index, registration_schema.load(row)))
+            except ValidationError as err:
+                results.append({'index': index, 'status': 'rejected', 'errors': err.messages})
+
+        # One lookup per referenced table instead of one per row
+        hospital_ids = set(db.session.execute(
+            db.select(Hospital.id).where(Hospital.id.in_({p['hospital_id'] for _, p in loaded}))).scalars())
+        department_ids = set(db.session.execute(
+            db.select(Department.id).where(Department.id.in_({p['department_id'] for _, p in loaded}))).scalars())
+
+        now = datetime.utcnow()
+        valid, created = [], []
+        for index, patient in loaded:
+            errors = {}
+            if patient['hospital_id'] not in hospital_ids:
+                errors['hospital_id'] = ['Unknown hospital.']
+            if patient['department_id'] not in department_ids:
+                errors['department_id'] = ['Unknown department.']
+            if errors:
+                results.append({'index': index, 'status': 'rejected', 'errors': errors})
+                continue
+            patient.setdefault('arrival_time', now)
+            patient['status'] = 'Waiting'
+            valid.append(patient)
+            created.append({'index': index, 'status': 'created'})
+
+        results.extend(created)
+        results.sort(key=lambda r: r['index'])
+        if not valid:
+            return results
 
-    @socketio.on('update_bed_status')
-    def handle_bed_status(data: Dict[str, Any]):
-        """Handle bed status update."""
-        thread_pool.submit(process_bed_status_update, data)
+        try:
+            # One executemany for the patients and one for their queue entries, committed together
+            for result, patient_id in zip(created, insert_patients(valid)):
+                result['patient_id'] = patient_id
+            rollups.enqueue_many([(result['patient_id'], patient['hospital_id']) for result, patient in zip(created, valid)])
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # One estimator update per department and arrival time rather than one per row
+        arrivals = Counter((p['department_id'], p['arrival_time']) for p in valid)
+        for (department_id, arrival_time), count in sorted(arrivals.items(), key=lambda item: item[0][1]):
+            rate_store.record_arrival(department_id, arrival_time, count=count)
+        dashboard.adjust('queue', length=len(valid))
+        wait_time_broadcaster.mark_dirty({patient['department_id'] for patient in valid})
+        for (hospital_id, department_id), count in Counter((p['hospital_id'], p['department_id']) for p in valid).items():
+            rooms.publish(socketio, 'patients_added', {'hospital_id': hospital_id, 'department_id': department_id, 'count': count},
+                          hospital_id=hospital_id, department_id=department_id)
+        return results
+
+    def batch_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        created = sum(1 for r in results if r['status'] == 'created')
+        return {'created': created, 'rejected': len(results) - created, 'results': results}
+
+    @app.route('/api/patients/batch', methods=['POST'])
+    def register_patient_batch():
+        """API endpoint to register many patients at once."""
+        try:
+            rows = batch_rows(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        summary = batch_summary(register_patients(rows))
+        return jsonify(summary), 201 if summary['created'] else 400
+
+    def batch_key(payload):
+        """A single-department batch queues behind that department's ``new_patient`` events; others run unordered."""
+        rows = payload.get('patients') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            return None
+        departments = {row.get('department_id') for row in rows if isinstance(row, dict)}
+        return ('department', departments.pop()) if len(departments) == 1 else None
 
-    def process_bed_status_update(data: Dict[str, Any]):
-        """Process bed status update in a separate thread."""
+    @socketio.on('new_patients_batch')
+    def handle_new_patients_batch(data: Dict[str, Any]):
+        """Handle a batch of patient arrivals."""
         try:
-            bed = db.session.execute(db.select(Bed).limit(1)).scalar_one_or_none()
-            if bed:
-                bed.available = data['available']
-                db.session.commit()
-                socketio.emit('bed_status_updated', {'available': bed.available, 'occupied': bed.total - bed.available}, broadcast=True)
+            return schedule('new_patients_batch', batch_key(data), process_new_patients_batch, data)
         except Exception as e:
-            logger.error(f"Error updating bed status: {str(e)}")
-            db.session.rollback()
+            logger.error(f"Error submitting patient batch task: {str(e)}")
+            socketio.emit('error', {'message': 'Failed to process patient batch'}, to=request.sid)
 
-    def emit_updates():
-        """Emit updates to all connected clients."""
+    def process_new_patients_batch(data: Dict[str, Any], sid: Optional[str] = None):
+        """Process a patient batch on a scheduler worker and report per-row results to the sender."""
         try:
-            queue = db.session.execute(db.select(OPDQueue).order_by(OPDQueue.id.desc()).limit(1)).scalar_one_or_none()
-            bed = db.session.execute(db.select(Bed).limit(1)).scalar_one_or_none()
-            inventory = db.session.execute(db.select(Inventory).limit(1)).scalar_one_or_none()
-            
-            socketio.emit('queue_update', {'length': queue.length if queue else 0})
-            socketio.emit('bed_update', {'available': bed.available if bed else 0})
-            socketio.emit('inventory_update', {
-                'medicines': inventory.medicines if inventory else 0,
-                'consumables': inventory.consumables if inventory else 0
-            })
+            summary = batch_summary(register_patients(batch_rows(data)))
+            socketio.emit('patients_batch_result', summary, to=sid)
+        except ValueError as e:
+            socketio.emit('error', {'message': str(e)}, to=sid)
+        except Exception as e:
+            logger.error(f"Error processing patient batch: {str(e)}")
+            socketio.emit('error', {'message': 'Failed to add patient batch'}, to=sid)
+
+    class PatientServedSchema(Schema):
+        class Meta:
+            unknown = EXCLUDE
+
+        patient_id = fields.Int(required=True)
+        # Fed straight into the service-time average, so zero, negative and NaN values are turned away
+        service_minutes = fields.Float(validate=validate.Range(min=0, min_inclusive=False))
+
+    patient_served_schema = PatientServedSchema()
+
+    @socketio.on('patient_served')
+    def handle_patient_served(data: Dict[str, Any]):
+        """Handle a completed consultation."""
+        try:
+            served = patient_served_schema.load(data or {})
+        except ValidationError as err:
+            emit('error', {'message': 'Invalid patient_served event', 'errors': err.messages}, to=request.sid)
+            return {'accepted': False, 'errors': err.messages}
+        return schedule('patient_served', ('patient', served['patient_id']), process_patient_served, served)
+
+    def process_patient_served(data: Dict[str, Any], sid: Optional[str] = None):
+        """Mark a patient as served, closing their queue entry, and feed the service time into the rate estimates."""
+        try:
+            patient_flow.complete(patient_id=data['patient_id'], service_minutes=data.get('service_minutes'))
         except Exception as e:
-            logger.error(f"Error emitting updates: {str(e)}")
+            logger.error(f"Error processing served patient: {str(e)}")
+            socketio.emit('error', {'message': 'Failed to mark patient as served'}, to=sid)
 
-    def update_wait_times():
-        """Recalculate and broadcast updated wait times."""
+    @socketio.on('update_bed_status')
+    def handle_bed_status(data: Dict[str, Any]):
+        """Handle bed status update."""
+        return schedule('update_bed_status', ('bed', data.get('bed_id')), process_bed_status_update, data)
+
+    def process_bed_status_update(data: Dict[str, Any], sid: Optional[str] = None):
+        """Process bed status update on a scheduler worker."""
         try:
-            departments = db.session.execute(db.select(Department)).scalars().all()
-            for dept in departments:
-                num_doctors = db.session.execute(db.select(func.count(Doctor.id)).filter_by(department_id=dept.id, is_available=True)).scalar()
-                num_patients = db.session.execute(db.select(func.count(Patient.id)).filter_by(department_id=dept.id, status='Waiting')).scalar()
-                
-                if num_doctors > 0:
-                    arrival_rate = num_patients / 60  # Assume patients arrived over the last hour
-                    service_rate = 1 / 15  # Assume average service time of 15 minutes
-                    
-                    model = QueuingModel(num_doctors, 0, arrival_rate, service_rate)
-                    wait_time = model.calculate_wait_time()
-                    
-                    socketio.emit('wait_time_updated', {'department': dept.name, 'wait_time': round(wait_time, 2)})
+            bed = db.session.get(Bed, data['bed_id'])
+            if not bed:
+                socketio.emit('error', {'message': 'Unknown bed'}, to=sid)
+                return
+            if data['available']:
+                changed = bed_allocator.release(bed.id)
+            else:
+                changed = bed_allocator.occupy(bed.id, data.get('patient_id'))
+            if changed:
+                by_department = bed_allocator.by_department()
+                dashboard.set('beds', available=sum(counts['available'] for counts in by_department.values()),
+                              occupied=sum(counts['occupied'] for counts in by_department.values()))
+                department = by_department.get(bed.department_id, {'total': 0, 'available': 0, 'occupied': 0})
+                rooms.publish(socketio, 'bed_status_updated', {'bed_id': bed.id, **department},
+                              hospital_id=data.get('hospital_id'), department_id=bed.department_id)
         except Exception as e:
-            logger.error(f"Error updating wait times: {str(e)}")
+            logger.error(f"Error updating bed status: {str(e)}")
+            socketio.emit('error', {'message': 'Failed to update bed status'}, to=sid)
+
+    def compute_wait_times(department_ids) -> Dict[int, Dict[str, Any]]:
+        """Recalculate wait times for the given departments; None for those without doctors on duty."""
+        with app.app_context():
+            stats = analytics.department_queue_stats(department_ids, departments())
+        staffed = [row for row in stats if row['available_doctors'] > 0]
+        arrival_rates, service_rates = rate_store.rates([row['id'] for row in staffed])
+
+        scores = queueing.engine.batch([row['available_doctors'] for row in staffed], arrival_rates, service_rates)
+        wait_times = {row['id']: {'department': row['name'], 'wait_time': None} for row in stats}
+        for i, row in enumerate(staffed):
+            wait_times[row['id']]['wait_time'] = round(float(scores.wait_time[i]), 2)
+        return wait_times
+
+    wait_time_broadcaster = broadcast.WaitTimeBroadcaster(
+        socketio, compute_wait_times,
+        tick=app.config['BROADCAST_TICK_SECONDS'],
+        threshold=app.config['WAIT_TIME_CHANGE_THRESHOLD'],
+        rooms_for=lambda department_id: rooms.targets(department_id=department_id)
+    )
+    wait_time_broadcaster.init_app(app)
+    patient_flow = flow.PatientFlow(socketio, rate_store, dashboard, wait_time_broadcaster)
+    patient_flow.init_app(app)
+
+    @app.route('/api/broadcast_stats')
+    def get_broadcast_stats():
+        return jsonify(wait_time_broadcaster.stats())
+
+    @app.route('/api/scheduler_stats')
+    def get_scheduler_stats():
+        return jsonify(work_scheduler.stats())
+
+    @app.route('/api/cache_stats')
+    def get_cache_stats():
+        return jsonify(reference_cache.stats())
+
+    @app.route('/api/user_cache_stats')
+    def get_user_cache_stats():
+        return jsonify(user_cache.stats())
+
+    @app.route('/api/snapshot_stats')
+    def get_snapshot_stats():
+        return jsonify({'version': dashboard.version, 'age_seconds': round(dashboard.age_seconds(), 3)})
+
+    class ScenarioSchema(Schema):
+        class Meta:
+            unknown = EXCLUDE
+
+        weekday = fields.Int(validate=validate.Range(min=0, max=6))
+        start_hour = fields.Int(validate=validate.Range(min=0, max=23))
+        duration_hours = fields.Float(validate=validate.Range(min=0.25, max=7 * 24))
+        replications = fields.Int(validate=validate.Range(min=1, max=app.config['SIMULATION_MAX_REPLICATIONS']))
+        seed = fields.Int()
+        doctors_out = fields.Dict(keys=fields.Int(), values=fields.Int(validate=validate.Range(min=0)))
+        arrival_scale = fields.Float(validate=validate.Range(min=0, max=20))
+        admission_probability = fields.Float(validate=validate.Range(min=0, max=1))
+        bed_stay_hours = fields.Float(validate=validate.Range(min=0.25))
+        history_weeks = fields.Int(validate=validate.Range(min=1, max=52))
+
+        @post_load
+        def make_scenario(self, data, **kwargs):
+            data['doctors_out'] = tuple(sorted(data.get('doctors_out', {}).items()))
+            return simulation.Scenario(**data)
+
+    scenario_schema = ScenarioSchema()
+
+    @app.route('/api/simulation', methods=['POST'])
+    def run_simulation():
+        """API endpoint to simulate a what-if scenario, e.g. two cardiologists out on Monday morning."""
+        try:
+            scenario = scenario_schema.load(request.get_json(silent=True) or {})
+        except ValidationError as err:
+            return jsonify({'errors': err.messages}), 400
+
+        department_ids = db.session.execute(db.select(Department.id)).scalars().all()
+        _, service_rates = rate_store.rates(department_ids)
+        models = simulation.load_inputs(scenario, {d: 1 / rate for d, rate in zip(department_ids, service_rates)})
+        result, cached = simulator.run(scenario, models)
+        return jsonify(dict(result, cached=cached))
+
+    @app.route('/api/simulation_stats')
+    def get_simulation_stats():
+        return jsonify(simulator.stats())
 
     @app.route('/api/bed_availability')
     def get_bed_availability():
-        beds = Bed.query.all()
-        availability = {
-            'total': len(beds),
-            'available': sum(1 for bed in beds if bed.is_available),
-            'occupied': sum(1 for bed in beds if not bed.is_available)
-        }
-        return jsonify(availability)
+        return jsonify(bed_allocator.availability(request.args.get('department_id', type=int)))
 
     @app.route('/api/allocate_bed', methods=['POST'])
     def allocate_bed():
@@ -324,14 +603,10 @@ def create_app():
         patient_id = data['patient_id']
         department_id = data['department_id']
         
-        available_bed = Bed.query.filter_by(department_id=department_id, is_available=True).first()
+        available_bed = bed_allocator.claim(department_id, patient_id)
         if not available_bed:
             return jsonify({'error': 'No beds available in the selected department'}), 400
-        
-        available_bed.is_available = False
-        patient = Patient.query.get(patient_id)
-        patient.bed_id = available_bed.id
-        db.session.commit()
+        dashboard.adjust('beds', available=-1, occupied=1)
         
         return jsonify({'message': 'Bed allocated successfully', 'bed_number': available_bed.bed_number})
 
@@ -339,6 +614,8 @@ def create_app():
         name = fields.Str(required=True)
         age = fields.Int(required=True)
         gender = fields.Str(required=True)
+        hospital_id = fields.Int(required=True)
+        department_id = fields.Int(required=True)
 
     patient_schema = PatientSchema()
 
@@ -350,16 +627,15 @@ def create_app():
         if errors:
             return jsonify(errors), 400
         
-        patient = Patient(name=data['name'], age=data['age'], gender=data['gender'])
+        patient = Patient(name=data['name'], age=data['age'], gender=data['gender'],
+                          hospital_id=data['hospital_id'], department_id=data['department_id'])
         db.session.add(patient)
         db.session.commit()
         
-        # Allocate bed
-        available_bed = Bed.query.filter_by(is_available=True).first()
+        # Allocate a bed in the patient's department
+        available_bed = bed_allocator.claim(patient.department_id, patient.id)
         if available_bed:
-            available_bed.is_available = False
-            available_bed.patient_id = patient.id
-            db.session.commit()
+            dashboard.adjust('beds', available=-1, occupied=1)
         
         return jsonify({"message": "Patient admitted successfully", "patient_id": patient.id}), 201
 
@@ -445,39 +721,38 @@ def create_app():
             return jsonify(error=str(e)), e.code
         return jsonify(error="An unexpected error occurred"), 500
 
-    class PriorityPatientQueue:
-        def __init__(self):
-            self.queue = PriorityQueue()
-            self.order = 0
-
-        def add_patient(self, patient, priority):
-            self.order += 1
-            self.queue.put((priority, self.order, patient))
-
-        def get_next_patient(self):
-            if not self.queue.empty():
-                return self.queue.get()[2]
-            return None
-
-    patient_queue = PriorityPatientQueue()
-
     @app.route('/api/queue/add', methods=['POST'])
     @login_required
     def add_to_queue():
         data = request.json
-        patient = Patient.query.get(data['patient_id'])
-        priority = data['priority']
-        patient_queue.add_patient(patient, priority)
-        return jsonify({"message": "Patient added to queue"}), 200
+        patient = Patient.query.get_or_404(data['patient_id'])
+        priority = int(data['priority'])
+        department_id = data.get('department_id', patient.department_id)
+        entry = patient_queue.push(patient.id, department_id, priority)
+        return jsonify({"message": "Patient added to queue", "entry_id": entry.id}), 200
 
     @app.route('/api/queue/next')
     @login_required
     def get_next_patient():
-        patient = patient_queue.get_next_patient()
-        if patient:
-            return jsonify({"patient_id": patient.id, "name": patient.name}), 200
+        department_id = request.args.get('department_id', type=int)
+        entry = patient_queue.claim_next(department_id, claimed_by=current_user.username)
+        if entry:
+            return jsonify({
+                "patient_id": entry.patient_id,
+                "name": entry.patient.name,
+                "entry_id": entry.id,
+                "department_id": entry.department_id,
+                "priority": entry.priority
+            }), 200
         return jsonify({"message": "Queue is empty"}), 404
 
+    @app.route('/api/queue/<int:entry_id>/priority', methods=['PUT'])
+    @login_required
+    def change_queue_priority(entry_id):
+        if not patient_queue.change_priority(entry_id, int(request.json['priority'])):
+            return jsonify({"error": "Queue entry not found or already claimed"}), 404
+        return jsonify({"message": "Priority updated"}), 200
+
     @app.route('/api/check_login')
     def check_login():
         if current_user.is_authenticated:
@@ -501,32 +776,124 @@ def create_app():
     @login_required
     def create_expense():
         data = request.json
-        new_expense = Expense(
+        new_expense = expenses.create(
             hospital_id=data['hospital_id'],
             description=data['description'],
             amount=data['amount'],
-            date=datetime.strptime(data['date'], '%Y-%m-%d').date() if 'date' in data else None
+            day=datetime.strptime(data['date'], '%Y-%m-%d').date() if 'date' in data else None,
+            category=data.get('category')
         )
-        db.session.add(new_expense)
-        db.session.commit()
         return jsonify({'message': 'Expense created successfully', 'id': new_expense.id}), 201
 
     @app.route('/api/expenses', methods=['GET'])
     @login_required
     def get_expenses():
-        expenses = Expense.query.all()
-        return jsonify([{
-            'id': e.id,
-            'hospital_id': e.hospital_id,
-            'description': e.description,
-            'amount': e.amount,
-            'date': e.date.isoformat()
-        } for e in expenses]), 200
+        query = db.select(Expense.id, Expense.hospital_id, Expense.description, Expense.amount, Expense.date,
+                          Expense.category)
+        hospital_id = request.args.get('hospital_id', type=int)
+        if hospital_id is not None:
+            query = query.where(Expense.hospital_id == hospital_id)
+        try:
+            start, end = pagination.date_range()
+            if start:
+                query = query.where(Expense.date >= start.date())
+            if end:
+                query = query.where(Expense.date < end.date())
+            return pagination.paginate(db.session, query, Expense.id, lambda e: {
+                'id': e.id,
+                'hospital_id': e.hospital_id,
+                'description': e.description,
+                'amount': e.amount,
+                'date': e.date.isoformat(),
+                'category': e.category
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    @app.route('/api/expenses/summary')
+    @login_required
+    def get_expense_summary():
+        """API endpoint for expense totals by hospital, month and/or category, read from the monthly rollups."""
+        group_by = [name for name in request.args.get('group_by', 'hospital,month,category').split(',') if name]
+        try:
+            start, end = pagination.date_range()
+            return jsonify(expenses.summary(group_by, request.args.get('hospital_id', type=int),
+                                            start.date() if start else None, end.date() if end else None))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    @app.route('/api/expenses/export')
+    @login_required
+    def export_expenses():
+        """API endpoint to download expenses as CSV or NDJSON, streamed in chunks."""
+        fmt = request.args.get('format', 'csv')
+        try:
+            start, end = pagination.date_range()
+            if fmt not in expenses.EXPORT_FORMATS:
+                raise ValueError(f'format must be one of {sorted(expenses.EXPORT_FORMATS)}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rows = expenses.export(fmt, request.args.get('hospital_id', type=int),
+                               start.date() if start else None, end.date() if end else None)
+        return Response(stream_with_context(rows), mimetype=expenses.EXPORT_FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename=expenses.{fmt}'})
+
+    # Schema first, so the warm-up below reads the tables it expects; a new database gets the demo data
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            created, applied = migrations.ensure_schema(db.engine, db.metadata)
+            if created:
+                database.seed_demo()
+                logger.info("Created the database schema and demo data")
+            elif applied:
+                logger.info(f"Applied migrations {applied}")
+
+    # Rebuild arrival-rate estimates from recent arrivals so the first polls after a restart are meaningful
+    with app.app_context():
+        try:
+            warmed = rate_store.warm_start()
+            logger.info(f"Warm-started arrival estimates from {warmed} recent patients")
+        except Exception as e:
+            logger.warning(f"Could not warm-start arrival estimates: {str(e)}")
+        try:
+            dashboard.load()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not load dashboard snapshot: {str(e)}")
+        try:
+            logger.info(f"Indexed {bed_allocator.load()} beds")
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not index beds: {str(e)}")
+        try:
+            logger.info(f"Rebuilt triage queue with {patient_queue.rebuild()} waiting entries")
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not rebuild triage queue: {str(e)}")
 
     return app, socketio
 
-# Create an instance of your Flask app and socketio
-app, socketio = create_app()
+_app: Optional[Tuple[Flask, SocketIO]] = None
+_app_lock = threading.Lock()
+
+
+def get_app(config: Optional[Dict[str, Any]] = None) -> Tuple[Flask, SocketIO]:
+    """The process-wide app and SocketIO, built on first use; ``config`` only applies to that first build."""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app(config)
+    return _app
+
+
+def __getattr__(name: str):
+    # ``from backend.app import app`` still works, but importing the module no longer builds anything
+    if name in ('app', 'socketio'):
+        return get_app()[0 if name == 'app' else 1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True)
+    app, socketio = get_app({'AUTO_MIGRATE': True})
+    socketio.run(app, debug=True, use_reloader=False)
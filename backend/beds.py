@@ -0,0 +1,146 @@
+from __future__ import annotations
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from backend.extensions import db
+from backend.models import Bed
+
+
+class BedAllocator:
+    """Free-bed counters and free lists per department, with claims that cannot double-book.
+
+    A claim is a conditional UPDATE on ``is_available``; the free list only proposes candidates,
+    so a stale list (e.g. another worker took the bed) costs a retry, never a double allocation.
+    When a department's list runs dry it is refreshed from the database before giving up.
+    Each department has its own lock, so claims in different departments never wait on each
+    other. All methods that touch the database need an app context.
+    """
+
+    def __init__(self):
+        self._free: Dict[int, Deque[int]] = {}
+        self._total: Dict[int, int] = {}
+        self._lock = threading.Lock()  # Guards the dictionaries themselves; never held across queries
+        self._department_locks: Dict[int, threading.Lock] = {}
+
+    def _department_lock(self, department_id: int) -> threading.Lock:
+        with self._lock:
+            lock = self._department_locks.get(department_id)
+            if lock is None:
+                lock = self._department_locks[department_id] = threading.Lock()
+            return lock
+
+    def load(self) -> int:
+        rows = db.session.execute(db.select(Bed.id, Bed.department_id, Bed.is_available).order_by(Bed.id)).all()
+        free: Dict[int, Deque[int]] = {}
+        total: Dict[int, int] = {}
+        for bed_id, department_id, is_available in rows:
+            total[department_id] = total.get(department_id, 0) + 1
+            department_free = free.setdefault(department_id, deque())
+            if is_available:
+                department_free.append(bed_id)
+        with self._lock:
+            self._free, self._total = free, total
+        return len(rows)
+
+    def _refresh(self, department_id: int):
+        """Reload one department's free list, and its bed count with it (beds are added outside the allocator)."""
+        rows = db.session.execute(
+            db.select(Bed.id, Bed.is_available).where(Bed.department_id == department_id).order_by(Bed.id)
+        ).all()
+        with self._lock:
+            self._free[department_id] = deque(bed_id for bed_id, is_available in rows if is_available)
+            self._total[department_id] = len(rows)
+
+    def _try_claim(self, bed_id: int, patient_id: Optional[int]) -> bool:
+        claimed = db.session.execute(
+            db.update(Bed)
+            .where(Bed.id == bed_id, Bed.is_available == True)
+            .values(is_available=False, patient_id=patient_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return bool(claimed)
+
+    def _claim_in(self, department_id: int, patient_id: Optional[int], refresh: bool) -> Optional[int]:
+        """Claim a bed from one department's free list, refreshing it once from the database if allowed."""
+        with self._department_lock(department_id):
+            while True:
+                free = self._free.get(department_id)
+                if not free:
+                    if not refresh:
+                        return None
+                    self._refresh(department_id)
+                    refresh = False
+                    continue
+                bed_id = free.popleft()
+                if self._try_claim(bed_id, patient_id):
+                    return bed_id
+
+    def _claim_anywhere(self, patient_id: Optional[int]) -> Optional[int]:
+        # Departments with beds on their free lists first; the lists are reloaded only when all look full
+        with self._lock:
+            departments = sorted(self._total, key=lambda dept: -len(self._free.get(dept, ())))
+        for refresh in (False, True):
+            for dept in departments:
+                bed_id = self._claim_in(dept, patient_id, refresh)
+                if bed_id is not None:
+                    return bed_id
+        return None
+
+    def claim(self, department_id: Optional[int] = None, patient_id: Optional[int] = None) -> Optional[Bed]:
+        """Hand out a free bed in the department (or anywhere when no department is given)."""
+        if department_id is not None:
+            bed_id = self._claim_in(department_id, patient_id, refresh=True)
+        else:
+            bed_id = self._claim_anywhere(patient_id)
+        return db.session.get(Bed, bed_id) if bed_id is not None else None
+
+    def _department_of(self, bed_id: int) -> Optional[int]:
+        return db.session.execute(db.select(Bed.department_id).where(Bed.id == bed_id)).scalar()
+
+    def occupy(self, bed_id: int, patient_id: Optional[int] = None) -> bool:
+        """Mark a specific bed as taken."""
+        department_id = self._department_of(bed_id)
+        with self._department_lock(department_id):
+            if not self._try_claim(bed_id, patient_id):
+                return False
+            free = self._free.get(department_id)
+            if free and bed_id in free:
+                free.remove(bed_id)
+            return True
+
+    def release(self, bed_id: int) -> bool:
+        """Return a bed to its department's free list."""
+        department_id = self._department_of(bed_id)
+        with self._department_lock(department_id):
+            released = db.session.execute(
+                db.update(Bed)
+                .where(Bed.id == bed_id, Bed.is_available == False)
+                .values(is_available=True, patient_id=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if not released:
+                return False
+            with self._lock:
+                self._free.setdefault(department_id, deque()).append(bed_id)
+            return True
+
+    def by_department(self) -> Dict[int, Dict[str, int]]:
+        """Total/available/occupied counts for every department, read under one lock."""
+        with self._lock:
+            counts = {dept: (total, len(self._free.get(dept, ()))) for dept, total in self._total.items()}
+        return {dept: {'total': total, 'available': available, 'occupied': total - available}
+                for dept, (total, available) in counts.items()}
+
+    def availability(self, department_id: Optional[int] = None) -> Dict[str, int]:
+        """Total/available/occupied counts answered from memory."""
+        with self._lock:
+            if department_id is not None:
+                total = self._total.get(department_id, 0)
+                available = len(self._free.get(department_id, ()))
+            else:
+                total = sum(self._total.values())
+                available = sum(len(free) for free in self._free.values())
+        return {'total': total, 'available': available, 'occupied': total - available}
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class WaitTimeBroadcaster:
+    """Coalesces wait-time recomputation for dirty departments and emits only values that moved.
+
+    ``compute`` receives the set of dirty department ids and returns
+    ``{department_id: {'department': name, 'wait_time': minutes}}``; a department it cannot
+    score (no doctors on duty) has ``wait_time`` None or is left out. Each update carries its
+    ``department_id``, and a department that loses its score gets one update with
+    ``wait_time: null`` so clients stop showing the last figure. With ``rooms_for`` the batch
+    only goes to the rooms of the departments it mentions. ``stop`` ends the tick loop.
+    """
+
+    def __init__(self, socketio, compute: Callable[[Set[int]], Dict[int, Dict]],
+                 tick: float = 0.25, threshold: float = 0.5, event: str = 'wait_times_updated',
+                 rooms_for: Optional[Callable[[int], List[str]]] = None):
+        self.socketio = socketio
+        self.compute = compute
+        self.tick = tick
+        self.threshold = threshold
+        self.event = event
+        self.rooms_for = rooms_for
+        self.emitted = 0
+        self.suppressed = 0
+        self.batches = 0
+        self._dirty: Set[int] = set()
+        self._last_sent: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._task = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        app.extensions['wait_time_broadcaster'] = self
+
+    def mark_dirty(self, department_ids: Iterable[int]):
+        with self._lock:
+            self._dirty.update(department_ids)
+            if self._task is None and not self._stopping.is_set():
+                self._task = self._start()
+
+    def _start(self):
+        if getattr(self.socketio, 'async_mode', None) == 'threading':
+            # A plain daemon thread, so the tick loop never keeps the process alive on shutdown
+            task = threading.Thread(target=self._run, name='wait-time-broadcaster', daemon=True)
+            task.start()
+            return task
+        return self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.socketio.sleep(self.tick)
+            if self._stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error broadcasting wait times: {str(e)}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """End the tick loop (departments still pending are dropped) and wait for a loop thread to exit."""
+        self._stopping.set()
+        with self._lock:
+            task, self._task = self._task, None
+        if isinstance(task, threading.Thread) and task is not threading.current_thread():
+            task.join(timeout)
+
+    def _moved(self, previous: Optional[float], current: float) -> bool:
+        if previous is None or previous == current:
+            return previous is None
+        if math.isinf(previous) or math.isinf(current):
+            return True
+        return abs(current - previous) >= self.threshold
+
+    def flush(self) -> List[Dict]:
+        """Recompute the departments marked dirty since the last tick and emit one batched update."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return []
+
+        updates, rooms = [], set()
+        scores = self.compute(dirty)
+        for department_id in sorted(dirty | scores.keys()):
+            value = dict(scores.get(department_id) or {}, department_id=department_id)
+            wait_time = value.setdefault('wait_time', None)
+            if wait_time is None:
+                # Lost its score: say so once, and forget the old figure so the next score is sent
+                if self._last_sent.pop(department_id, None) is None:
+                    continue
+            elif self._moved(self._last_sent.get(department_id), wait_time):
+                self._last_sent[department_id] = wait_time
+            else:
+                self.suppressed += 1
+                continue
+            updates.append(value)
+            if self.rooms_for:
+                rooms.update(self.rooms_for(department_id))
+
+        if updates:
+            self.emitted += len(updates)
+            self.batches += 1
+            if self.rooms_for:
+                self.socketio.emit(self.event, {'updates': updates}, to=sorted(rooms))
+            else:
+                self.socketio.emit(self.event, {'updates': updates})
+        return updates
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'emitted': self.emitted,
+            'suppressed': self.suppressed,
+            'batches': self.batches,
+            'pending': len(self._dirty),
+            'tick_seconds': self.tick,
+            'threshold_minutes': self.threshold
+        }
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from flask import Response, current_app, request
+
+
+class ReferenceCache:
+    """Read-through TTL/LRU cache for reference data (cities, hospitals, departments) and its responses.
+
+    Entries live under a namespace; the write handlers for that data call ``invalidate`` with
+    it, and ``ttl`` bounds how stale anything changed elsewhere (another process, a script) can
+    get. ``response`` keeps whole GET responses with a content-hash ETag, so a repeated poll is
+    answered from memory, and one carrying a matching ``If-None-Match`` gets a bodiless 304.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1024, metrics=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.not_modified = 0
+        self.evictions = 0
+        self._generations: Dict[str, int] = {}  # Bumped by invalidate, so a load that raced it is not stored
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.describe('reference_cache_requests_total', 'counter', 'Reference cache lookups by namespace and result.')
+
+    def init_app(self, app):
+        app.extensions['reference_cache'] = self
+
+    def _count(self, namespace: str, result: str):
+        counts = self.hits if result == 'hit' else self.misses
+        counts[namespace] = counts.get(namespace, 0) + 1
+        if self.metrics is not None:
+            self.metrics.inc('reference_cache_requests_total', namespace=namespace, result=result)
+
+    def get(self, namespace: str, key: Hashable, load: Callable[[], Any]) -> Any:
+        """The cached value, or ``load()``'s result stored for next time (unless it is None)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end((namespace, key))
+                self._count(namespace, 'hit')
+                return entry[1]
+            self._count(namespace, 'miss')
+            generation = self._generations.get(namespace, 0)
+
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            if self._generations.get(namespace, 0) != generation:
+                return value
+            self._entries[(namespace, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, *namespaces: str):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in [key for key in self._entries if key[0] in namespaces]:
+                del self._entries[key]
+
+    def response(self, namespace: str, build: Callable[[], Response]) -> Response:
+        """Serve a GET from the cache by full path, with ETag / If-None-Match support.
+
+        Only plain 200 responses are kept; streamed and error responses pass straight through.
+        """
+        uncacheable = []
+
+        def load():
+            response = build()
+            if response.status_code != 200 or response.is_streamed:
+                uncacheable.append(response)
+                return None
+            body = response.get_data()
+            headers = [(name, value) for name, value in response.headers
+                       if name.lower() not in ('content-length', 'content-type', 'etag')]
+            return hashlib.sha1(body).hexdigest(), body, response.mimetype, headers
+
+        entry = self.get(namespace, request.full_path, load)
+        if uncacheable:
+            return uncacheable[0]
+        etag, body, mimetype, headers = entry
+        if request.if_none_match.contains_weak(etag):  # Compressed copies carry it as W/"..."
+            self.not_modified += 1
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(body, mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'not_modified': self.not_modified,
+            'evictions': self.evictions
+        }
+
+
+def current() -> ReferenceCache:
+    """The reference cache of the app handling the current request."""
+    return current_app.extensions['reference_cache']
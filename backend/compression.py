@@ -0,0 +1,131 @@
+"""Negotiated gzip/brotli compression of HTTP responses above a size threshold.
+
+The encoding is picked from the request's ``Accept-Encoding`` (brotli only when the
+``brotli`` package is installed). Whole responses are compressed once they reach
+``min_size`` bytes; streamed responses (exports, ``?stream=``) are always compressed, a chunk
+at a time with a sync flush so clients still see rows as they are produced. A compressed
+response's ETag becomes weak, since its bytes differ from the identity representation.
+
+Socket.IO long-polling responses are compressed by Engine.IO itself (``http_compression``
+and ``compression_threshold``, set from the same config in ``create_app``).
+"""
+from __future__ import annotations
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml',
+    'text/csv', 'text/html', 'text/plain', 'text/css', 'text/javascript'
+}
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class Compressor:
+    """Compresses responses for clients that accept it; install with ``init_app``."""
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5, metrics=None):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.metrics = metrics
+        self.encodings = (['br'] if brotli is not None else []) + ['gzip']
+        if metrics is not None:
+            metrics.describe('http_response_bytes_total', 'counter',
+                             'Compressible response bytes before (identity) and after compression, by encoding.')
+
+    def init_app(self, app):
+        app.extensions['compressor'] = self
+        app.after_request(self.after_request)
+
+    def _encoder(self, encoding: str):
+        return _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.gzip_level)
+
+    def _count(self, encoding: str, raw: int, sent: int):
+        if self.metrics is not None:
+            self.metrics.inc('http_response_bytes_total', raw, encoding='identity')
+            self.metrics.inc('http_response_bytes_total', sent, encoding=encoding)
+
+    def negotiate(self, response: Response) -> Optional[str]:
+        """The encoding to use for ``response``, or None to send it as is."""
+        if (request.method == 'HEAD' or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _stream(self, chunks: Iterable, encoding: str) -> Iterator[bytes]:
+        encoder = self._encoder(encoding)
+        raw = sent = 0
+        try:
+            for chunk in chunks:
+                data = chunk.encode() if isinstance(chunk, str) else chunk
+                if data:
+                    out = encoder.chunk(data)
+                    raw += len(data)
+                    sent += len(out)
+                    yield out
+            out = encoder.finish()
+            sent += len(out)
+            yield out
+        finally:
+            self._count(encoding, raw, sent)
+            if hasattr(chunks, 'close'):
+                chunks.close()  # Ends the wrapped stream (and its app context) if the client went away
+
+    def after_request(self, response: Response) -> Response:
+        encoding = self.negotiate(response)
+        if encoding is None or not (200 <= response.status_code < 300 or response.status_code == 304):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code == 304:
+            self._weaken_etag(response)  # Match the ETag the compressed 200 carried
+            return response
+        if response.status_code == 204:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compressed = self._encoder(encoding).finish(body)
+            self._count(encoding, len(body), len(compressed))
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        self._weaken_etag(response)
+        return response
+
+    @staticmethod
+    def _weaken_etag(response: Response):
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
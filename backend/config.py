@@ -7,3 +7,51 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///swasthyaflow.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Create or upgrade the schema in place when the app is built (run.py turns this on)
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '0') == '1'
+
+    # Wait-time broadcasts: coalescing interval (seconds) and minimum change worth emitting (minutes)
+    BROADCAST_TICK_SECONDS = float(os.environ.get('BROADCAST_TICK_SECONDS', 0.25))
+    WAIT_TIME_CHANGE_THRESHOLD = float(os.environ.get('WAIT_TIME_CHANGE_THRESHOLD', 0.5))
+
+    # Largest patient list accepted by the batch registration endpoint and socket event
+    MAX_PATIENT_BATCH = int(os.environ.get('MAX_PATIENT_BATCH', 1000))
+
+    # Largest stock movement batch accepted by /api/inventory/movements
+    MAX_STOCK_MOVEMENT_BATCH = int(os.environ.get('MAX_STOCK_MOVEMENT_BATCH', 5000))
+
+    # Storage profile: 'tuned' runs SQLite in WAL mode with pooled connections, 'baseline' keeps driver defaults
+    STORAGE_PROFILE = os.environ.get('STORAGE_PROFILE', 'tuned')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Connection pool, sized for the socket worker threads plus request threads
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Server databases only
+
+    # Worker threads for socket events that write to the database, and how many tasks may wait for them
+    THREAD_POOL_WORKERS = int(os.environ.get('THREAD_POOL_WORKERS', 4))
+    WORK_QUEUE_LIMIT = int(os.environ.get('WORK_QUEUE_LIMIT', 1000))
+
+    # What-if simulation: worker processes (0 runs in the request thread), cached scenarios, replication cap
+    SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', os.cpu_count() or 1))
+    SIMULATION_CACHE_SIZE = int(os.environ.get('SIMULATION_CACHE_SIZE', 64))
+    SIMULATION_MAX_REPLICATIONS = int(os.environ.get('SIMULATION_MAX_REPLICATIONS', 2000))
+
+    # Requests or socket events running more SQL statements than this log a warning (0 disables)
+    METRICS_QUERY_WARN_THRESHOLD = int(os.environ.get('METRICS_QUERY_WARN_THRESHOLD', 25))
+
+    # Reference data (cities, hospitals, departments): seconds an entry stays fresh, and how many entries to keep
+    REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', 300))
+    REFERENCE_CACHE_MAX_ENTRIES = int(os.environ.get('REFERENCE_CACHE_MAX_ENTRIES', 1024))
+
+    # Logged-in user identities (id, username, role): seconds one is trusted without the database, and how many to keep
+    USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+
+    # Responses and Socket.IO polling payloads at least this large are gzip/brotli compressed when the client accepts it
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
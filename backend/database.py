@@ -1,81 +1,307 @@
+from __future__ import annotations
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
 from backend.extensions import db
-from backend.app import create_app  # Import create_app from app.py
+from backend import migrations, rollups
+from backend.lazy import LazyModule
 from backend.models import User, Department, Patient, Doctor, Bed, Inventory, City, Hospital, OPDQueue
 
-def init_db():
-    app = create_app()  # Create an instance of your Flask app
+np = LazyModule('numpy')  # Imported on first use, not at startup
+
+
+def init_db(app=None):
+    """Bring the schema up to date in place and add whatever demo data is missing; safe to re-run."""
+    if app is None:
+        from backend.app import get_app
+        app, _ = get_app()
     with app.app_context():  # Push the application context
         try:
-            db.drop_all()  # Uncomment this line if you want to drop all tables before creating them
-            db.create_all()
-            
-            # Add cities
-            cities = ['Kanpur', 'Lucknow', 'Delhi', 'Noida', 'New York', 'Los Angeles', 'Chicago', 'Houston']
-            for city_name in cities:
-                if not City.query.filter_by(name=city_name).first():
-                    db.session.add(City(name=city_name))
-            db.session.commit()
-
-            # Add hospitals
-            hospitals = [
-                {'name': 'Central Hospital', 'address': '123 Main St', 'total_beds': 200, 'available_beds': 50, 'city': 'Kanpur'},
-                {'name': 'West Medical Center', 'address': '456 Oak Ave', 'total_beds': 150, 'available_beds': 30, 'city': 'Lucknow'},
-            ]
-            for hospital in hospitals:
-                city = City.query.filter_by(name=hospital['city']).first()
-                if city and not Hospital.query.filter_by(name=hospital['name']).first():
-                    db.session.add(Hospital(name=hospital['name'], address=hospital['address'], 
-                                            total_beds=hospital['total_beds'], available_beds=hospital['available_beds'], 
-                                            city_id=city.id))
-            db.session.commit()
-
-            # Add departments
-            departments = ['Emergency', 'Cardiology', 'Pediatrics', 'Orthopedics']
-            for dept_name in departments:
-                if not Department.query.filter_by(name=dept_name).first():
-                    db.session.add(Department(name=dept_name))
-            db.session.commit()
-            
-            # Add doctors
-            doctors = [
-                {'name': 'Dr. Smith', 'department': 'Emergency'},
-                {'name': 'Dr. Johnson', 'department': 'Cardiology'},
-                {'name': 'Dr. Williams', 'department': 'Pediatrics'},
-                {'name': 'Dr. Brown', 'department': 'Orthopedics'}
-            ]
-            for doc in doctors:
-                dept = Department.query.filter_by(name=doc['department']).first()
-                if dept and not Doctor.query.filter_by(name=doc['name']).first():
-                    db.session.add(Doctor(name=doc['name'], department_id=dept.id))
-            db.session.commit()
-            
-            # Add beds
-            departments = Department.query.all()  # Fetch all departments
-            hospital = Hospital.query.first()  # Assuming we're adding beds to the first hospital
-            if hospital and departments:
-                for dept in departments:
-                    for i in range(1, 11):  # Assuming 10 beds per department
-                        bed = Bed(bed_number=f"Bed-{dept.name}-{i}", department_id=dept.id)
-                        db.session.add(bed)
-                db.session.commit()
-            
-            # Add inventory items
-            inventory_items = [
-                {'item_name': 'Paracetamol', 'quantity': 1000, 'unit_price': 0.5},
-                {'item_name': 'Bandages', 'quantity': 500, 'unit_price': 1.0},
-                {'item_name': 'Syringes', 'quantity': 200, 'unit_price': 0.75}
-            ]
-            if hospital:
-                for item in inventory_items:
-                    if not Inventory.query.filter_by(hospital_id=hospital.id, item_name=item['item_name']).first():
-                        db.session.add(Inventory(hospital_id=hospital.id, **item))
-                db.session.commit()
-
-            print("Database initialized successfully.")
-        
+            created, applied = migrations.ensure_schema(db.engine, db.metadata)
+            seed_demo()
+            print(f"Database initialized successfully ({'new schema' if created else f'migrations applied: {applied}'}).")
         except Exception as e:
             db.session.rollback()  # Rollback the session in case of error
             print(f"An error occurred: {e}")
 
+
+def seed_demo():
+    """Add the small demo dataset, skipping rows that already exist. Requires an app context."""
+    # Add cities
+    cities = ['Kanpur', 'Lucknow', 'Delhi', 'Noida', 'New York', 'Los Angeles', 'Chicago', 'Houston']
+    for city_name in cities:
+        if not City.query.filter_by(name=city_name).first():
+            db.session.add(City(name=city_name))
+    db.session.commit()
+
+    # Add hospitals
+    hospitals = [
+        {'name': 'Central Hospital', 'address': '123 Main St', 'total_beds': 200, 'available_beds': 50, 'city': 'Kanpur'},
+        {'name': 'West Medical Center', 'address': '456 Oak Ave', 'total_beds': 150, 'available_beds': 30, 'city': 'Lucknow'},
+    ]
+    for hospital in hospitals:
+        city = City.query.filter_by(name=hospital['city']).first()
+        if city and not Hospital.query.filter_by(name=hospital['name']).first():
+            db.session.add(Hospital(name=hospital['name'], address=hospital['address'], 
+                                    total_beds=hospital['total_beds'], available_beds=hospital['available_beds'], 
+                                    city_id=city.id))
+    db.session.commit()
+
+    # Add departments
+    departments = ['Emergency', 'Cardiology', 'Pediatrics', 'Orthopedics']
+    for dept_name in departments:
+        if not Department.query.filter_by(name=dept_name).first():
+            db.session.add(Department(name=dept_name))
+    db.session.commit()
+
+    # Add doctors
+    doctors = [
+        {'name': 'Dr. Smith', 'department': 'Emergency'},
+        {'name': 'Dr. Johnson', 'department': 'Cardiology'},
+        {'name': 'Dr. Williams', 'department': 'Pediatrics'},
+        {'name': 'Dr. Brown', 'department': 'Orthopedics'}
+    ]
+    for doc in doctors:
+        dept = Department.query.filter_by(name=doc['department']).first()
+        if dept and not Doctor.query.filter_by(name=doc['name']).first():
+            db.session.add(Doctor(name=doc['name'], department_id=dept.id))
+    db.session.commit()
+
+    # Add beds
+    departments = Department.query.all()  # Fetch all departments
+    hospital = Hospital.query.first()  # Assuming we're adding beds to the first hospital
+    if hospital and departments:
+        existing = set(db.session.execute(db.select(Bed.bed_number)).scalars())
+        for dept in departments:
+            for i in range(1, 11):  # Assuming 10 beds per department
+                if f"Bed-{dept.name}-{i}" not in existing:
+                    db.session.add(Bed(bed_number=f"Bed-{dept.name}-{i}", department_id=dept.id))
+        db.session.commit()
+
+    # Add inventory items
+    inventory_items = [
+        {'item_name': 'Paracetamol', 'quantity': 1000, 'unit_price': 0.5},
+        {'item_name': 'Bandages', 'quantity': 500, 'unit_price': 1.0},
+        {'item_name': 'Syringes', 'quantity': 200, 'unit_price': 0.75}
+    ]
+    if hospital:
+        for item in inventory_items:
+            if not Inventory.query.filter_by(hospital_id=hospital.id, item_name=item['item_name']).first():
+                db.session.add(Inventory(hospital_id=hospital.id, **item))
+        db.session.commit()
+
+
+# Synthetic data at production scale: every table is generated with numpy from one seed and
+# written with executemany in large chunks, using explicit ids so no row is read back.
+DEPARTMENT_NAMES = ['Emergency', 'Cardiology', 'Pediatrics', 'Orthopedics', 'General Medicine', 'Gynecology',
+                    'Neurology', 'Oncology', 'Dermatology', 'ENT', 'Ophthalmology', 'Psychiatry']
+INVENTORY_ITEMS = [('Paracetamol', 0.5), ('Bandages', 1.0), ('Syringes', 0.75), ('Gloves', 0.2),
+                   ('Saline', 2.5), ('Amoxicillin', 0.8), ('Insulin', 12.0), ('Gauze', 0.3)]
+# Relative arrival intensity by hour of day (OPD peak late morning) and by weekday (Monday busiest)
+HOURLY_ARRIVAL_CURVE = (0.2, 0.15, 0.1, 0.1, 0.15, 0.3, 0.6, 1.2, 2.2, 3.0, 3.2, 3.0,
+                        2.4, 2.0, 2.2, 2.1, 1.8, 1.4, 1.0, 0.8, 0.6, 0.5, 0.4, 0.3)
+WEEKDAY_ARRIVAL_CURVE = (1.3, 1.1, 1.0, 1.0, 1.05, 0.8, 0.6)
+SEED_CHUNK_SIZE = 50000
+
+
+@dataclass
+class SeedVolumes:
+    cities: int = 10
+    hospitals_per_city: int = 5
+    departments: int = 8
+    doctors: int = 400
+    beds: int = 5000
+    patients: int = 100000
+    days: int = 90
+    queue_share: float = 1.0     # Fraction of patients who also get an OPD queue entry
+    waiting_hours: float = 2.0   # Arrivals this recent are still waiting
+
+
+def _next_id(model) -> int:
+    return (db.session.execute(db.select(db.func.max(model.id))).scalar() or 0) + 1
+
+
+def _bulk_insert(model, columns: Dict[str, Any], count: int) -> int:
+    """executemany ``count`` rows given as parallel column lists, in chunks.
+
+    Values are converted a column at a time with the column types' bind processors and sent straight to
+    the driver, skipping the per-row dictionaries a Core insert would build.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    compiled = db.insert(model).compile(dialect=dialect, column_keys=list(columns))
+    for name, values in columns.items():
+        process = model.__table__.c[name].type.bind_processor(dialect)
+        if process is not None:
+            columns[name] = [process(value) for value in values]
+    if dialect.positional:
+        names = [compiled.binds[key].key for key in compiled.positiontup]
+        make_row = lambda chunk: list(zip(*chunk))
+    else:
+        names = list(columns)
+        make_row = lambda chunk: [dict(zip(names, row)) for row in zip(*chunk)]
+    for start in range(0, count, SEED_CHUNK_SIZE):
+        stop = min(start + SEED_CHUNK_SIZE, count)
+        connection.exec_driver_sql(str(compiled), make_row([columns[name][start:stop] for name in names]))
+    return count
+
+
+def _sync_sequences(*models):
+    """Move PostgreSQL id sequences past rows inserted with explicit ids; other backends need nothing."""
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__table__.name
+        connection.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), MAX(id)) FROM {table}"))
+
+
+def _arrival_times(rng: np.random.Generator, count: int, end: datetime, days: int) -> np.ndarray:
+    """Sorted arrival times over ``days`` up to ``end``, following the hourly and weekday curves."""
+    start = (end - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    slots = np.arange(days * 24)
+    slot_starts = np.datetime64(start, 's') + slots.astype('timedelta64[h]')
+    weekdays = (slot_starts.astype('datetime64[D]').view('int64') - 4) % 7  # 1970-01-01 was a Thursday
+    weights = np.asarray(HOURLY_ARRIVAL_CURVE)[(slots + start.hour) % 24] * np.asarray(WEEKDAY_ARRIVAL_CURVE)[weekdays]
+    chosen = rng.choice(len(slots), size=count, p=weights / weights.sum())
+    seconds = rng.integers(0, 3600, size=count).astype('timedelta64[s]')
+    return np.sort(slot_starts[chosen] + seconds)
+
+
+def seed_synthetic(volumes: SeedVolumes, seed: int = 0, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Append a reproducible synthetic dataset; returns the number of rows written per table.
+
+    Needs an app context. Existing rows are left alone: new ids continue after the current maximum,
+    and departments are matched by name. On PostgreSQL the id sequences are moved past the new rows.
+    """
+    rng = np.random.default_rng(seed)
+    now = now or datetime.utcnow()
+    written = {}
+
+    city_id = _next_id(City)
+    city_ids = np.arange(city_id, city_id + volumes.cities)
+    written['city'] = _bulk_insert(City, {
+        'id': city_ids.tolist(), 'name': [f'City {i}' for i in city_ids.tolist()]}, volumes.cities)
+
+    hospital_count = volumes.cities * volumes.hospitals_per_city
+    hospital_id = _next_id(Hospital)
+    hospital_ids = np.arange(hospital_id, hospital_id + hospital_count)
+    total_beds = rng.integers(50, 500, size=hospital_count)
+    written['hospital'] = _bulk_insert(Hospital, {
+        'id': hospital_ids.tolist(),
+        'name': [f'Hospital {i}' for i in hospital_ids.tolist()],
+        'address': [f'{n} Main St' for n in rng.integers(1, 999, size=hospital_count).tolist()],
+        'total_beds': total_beds.tolist(),
+        'available_beds': (total_beds * rng.uniform(0.1, 0.5, size=hospital_count)).astype(int).tolist(),
+        'city_id': np.repeat(city_ids, volumes.hospitals_per_city).tolist(),
+    }, hospital_count)
+
+    names = DEPARTMENT_NAMES + [f'Department {i}' for i in range(len(DEPARTMENT_NAMES) + 1, volumes.departments + 1)]
+    names = names[:volumes.departments]
+    existing = dict(db.session.execute(db.select(Department.name, Department.id).where(Department.name.in_(names))).all())
+    missing = [name for name in names if name not in existing]
+    department_id = _next_id(Department)
+    written['department'] = _bulk_insert(Department, {
+        'id': list(range(department_id, department_id + len(missing))), 'name': missing}, len(missing))
+    existing.update({name: department_id + i for i, name in enumerate(missing)})
+    department_ids = np.array([existing[name] for name in names])
+    # A few departments take most of the traffic
+    department_weights = 1 / np.arange(1, len(department_ids) + 1) ** 0.8
+    department_weights /= department_weights.sum()
+
+    doctor_id = _next_id(Doctor)
+    written['doctor'] = _bulk_insert(Doctor, {
+        'id': list(range(doctor_id, doctor_id + volumes.doctors)),
+        'name': [f'Dr. {i}' for i in range(doctor_id, doctor_id + volumes.doctors)],
+        'department_id': rng.choice(department_ids, size=volumes.doctors, p=department_weights).tolist(),
+        'is_available': (rng.random(volumes.doctors) < 0.8).tolist(),
+    }, volumes.doctors)
+
+    bed_id = _next_id(Bed)
+    written['bed'] = _bulk_insert(Bed, {
+        'id': list(range(bed_id, bed_id + volumes.beds)),
+        'bed_number': [f'Bed-{i}' for i in range(bed_id, bed_id + volumes.beds)],
+        'department_id': rng.choice(department_ids, size=volumes.beds, p=department_weights).tolist(),
+        'is_available': (rng.random(volumes.beds) < 0.3).tolist(),
+    }, volumes.beds)
+
+    written['inventory'] = _bulk_insert(Inventory, {
+        'hospital_id': np.repeat(hospital_ids, len(INVENTORY_ITEMS)).tolist(),
+        'item_name': [name for name, _ in INVENTORY_ITEMS] * hospital_count,
+        'quantity': rng.integers(0, 5000, size=hospital_count * len(INVENTORY_ITEMS)).tolist(),
+        'unit_price': [price for _, price in INVENTORY_ITEMS] * hospital_count,
+    }, hospital_count * len(INVENTORY_ITEMS))
+
+    arrivals = _arrival_times(rng, volumes.patients, now, volumes.days)
+    count = len(arrivals)
+    patient_id = _next_id(Patient)
+    patient_ids = np.arange(patient_id, patient_id + count)
+    patient_hospitals = rng.choice(hospital_ids, size=count)
+    waiting = arrivals >= np.datetime64(now - timedelta(hours=volumes.waiting_hours), 's')
+    arrival_list = arrivals.astype('datetime64[us]').tolist()
+    patients = {
+        'id': patient_ids.tolist(),
+        'name': [f'Patient {i}' for i in patient_ids.tolist()],
+        'age': rng.integers(0, 95, size=count).tolist(),
+        'gender': rng.choice(np.array(['Male', 'Female', 'Other']), size=count, p=[0.49, 0.49, 0.02]).tolist(),
+        'hospital_id': patient_hospitals.tolist(),
+        'department_id': rng.choice(department_ids, size=count, p=department_weights).tolist(),
+        'arrival_time': arrival_list,
+    }
+
+    queued = np.flatnonzero(rng.random(count) < volumes.queue_share)
+    completed = arrivals[queued] + (rng.exponential(25 * 60, size=len(queued))).astype('timedelta64[s]')
+    still_waiting = waiting[queued] | (completed >= np.datetime64(now, 's'))
+    completed_list = completed.astype('datetime64[us]').tolist()
+
+    # A queued patient is waiting exactly as long as their queue entry is
+    waiting[queued] = still_waiting
+    patients['status'] = np.where(waiting, 'Waiting', 'Served').tolist()
+    written['patient'] = _bulk_insert(Patient, patients, count)
+    written['opd_queue'] = _bulk_insert(OPDQueue, {
+        'patient_id': patient_ids[queued].tolist(),
+        'hospital_id': patient_hospitals[queued].tolist(),
+        'timestamp': [arrival_list[i] for i in queued.tolist()],
+        'status': np.where(still_waiting, 'Waiting', 'Served').tolist(),
+        'completed_at': [None if w else c for w, c in zip(still_waiting.tolist(), completed_list)],
+    }, len(queued))
+
+    _sync_sequences(City, Hospital, Department, Doctor, Bed, Patient)
+    db.session.commit()
+    written['opd_queue_hourly'] = rollups.backfill()
+    return written
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m backend.database', description='Create and seed the database')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('init', help='create or upgrade the schema in place and add the demo dataset (default)')
+    seed = commands.add_parser('seed', help='append a reproducible synthetic dataset')
+    for name, default in vars(SeedVolumes()).items():
+        seed.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    seed.add_argument('--seed', type=int, default=0, help='random seed; the same seed gives the same data')
+    args = parser.parse_args(argv)
+
+    if args.command in (None, 'init'):
+        init_db()
+        return 0
+
+    volumes = SeedVolumes(**{name: getattr(args, name) for name in vars(SeedVolumes())})
+    from backend.app import get_app
+
+    app, _ = get_app()
+    with app.app_context():
+        started = time.perf_counter()
+        written = seed_synthetic(volumes, seed=args.seed)
+    for table, rows in written.items():
+        print(f"{table:<18} {rows:>10}")
+    print(f"Seeded {sum(written.values())} rows in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
 if __name__ == '__main__':
-    init_db()
+    sys.exit(main(sys.argv[1:]))
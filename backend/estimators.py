@@ -0,0 +1,106 @@
+from __future__ import annotations
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from backend.extensions import db
+from backend.lazy import LazyModule
+from backend.models import Patient
+from backend.queueing import DEFAULT_SERVICE_RATE
+
+np = LazyModule('numpy')  # Imported on first use, not at startup
+
+
+@dataclass
+class DepartmentRates:
+    """Exponentially weighted arrival and service estimates for one department (times in minutes)."""
+    mean_interarrival: Optional[float] = None
+    mean_service_time: float = 1 / DEFAULT_SERVICE_RATE
+    last_arrival: Optional[datetime] = None
+    arrivals: int = 0
+    completions: int = 0
+
+    def arrival_rate(self, now: datetime) -> float:
+        if self.mean_interarrival is None or self.last_arrival is None:
+            return 0.0
+        # A quiet spell longer than the usual gap pulls the rate down until the next arrival
+        idle = (now - self.last_arrival).total_seconds() / 60
+        return 1 / max(self.mean_interarrival, idle, 1e-9)
+
+    @property
+    def service_rate(self) -> float:
+        return 1 / self.mean_service_time
+
+
+class RateEstimatorStore:
+    """In-process per-department rate estimates, updated in O(1) per patient event."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._departments: Dict[int, DepartmentRates] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, department_id: int) -> DepartmentRates:
+        rates = self._departments.get(department_id)
+        if rates is None:
+            rates = self._departments[department_id] = DepartmentRates()
+        return rates
+
+    def record_arrival(self, department_id: int, at: Optional[datetime] = None, count: int = 1):
+        """Fold ``count`` arrivals at ``at`` into the estimate.
+
+        A group counts as ``count`` arrivals evenly spread over the gap since the last one, so a
+        batch registered at one instant moves the estimate as far as the same arrivals spaced
+        out would, instead of collapsing it with zero-length intervals.
+        """
+        at = at or datetime.utcnow()
+        with self._lock:
+            rates = self._get(department_id)
+            if rates.last_arrival is not None and at >= rates.last_arrival:
+                interval = (at - rates.last_arrival).total_seconds() / 60 / count
+                if rates.mean_interarrival is None:
+                    rates.mean_interarrival = interval
+                else:
+                    weight = 1 - (1 - self.alpha) ** count  # ``count`` updates with the same interval
+                    rates.mean_interarrival += weight * (interval - rates.mean_interarrival)
+            if rates.last_arrival is None or at > rates.last_arrival:
+                rates.last_arrival = at
+            rates.arrivals += count
+
+    def record_completion(self, department_id: int, service_minutes: float):
+        with self._lock:
+            rates = self._get(department_id)
+            rates.mean_service_time += self.alpha * (service_minutes - rates.mean_service_time)
+            rates.completions += 1
+
+    def has_estimate(self, department_id: int) -> bool:
+        rates = self._departments.get(department_id)
+        return rates is not None and rates.mean_interarrival is not None
+
+    def rates(self, department_ids: Iterable[int], now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Arrival and service rates (per minute) for the given departments, without touching the database."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            pairs = [
+                (rates.arrival_rate(now), rates.service_rate) if rates else (0.0, DEFAULT_SERVICE_RATE)
+                for rates in (self._departments.get(dept_id) for dept_id in department_ids)
+            ]
+        if not pairs:
+            return np.empty(0), np.empty(0)
+        arrival, service = zip(*pairs)
+        return np.asarray(arrival), np.asarray(service)
+
+    def warm_start(self, window: timedelta = timedelta(hours=2)) -> int:
+        """Rebuild arrival estimates from recent Patient.arrival_time rows. Requires an app context."""
+        since = datetime.utcnow() - window
+        rows = db.session.execute(
+            db.select(Patient.department_id, Patient.arrival_time)
+            .where(Patient.arrival_time >= since)
+            .order_by(Patient.arrival_time)
+        ).all()
+        with self._lock:
+            self._departments.clear()
+        for department_id, arrival_time in rows:
+            self.record_arrival(department_id, arrival_time)
+        return len(rows)
@@ -0,0 +1,183 @@
+"""Monthly expense rollups per hospital and category, and streaming expense export.
+
+New expenses go through ``create``, which adds the amount to its month's ``ExpenseMonthly``
+row in the same transaction, so totals by hospital, month and category read a few small rows
+whatever the history. ``backfill`` rebuilds the rollups from raw expenses; ``export`` streams
+raw rows as CSV or NDJSON from a server-side cursor, a chunk at a time.
+
+    python -m backend.expenses backfill
+"""
+from __future__ import annotations
+import csv
+import io
+import sys
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from backend import serialization
+from backend.extensions import db
+from backend.models import Expense, ExpenseMonthly
+
+DEFAULT_CATEGORY = 'General'
+GROUPINGS = {'hospital': ExpenseMonthly.hospital_id, 'month': ExpenseMonthly.month, 'category': ExpenseMonthly.category}
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_COLUMNS = ('id', 'hospital_id', 'date', 'category', 'description', 'amount')
+EXPORT_BATCH_SIZE = 5000
+INSERT_BATCH_SIZE = 1000
+
+
+def month_of(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _bump(hospital_id: int, month: date, category: str, amount: float):
+    """Add one expense to its month's totals, creating the row on the month's first expense."""
+    for _ in range(2):
+        updated = db.session.execute(
+            db.update(ExpenseMonthly)
+            .where(ExpenseMonthly.hospital_id == hospital_id, ExpenseMonthly.month == month,
+                   ExpenseMonthly.category == category)
+            .values(total=ExpenseMonthly.total + amount, count=ExpenseMonthly.count + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(ExpenseMonthly(hospital_id=hospital_id, month=month, category=category,
+                                              total=amount, count=1))
+            return
+        except IntegrityError:
+            continue  # Another worker created the row first; add to theirs instead
+
+
+def create(hospital_id: int, description: str, amount: float, day: Optional[date] = None,
+           category: Optional[str] = None) -> Expense:
+    """Record an expense and fold it into the monthly rollups in one transaction."""
+    expense = Expense(hospital_id=hospital_id, description=description, amount=amount,
+                      date=day or datetime.utcnow().date(), category=category or DEFAULT_CATEGORY)
+    db.session.add(expense)
+    try:
+        db.session.flush()
+        _bump(expense.hospital_id, month_of(expense.date), expense.category, expense.amount)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return expense
+
+
+def summary(group_by: Sequence[str], hospital_id: Optional[int] = None, start: Optional[date] = None,
+            end: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Expense totals grouped by any of hospital, month and category.
+
+    ``start``/``end`` select whole months: the month containing ``start`` up to, but not
+    including, the month containing ``end``.
+    """
+    unknown = [name for name in group_by if name not in GROUPINGS]
+    if unknown or not group_by:
+        raise ValueError(f'group_by must be a comma-separated subset of {list(GROUPINGS)}')
+    columns = [GROUPINGS[name].label(name) for name in group_by]
+    query = db.select(*columns, func.sum(ExpenseMonthly.total).label('total'),
+                      func.sum(ExpenseMonthly.count).label('count'))
+    if hospital_id is not None:
+        query = query.where(ExpenseMonthly.hospital_id == hospital_id)
+    if start:
+        query = query.where(ExpenseMonthly.month >= month_of(start))
+    if end:
+        query = query.where(ExpenseMonthly.month < month_of(end))
+    query = query.group_by(*[GROUPINGS[name] for name in group_by]).order_by(*[GROUPINGS[name] for name in group_by])
+
+    rows = []
+    for row in db.session.execute(query):
+        values = row._asdict()
+        if 'month' in values:
+            values['month'] = values['month'].strftime('%Y-%m')
+        values['total'] = round(values['total'], 2)
+        rows.append(values)
+    return rows
+
+
+def export(fmt: str, hospital_id: Optional[int] = None, start: Optional[date] = None,
+           end: Optional[date] = None) -> Iterator[str]:
+    """Expense rows as CSV or NDJSON text chunks, read from a server-side cursor in constant memory."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of {sorted(EXPORT_FORMATS)}')
+    query = db.select(Expense.id, Expense.hospital_id, Expense.date, Expense.category, Expense.description,
+                      Expense.amount)
+    if hospital_id is not None:
+        query = query.where(Expense.hospital_id == hospital_id)
+    if start:
+        query = query.where(Expense.date >= start)
+    if end:
+        query = query.where(Expense.date < end)
+    result = db.session.execute(query.order_by(Expense.id).execution_options(stream_results=True))
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for partition in result.partitions(EXPORT_BATCH_SIZE):
+            writer.writerows((e.id, e.hospital_id, e.date.isoformat() if e.date else '',
+                              e.category or DEFAULT_CATEGORY, e.description, e.amount) for e in partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    for partition in result.partitions(EXPORT_BATCH_SIZE):
+        yield ''.join(serialization.dumps({
+            'id': e.id, 'hospital_id': e.hospital_id, 'date': e.date.isoformat() if e.date else None,
+            'category': e.category or DEFAULT_CATEGORY, 'description': e.description, 'amount': e.amount
+        }) + '\n' for e in partition)
+
+
+def backfill(executor=None) -> int:
+    """Rebuild every monthly row from raw expenses; returns the number of rows written.
+
+    ``executor`` is a session or connection (default: ``db.session``); the caller commits.
+    """
+    executor = executor if executor is not None else db.session
+    expense = Expense.__table__
+    result = executor.execute(
+        db.select(expense.c.hospital_id, expense.c.date, expense.c.category, expense.c.amount)
+        .where(expense.c.date.isnot(None))
+        .execution_options(stream_results=True)
+    )
+    totals: Dict[tuple, Dict[str, Any]] = {}
+    for partition in result.partitions(EXPORT_BATCH_SIZE):
+        for hospital_id, day, category, amount in partition:
+            key = (hospital_id, month_of(day), category or DEFAULT_CATEGORY)
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = {'hospital_id': key[0], 'month': key[1], 'category': key[2], 'total': 0.0, 'count': 0}
+            row['total'] += amount
+            row['count'] += 1
+
+    executor.execute(ExpenseMonthly.__table__.delete())
+    values = list(totals.values())
+    for i in range(0, len(values), INSERT_BATCH_SIZE):
+        executor.execute(ExpenseMonthly.__table__.insert(), values[i:i + INSERT_BATCH_SIZE])
+    return len(values)
+
+
+def main(argv: List[str]) -> int:
+    if argv[:1] != ['backfill']:
+        print('usage: python -m backend.expenses backfill')
+        return 2
+
+    from backend.app import app
+
+    with app.app_context():
+        written = backfill()
+        db.session.commit()
+    print(f"Wrote {written} monthly expense rollup rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,3 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
 
-db = SQLAlchemy()
+from backend import storage
+
+
+class ProfiledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy whose engines follow the app's ``STORAGE_PROFILE`` (see backend/storage.py).
+
+    The profile goes in through ``SQLALCHEMY_ENGINE_OPTIONS`` and a ``connect`` listener on the
+    built engine, which Flask-SQLAlchemy 2.x and 3.x both honour."""
+
+    def init_app(self, app):
+        sa_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage.apply_profile(
+            app.config, sa_url, dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}))
+        super().init_app(app)
+        pragmas = storage.profile_pragmas(app.config, sa_url)
+        if pragmas:
+            with app.app_context():
+                storage.install_pragmas(self.engine, pragmas)  # Built here, before its first connection
+
+
+db = ProfiledSQLAlchemy()
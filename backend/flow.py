@@ -0,0 +1,101 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from flask import current_app
+
+from backend import rollups
+from backend.extensions import db
+from backend.models import OPDQueue, Patient
+from backend.rooms import publish
+
+
+@dataclass
+class Completion:
+    patient_id: int
+    department_id: int
+    hospital_id: int
+    status: str
+    entry: Optional[OPDQueue] = None  # The queue entry closed with the patient, if they had one
+
+
+class PatientFlow:
+    """The one way a patient leaves the queue, whether a REST client or a socket reports it.
+
+    The patient row, their OPD queue entry and its hourly rollup change in one transaction;
+    once it commits, the in-process copies that mirror them follow: the dashboard snapshot,
+    the service-time estimate and the wait-time broadcaster.
+    """
+
+    def __init__(self, socketio, rate_store, dashboard, broadcaster):
+        self.socketio = socketio
+        self.rate_store = rate_store
+        self.dashboard = dashboard
+        self.broadcaster = broadcaster
+
+    def init_app(self, app):
+        app.extensions['patient_flow'] = self
+
+    def complete(self, entry_id: Optional[int] = None, patient_id: Optional[int] = None, status: str = 'Served',
+                 service_minutes: Optional[float] = None, at: Optional[datetime] = None) -> Optional[Completion]:
+        """Take a patient out of the queue by queue entry or by patient; None if neither was waiting.
+
+        By patient, their latest waiting entry (if any) is closed with them. Requires an app context.
+        """
+        if status not in rollups.EXIT_STATUSES:
+            raise ValueError(f'status must be one of {list(rollups.EXIT_STATUSES)}')
+        if service_minutes is not None and not (math.isfinite(service_minutes) and service_minutes > 0):
+            raise ValueError('service_minutes must be a positive number')
+        at = at or datetime.utcnow()
+        try:
+            if entry_id is None:
+                entry_id = db.session.execute(
+                    db.select(OPDQueue.id)
+                    .where(OPDQueue.patient_id == patient_id, OPDQueue.status == 'Waiting')
+                    .order_by(OPDQueue.timestamp.desc(), OPDQueue.id.desc()).limit(1)
+                ).scalar()
+                entry = rollups.close(entry_id, status, at) if entry_id is not None else None
+            else:
+                entry = rollups.close(entry_id, status, at)
+                if entry is None:
+                    db.session.rollback()
+                    return None
+                patient_id = entry.patient_id
+
+            was_waiting = db.session.execute(
+                db.update(Patient)
+                .where(Patient.id == patient_id, Patient.status == 'Waiting')
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            ).rowcount > 0
+            if entry is None and not was_waiting:
+                db.session.rollback()
+                return None
+            department_id, hospital_id = db.session.execute(
+                db.select(Patient.department_id, Patient.hospital_id).where(Patient.id == patient_id)
+            ).one()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if was_waiting:
+            self.dashboard.adjust('queue', length=-1)
+        if status == 'Served' and service_minutes is not None:
+            self.rate_store.record_completion(department_id, service_minutes)
+        self.broadcaster.mark_dirty([department_id])
+        if entry is not None:
+            publish(self.socketio, 'queue_update', {
+                'queue_number': entry.id,
+                'hospital_id': entry.hospital_id,
+                'status': status,
+                'patients_queuing': rollups.waiting_length(entry.hospital_id)
+            }, hospital_id=entry.hospital_id, namespace='/socket')
+        return Completion(patient_id, department_id, hospital_id, status, entry)
+
+
+def current() -> PatientFlow:
+    """The patient flow of the app handling the current request."""
+    return current_app.extensions['patient_flow']
@@ -0,0 +1,152 @@
+"""In-process cache of logged-in users' identities, so ``user_loader`` skips the database.
+
+Flask-Login reloads the user on every authenticated request. ``UserCache.load`` answers from
+a bounded TTL/LRU map of ``Identity`` snapshots (id, username, role) instead, which is all
+``login_required``, ``current_user.is_staff`` and ``/api/check_login`` need; the password
+hash is never kept. Any ORM update or delete of a ``User`` (a role or password change)
+evicts that user when the flush happens and again after the commit, so a reload racing the
+write cannot keep the old role; ``ttl`` bounds what changes made outside the ORM can do.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from backend.extensions import db
+from backend.models import STAFF_ROLES, User
+
+
+@dataclass(frozen=True, eq=False)
+class Identity(UserMixin):
+    """What a request knows about its user, detached from any session."""
+    id: int
+    username: str
+    role: str
+
+    @property
+    def is_staff(self) -> bool:
+        return self.role in STAFF_ROLES
+
+    @classmethod
+    def of(cls, user: User) -> 'Identity':
+        return cls(id=user.id, username=user.username, role=user.role)
+
+
+class UserCache:
+    """Bounded TTL/LRU map of user id to ``Identity``; install with ``init_app``."""
+
+    def __init__(self, ttl: float = 60, max_entries: int = 10000, metrics=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._generations: Dict[int, int] = {}  # Bumped by invalidate, so a load that raced it is not stored
+        self._entries: 'OrderedDict[int, Tuple[float, Identity]]' = OrderedDict()
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.describe('user_cache_requests_total', 'counter', 'User identity cache lookups by result.')
+            metrics.describe('user_loader_queries_saved_total', 'counter',
+                             'User loads answered from the identity cache instead of the database.')
+
+    def init_app(self, app, login_manager):
+        app.extensions['user_cache'] = self
+        login_manager.user_loader(self.load)
+
+    def load(self, user_id) -> Optional[Identity]:
+        """Flask-Login ``user_loader``: the cached identity, or one read from the database."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                self._count('hit')
+                return entry[1]
+            self.misses += 1
+            self._count('miss')
+            generation = self._generations.get(user_id, 0)
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        identity = Identity.of(user)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return identity
+            self._entries[user_id] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return identity
+
+    def _count(self, result: str):
+        if self.metrics is not None:
+            self.metrics.inc('user_cache_requests_total', result=result)
+            if result == 'hit':
+                self.metrics.inc('user_loader_queries_saved_total')
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                if self._entries.pop(user_id, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'queries_saved': self.hits,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions
+        }
+
+
+def current() -> Optional[UserCache]:
+    """The user cache of the current app, if there is an app context and it has one."""
+    return current_app.extensions.get('user_cache') if has_app_context() else None
+
+
+_CHANGED_USERS = 'identity_changed_users'
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    user_cache = current()
+    if user_cache is not None:
+        user_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_USERS, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    changed: Set[int] = session.info.pop(_CHANGED_USERS, None)
+    user_cache = current()
+    if changed and user_cache is not None:
+        user_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_CHANGED_USERS, None)
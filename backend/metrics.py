@@ -0,0 +1,257 @@
+from __future__ import annotations
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+# Socket.IO retries connect handlers without the auth argument on TypeError, so wrapping them would time twice
+UNTIMED_EVENTS = ('connect', 'disconnect')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count for one label set."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Scope:
+    """What the current thread is handling, and the SQL it has run so far."""
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _le(bound) -> str:
+    return f'le="{bound}"'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """In-process counters, gauges and histograms for HTTP requests, socket events and SQL.
+
+    Each request or socket event runs in a thread-local scope; SQL statements executed inside it
+    are charged to that handler, the rest to ``background``. A scope that runs more than
+    ``query_warn_threshold`` statements logs a warning (0 disables it). ``render`` produces the
+    Prometheus text exposition format served at ``/metrics``.
+    """
+
+    def __init__(self, query_warn_threshold: int = 25):
+        self.query_warn_threshold = query_warn_threshold
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._bucket_sets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.describe('http_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+        self.describe('http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint.',
+                      LATENCY_BUCKETS)
+        self.describe('socketio_events_total', 'counter', 'Socket.IO events handled, by event and outcome.')
+        self.describe('socketio_event_duration_seconds', 'histogram', 'Socket.IO handler latency by event.',
+                      LATENCY_BUCKETS)
+        self.describe('socketio_emits_total', 'counter', 'Socket.IO emits by event name.')
+        self.describe('sql_statements_total', 'counter', 'SQL statements executed, by handler.')
+        self.describe('sql_seconds_total', 'counter', 'Time spent in SQL statements, by handler.')
+        self.describe('handler_sql_statements', 'histogram', 'SQL statements per request or socket event.',
+                      STATEMENT_BUCKETS)
+        self.describe('sql_statement_threshold_exceeded_total', 'counter',
+                      'Requests or socket events that ran more statements than the warning threshold.')
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None):
+        self._help[name] = (kind, help_text)
+        if kind == 'histogram':
+            self._bucket_sets[name] = buckets or LATENCY_BUCKETS
+            self._histograms.setdefault(name, {})
+        elif kind == 'counter':
+            self._counters.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._bucket_sets[name])
+            histogram.observe(value)
+
+    def gauge(self, name: str, read: Callable[[], float], help_text: str):
+        """Register a gauge whose value is read when metrics are rendered."""
+        self._help[name] = ('gauge', help_text)
+        self._gauges[name] = read
+
+    def _begin(self, handler: str):
+        self._local.scope = _Scope(handler)
+        self._local.started = time.perf_counter()
+
+    def _end(self) -> Optional[Tuple[_Scope, float]]:
+        scope = getattr(self._local, 'scope', None)
+        if scope is None:
+            return None
+        self._local.scope = None
+        elapsed = time.perf_counter() - self._local.started
+        self.observe('handler_sql_statements', scope.statements, handler=scope.handler)
+        if self.query_warn_threshold and scope.statements > self.query_warn_threshold:
+            self.inc('sql_statement_threshold_exceeded_total', handler=scope.handler)
+            logger.warning(f"{scope.handler} ran {scope.statements} SQL statements in {scope.sql_seconds * 1000:.0f}ms "
+                           f"(threshold {self.query_warn_threshold}); possible N+1 query")
+        return scope, elapsed
+
+    @contextmanager
+    def socket_event(self, event_name: str) -> Iterator[None]:
+        self._begin(f'socket:{event_name}')
+        outcome = 'error'
+        try:
+            yield
+            outcome = 'ok'
+        finally:
+            _, elapsed = self._end()
+            self.observe('socketio_event_duration_seconds', elapsed, event=event_name)
+            self.inc('socketio_events_total', event=event_name, outcome=outcome)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        scope = getattr(self._local, 'scope', None)
+        if scope is not None:
+            scope.statements += 1
+            scope.sql_seconds += elapsed
+        handler = scope.handler if scope is not None else 'background'
+        self.inc('sql_statements_total', handler=handler)
+        self.inc('sql_seconds_total', elapsed, handler=handler)
+
+    def install_engine(self, engine: Engine):
+        """Count and time the statements run on ``engine`` against the handler that ran them."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def init_app(self, app):
+        """Time every request and serve ``/metrics``; SQL is counted once ``install_engine`` has the app's engine."""
+        app.extensions['metrics'] = self
+
+        @app.before_request
+        def start_request_timer():
+            self._begin(f'http:{request.endpoint or "unmatched"}')
+
+        @app.after_request
+        def record_request(response):
+            self._record_request(response.status_code)
+            return response
+
+        @app.teardown_request
+        def close_request_timer(exc):
+            self._record_request(500)  # No-op unless after_request was skipped
+
+        @app.route('/metrics')
+        def metrics():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _record_request(self, status: int):
+        ended = self._end()
+        if ended is None:
+            return
+        scope, elapsed = ended
+        endpoint = scope.handler[len('http:'):]
+        self.inc('http_requests_total', endpoint=endpoint, method=request.method, status=status)
+        self.observe('http_request_duration_seconds', elapsed, endpoint=endpoint, method=request.method)
+
+    def init_socketio(self, socketio):
+        """Time handlers registered from now on and count every emit. Call before registering handlers."""
+        register = socketio.on
+        emit = socketio.emit
+
+        def on(message, namespace=None):
+            add_handler = register(message, namespace)
+            if message in UNTIMED_EVENTS:
+                return add_handler
+
+            def decorator(handler):
+                @functools.wraps(handler)
+                def timed(*args, **kwargs):
+                    with self.socket_event(message):
+                        return handler(*args, **kwargs)
+                add_handler(timed)
+                return handler
+            return decorator
+
+        def counted_emit(event_name, *args, **kwargs):
+            self.inc('socketio_emits_total', event=event_name)
+            return emit(event_name, *args, **kwargs)
+
+        socketio.on = on
+        socketio.emit = counted_emit  # flask_socketio.emit() inside handlers goes through this too
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                kind, help_text = self._help[name]
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                lines += [f'{name}{_format_labels(labels)} {_number(value)}' for labels, value in sorted(series.items())]
+            for name, series in self._histograms.items():
+                kind, help_text = self._help[name]
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_format_labels(labels, _le(bound))} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, _le("+Inf"))} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        for name, read in self._gauges.items():
+            _, help_text = self._help[name]
+            try:
+                value = read()
+            except Exception as e:
+                logger.warning(f"Could not read gauge {name}: {str(e)}")
+                continue
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {_number(value)}']
+        return '\n'.join(lines) + '\n'
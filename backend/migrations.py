@@ -0,0 +1,285 @@
+"""Versioned schema migrations for databases created before the current models.
+
+A fresh database is built with ``create_all``; this module brings an existing database
+forward in place instead, and ``ensure_schema`` picks between the two at startup. Each
+migration runs once, in order, inside its own transaction, and the highest applied version
+is kept in the ``schema_version`` table.
+Every step checks what is already there, so a database that ``create_all`` built from
+the current models is simply stamped with the latest version.
+
+    python -m backend.migrations upgrade          # apply pending migrations
+    python -m backend.migrations current          # print the applied version
+    python -m backend.migrations check-indexes    # EXPLAIN the hot queries, fail on table scans
+"""
+from __future__ import annotations
+import re
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, String, Table, cast, func, inspect, literal_column, select
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models import Bed, Expense, ExpenseMonthly, Inventory, OPDQueue, OPDQueueHourly, Patient, StockMovement, TriageEntry
+
+version_table = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(fn: Callable[[Connection], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1].version < version, 'migrations must be registered in order'
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+
+def _add_missing_columns(conn: Connection, table: Table, names: List[str]):
+    existing = {col['name'] for col in inspect(conn).get_columns(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} ' \
+              f'{column.type.compile(conn.dialect)}'
+        for fk in column.foreign_keys:
+            ddl += f' REFERENCES {preparer.quote(fk.column.table.name)} ({preparer.quote(fk.column.name)})'
+        conn.exec_driver_sql(ddl)
+
+
+def _create_indexes(conn: Connection, table: Table):
+    existing = {index['name'] for index in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+@migration(1, 'Patient arrival/status, bed occupant and the triage table')
+def _queue_columns(conn: Connection):
+    _add_missing_columns(conn, Patient.__table__, ['arrival_time', 'status'])
+    # ADD COLUMN leaves existing rows NULL; the model default only applies to new inserts
+    patient = Patient.__table__
+    conn.execute(patient.update().where(patient.c.status.is_(None)).values(status='Waiting'))
+    _add_missing_columns(conn, Bed.__table__, ['patient_id'])
+    TriageEntry.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, TriageEntry.__table__)
+
+
+@migration(2, 'Composite indexes for the hot query shapes, unique inventory items per hospital')
+def _hot_path_indexes(conn: Connection):
+    # Fold duplicate inventory rows into the oldest one so the unique index can be built
+    inventory = Inventory.__table__
+    duplicates = conn.execute(
+        select(inventory.c.hospital_id, inventory.c.item_name,
+               func.min(inventory.c.id), func.sum(inventory.c.quantity))
+        .group_by(inventory.c.hospital_id, inventory.c.item_name)
+        .having(func.count() > 1)
+    ).all()
+    for hospital_id, item_name, keep_id, quantity in duplicates:
+        conn.execute(inventory.update().where(inventory.c.id == keep_id).values(quantity=quantity))
+        conn.execute(inventory.delete().where(inventory.c.hospital_id == hospital_id,
+                                              inventory.c.item_name == item_name,
+                                              inventory.c.id != keep_id))
+
+    for model in (OPDQueue, Patient, Bed, Inventory):
+        _create_indexes(conn, model.__table__)
+
+
+@migration(3, 'OPD queue completion time and hourly rollups')
+def _opd_rollups(conn: Connection):
+    _add_missing_columns(conn, OPDQueue.__table__, ['completed_at'])
+    OPDQueueHourly.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, OPDQueueHourly.__table__)
+
+
+@migration(4, 'Stock movement ledger')
+def _stock_ledger(conn: Connection):
+    StockMovement.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, StockMovement.__table__)
+
+
+@migration(5, 'Expense categories and monthly expense rollups')
+def _expense_rollups(conn: Connection):
+    _add_missing_columns(conn, Expense.__table__, ['category'])
+    ExpenseMonthly.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, ExpenseMonthly.__table__)
+
+    # Plain SQL rather than backend.expenses, so this step stays as it was whatever that module becomes.
+    # The month is a literal, not a bind, so GROUP BY matches the selected expression on every backend
+    expense, monthly = Expense.__table__, ExpenseMonthly.__table__
+    conn.execute(expense.update().where(expense.c.category.is_(None)).values(category='General'))
+    if conn.dialect.name == 'sqlite':
+        month = func.date(expense.c.date, literal_column("'start of month'"))
+    elif conn.dialect.name == 'postgresql':
+        month = cast(func.date_trunc(literal_column("'month'"), expense.c.date), Date)
+    elif conn.dialect.name == 'mysql':
+        month = func.date_format(expense.c.date, literal_column("'%Y-%m-01'"))
+    else:
+        raise NotImplementedError(f'No month expression for {conn.dialect.name}')
+    conn.execute(monthly.delete())
+    conn.execute(monthly.insert().from_select(
+        ['hospital_id', 'month', 'category', 'total', 'count'],
+        select(expense.c.hospital_id, month, expense.c.category, func.sum(expense.c.amount), func.count())
+        .where(expense.c.date.isnot(None))
+        .group_by(expense.c.hospital_id, month, expense.c.category)
+    ))
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(version_table.name):
+        return 0
+    return conn.execute(select(func.max(version_table.c.version))).scalar() or 0
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to ``target`` (default: all); returns the versions applied."""
+    with engine.begin() as conn:
+        version_table.create(conn, checkfirst=True)
+    applied = []
+    for step in MIGRATIONS:
+        if target is not None and step.version > target:
+            break
+        with engine.begin() as conn:
+            if step.version <= current_version(conn):
+                continue
+            step.apply(conn)
+            conn.execute(version_table.insert().values(version=step.version, description=step.description))
+        applied.append(step.version)
+    return applied
+
+
+def stamp(engine: Engine):
+    """Record a freshly ``create_all``-ed schema as fully migrated."""
+    applied = []
+    with engine.begin() as conn:
+        version_table.create(conn, checkfirst=True)
+        version = current_version(conn)
+        for step in MIGRATIONS:
+            if step.version > version:
+                conn.execute(version_table.insert().values(version=step.version, description=step.description))
+                applied.append(step.version)
+    return applied
+
+
+def ensure_schema(engine: Engine, metadata: MetaData) -> Tuple[bool, List[int]]:
+    """Create or bring forward the schema in place, never dropping anything; safe on every start.
+
+    An empty database gets ``create_all`` and is stamped; an existing one gets its pending
+    migrations, then ``create_all`` adds any table no migration covers. Returns whether the
+    schema was created, and the migrations applied.
+    """
+    if not inspect(engine).get_table_names():
+        metadata.create_all(engine)
+        stamp(engine)
+        return True, []
+    applied = upgrade(engine)
+    metadata.create_all(engine)
+    return False, applied
+
+
+# Query shapes the dashboards and queue endpoints run on every request, with the index each should use
+HOT_QUERIES: List[Tuple[str, str, object]] = [
+    ('opd queue by hospital', 'ix_opd_queue_hospital_status_timestamp',
+     select(OPDQueue.id).where(OPDQueue.hospital_id == 1, OPDQueue.status == 'Waiting').order_by(OPDQueue.timestamp)),
+    ('waiting patients by department', 'ix_patient_department_status_arrival',
+     select(func.count(Patient.id)).where(Patient.department_id == 1, Patient.status == 'Waiting')),
+    ('patients arrived since', 'ix_patient_arrival_time',
+     select(Patient.department_id).where(Patient.arrival_time >= datetime(2000, 1, 1))),
+    ('free beds by department', 'ix_bed_department_available',
+     select(Bed.id).where(Bed.department_id == 1, Bed.is_available == True)),
+    ('inventory item by hospital', 'uq_inventory_hospital_item',
+     select(Inventory.id).where(Inventory.hospital_id == 1, Inventory.item_name == 'Paracetamol')),
+    ('opd history range', 'uq_opd_queue_hourly_hospital_hour',
+     select(OPDQueueHourly.hour, OPDQueueHourly.arrivals)
+     .where(OPDQueueHourly.hospital_id == 1, OPDQueueHourly.hour >= datetime(2000, 1, 1))
+     .order_by(OPDQueueHourly.hour)),
+    ('stock ledger by item', 'ix_stock_movement_hospital_item',
+     select(StockMovement.id).where(StockMovement.hospital_id == 1, StockMovement.item_name == 'Paracetamol')
+     .order_by(StockMovement.id)),
+    ('expense totals by hospital', 'uq_expense_monthly_hospital_month_category',
+     select(ExpenseMonthly.month, func.sum(ExpenseMonthly.total))
+     .where(ExpenseMonthly.hospital_id == 1, ExpenseMonthly.month >= datetime(2000, 1, 1).date())
+     .group_by(ExpenseMonthly.month)),
+    ('next triage entry', 'ix_triage_entry_department_status_priority',
+     select(TriageEntry.id).where(TriageEntry.department_id == 1, TriageEntry.status == 'Waiting')
+     .order_by(TriageEntry.priority, TriageEntry.id).limit(1)),
+]
+
+
+def explain(conn: Connection, stmt) -> str:
+    """The query plan for ``stmt`` as text; supports SQLite, PostgreSQL and MySQL."""
+    compiled = stmt.compile(dialect=conn.dialect)
+    sql = str(compiled)
+    params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).all()
+        return '\n'.join(row[-1] for row in rows)
+    if conn.dialect.name == 'postgresql':
+        # Tiny tables make a sequential scan the cheapest plan; ask what the planner would use otherwise
+        conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = conn.exec_driver_sql('EXPLAIN ' + sql, params).all()
+        return '\n'.join(row[0] for row in rows)
+    if conn.dialect.name == 'mysql':
+        # Same for MySQL: make every index look cheaper than a scan, for this EXPLAIN only
+        conn.exec_driver_sql('SET SESSION max_seeks_for_key = 1')
+        try:
+            rows = conn.exec_driver_sql('EXPLAIN ' + sql, params).mappings().all()
+        finally:
+            conn.exec_driver_sql('SET SESSION max_seeks_for_key = DEFAULT')
+        return '\n'.join(f"{row['table']} type={row['type']} key={row['key']} {row['Extra'] or ''}".rstrip()
+                         for row in rows)
+    raise NotImplementedError(f'EXPLAIN is not supported for {conn.dialect.name}')
+
+
+def check_indexes(engine: Engine) -> List[Tuple[str, str, bool]]:
+    """EXPLAIN every hot query; returns (name, plan, uses expected index) for each."""
+    results = []
+    with engine.connect() as conn:
+        for name, index, stmt in HOT_QUERIES:
+            with conn.begin():
+                plan = explain(conn, stmt)
+            full_scan = re.search(r'^SCAN \w+$|Seq Scan|type=ALL\b', plan, re.MULTILINE) is not None
+            results.append((name, plan, index in plan and not full_scan))
+    return results
+
+
+def main(argv: List[str]) -> int:
+    from backend.app import app
+    from backend.extensions import db
+
+    command = argv[0] if argv else 'upgrade'
+    with app.app_context():
+        engine = db.engine
+        if command == 'upgrade':
+            applied = upgrade(engine)
+            print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+        elif command == 'current':
+            with engine.connect() as conn:
+                print(current_version(conn))
+        elif command == 'check-indexes':
+            failures = 0
+            for name, plan, ok in check_indexes(engine):
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {name}: {' / '.join(plan.splitlines())}")
+            return 1 if failures else 0
+        else:
+            print(f"Unknown command {command!r}; expected upgrade, current or check-indexes")
+            return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,12 @@
 from backend.extensions import db
 from flask_login import UserMixin
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, backref, relationship
 from datetime import datetime
 from typing import List, Optional
 
+# Roles allowed into staff-only endpoints
+STAFF_ROLES = frozenset({'admin', 'doctor', 'nurse', 'staff'})
+
 class City(db.Model):
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     name: Mapped[str] = db.Column(db.String(100), nullable=False)
@@ -23,34 +26,93 @@ class Hospital(db.Model):
     medicines: Mapped[List["Medicine"]] = relationship("Medicine", back_populates="hospital")
 
 class Patient(db.Model):
+    __table_args__ = (
+        db.Index('ix_patient_department_status_arrival', 'department_id', 'status', 'arrival_time'),
+        db.Index('ix_patient_arrival_time', 'arrival_time'),
+    )
+
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     name: Mapped[str] = db.Column(db.String(100), nullable=False)
     age: Mapped[int] = db.Column(db.Integer)
     gender: Mapped[str] = db.Column(db.String(10))
     hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
     department_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    arrival_time: Mapped[datetime] = db.Column(db.DateTime, default=datetime.utcnow)
+    status: Mapped[str] = db.Column(db.String(20), default='Waiting')
     opd_queues: Mapped[List["OPDQueue"]] = relationship('OPDQueue', backref='patient', lazy=True)
 
 class OPDQueue(db.Model):
+    __table_args__ = (
+        db.Index('ix_opd_queue_hospital_status_timestamp', 'hospital_id', 'status', 'timestamp'),
+    )
+
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     patient_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
     timestamp: Mapped[datetime] = db.Column(db.DateTime, default=datetime.utcnow)
     status: Mapped[str] = db.Column(db.String(20), default='Waiting')
+    completed_at: Mapped[Optional[datetime]] = db.Column(db.DateTime)  # When the entry left the queue
+
+class OPDQueueHourly(db.Model):
+    """Per-hospital OPD queue figures for one hour, kept up to date as queue entries change."""
+    __table_args__ = (
+        db.Index('uq_opd_queue_hourly_hospital_hour', 'hospital_id', 'hour', unique=True),
+    )
+
+    id: Mapped[int] = db.Column(db.Integer, primary_key=True)
+    hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
+    hour: Mapped[datetime] = db.Column(db.DateTime, nullable=False)  # Start of the hour, UTC
+    arrivals: Mapped[int] = db.Column(db.Integer, default=0, nullable=False)
+    served: Mapped[int] = db.Column(db.Integer, default=0, nullable=False)
+    peak_length: Mapped[int] = db.Column(db.Integer, default=0, nullable=False)
+    wait_minutes_total: Mapped[float] = db.Column(db.Float, default=0.0, nullable=False)  # Over served entries
 
 class Inventory(db.Model):
+    __table_args__ = (
+        db.Index('uq_inventory_hospital_item', 'hospital_id', 'item_name', unique=True),
+    )
+
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
     item_name: Mapped[str] = db.Column(db.String(100), nullable=False)
     quantity: Mapped[int] = db.Column(db.Integer, default=0)
     unit_price: Mapped[float] = db.Column(db.Float, default=0.0)
 
+class StockMovement(db.Model):
+    """Append-only ledger of inventory changes; ``quantity_after`` is the item's stock once the movement applied."""
+    __table_args__ = (
+        db.Index('ix_stock_movement_hospital_item', 'hospital_id', 'item_name', 'id'),
+    )
+
+    id: Mapped[int] = db.Column(db.Integer, primary_key=True)
+    hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
+    item_name: Mapped[str] = db.Column(db.String(100), nullable=False)
+    delta: Mapped[int] = db.Column(db.Integer, nullable=False)  # Positive for receipts, negative for dispensing
+    quantity_after: Mapped[int] = db.Column(db.Integer, nullable=False)
+    reason: Mapped[Optional[str]] = db.Column(db.String(50))
+    reference: Mapped[Optional[str]] = db.Column(db.String(100))  # e.g. a prescription or delivery note
+    created_at: Mapped[datetime] = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
 class Expense(db.Model):
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
     description: Mapped[str] = db.Column(db.String(200), nullable=False)
     amount: Mapped[float] = db.Column(db.Float, nullable=False)
     date: Mapped[datetime] = db.Column(db.Date, default=datetime.utcnow().date)
+    category: Mapped[Optional[str]] = db.Column(db.String(50), default='General')
+
+class ExpenseMonthly(db.Model):
+    """Expense totals for one hospital, month and category, kept up to date as expenses are recorded."""
+    __table_args__ = (
+        db.Index('uq_expense_monthly_hospital_month_category', 'hospital_id', 'month', 'category', unique=True),
+    )
+
+    id: Mapped[int] = db.Column(db.Integer, primary_key=True)
+    hospital_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('hospital.id'), nullable=False)
+    month: Mapped[datetime] = db.Column(db.Date, nullable=False)  # First day of the month
+    category: Mapped[str] = db.Column(db.String(50), nullable=False)
+    total: Mapped[float] = db.Column(db.Float, default=0.0, nullable=False)
+    count: Mapped[int] = db.Column(db.Integer, default=0, nullable=False)
 
 class User(UserMixin, db.Model):
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
@@ -58,6 +120,10 @@ class User(UserMixin, db.Model):
     password: Mapped[str] = db.Column(db.String(120), nullable=False)
     role: Mapped[str] = db.Column(db.String(20), nullable=False)
 
+    @property
+    def is_staff(self) -> bool:
+        return self.role in STAFF_ROLES
+
 class Department(db.Model):
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
     name: Mapped[str] = db.Column(db.String(50), unique=True, nullable=False)
@@ -71,10 +137,31 @@ class Doctor(db.Model):
     is_available: Mapped[bool] = db.Column(db.Boolean, default=True, index=True)
 
 class Bed(db.Model):
+    __table_args__ = (
+        db.Index('ix_bed_department_available', 'department_id', 'is_available'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     bed_number = db.Column(db.String(50), nullable=False)  # Change this line
     is_available = db.Column(db.Boolean, default=True)
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'))
+    patient = relationship('Patient', backref=backref('bed', uselist=False))
+
+class TriageEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_triage_entry_department_status_priority', 'department_id', 'status', 'priority', 'id'),
+    )
+
+    id: Mapped[int] = db.Column(db.Integer, primary_key=True)
+    patient_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    department_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    priority: Mapped[int] = db.Column(db.Integer, nullable=False)  # Lower is more urgent
+    status: Mapped[str] = db.Column(db.String(20), default='Waiting', nullable=False)
+    created_at: Mapped[datetime] = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at: Mapped[Optional[datetime]] = db.Column(db.DateTime)
+    claimed_by: Mapped[Optional[str]] = db.Column(db.String(80))
+    patient: Mapped["Patient"] = relationship('Patient')
 
 class Medicine(db.Model):
     id: Mapped[int] = db.Column(db.Integer, primary_key=True)
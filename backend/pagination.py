@@ -0,0 +1,85 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from flask import Response, json, jsonify, request, stream_with_context
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+
+
+class PageArgs(NamedTuple):
+    after: Optional[int]
+    limit: int
+    stream: Optional[str]
+
+
+def page_args(args=None) -> PageArgs:
+    """Read ``after``/``limit``/``stream`` from the query string; raises ValueError on bad input."""
+    args = request.args if args is None else args
+    after = args.get('after', type=int)
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    stream = args.get('stream')
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f'stream must be one of {sorted(STREAM_FORMATS)}')
+    return PageArgs(after, limit, stream)
+
+
+def date_range(args=None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Parse optional ISO-8601 ``start``/``end`` query parameters."""
+    args = request.args if args is None else args
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else None
+        end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be ISO-8601 dates')
+    return start, end
+
+
+def _stream(session, stmt, serialize: Callable[[Any], Dict[str, Any]], fmt: str) -> Iterator[str]:
+    result = session.execute(stmt.execution_options(stream_results=True))
+    first = True
+    if fmt == 'json':
+        yield '['
+    for partition in result.partitions(STREAM_BATCH_SIZE):
+        chunk = [json.dumps(serialize(row)) for row in partition]
+        if fmt == 'json':
+            yield ('' if first else ',') + ','.join(chunk)
+        else:
+            yield '\n'.join(chunk) + '\n'
+        first = False
+    if fmt == 'json':
+        yield ']'
+
+
+def paginate(session, stmt, key, serialize: Callable[[Any], Dict[str, Any]], page: Optional[PageArgs] = None) -> Response:
+    """Respond with one keyset page of ``stmt`` ordered by ``key``, or stream every row when asked to.
+
+    Pages keep the plain JSON list body; the cursor for the next page travels in the
+    ``X-Next-Cursor`` and ``Link`` headers.
+    """
+    page = page or page_args()
+    if page.after is not None:
+        stmt = stmt.where(key > page.after)
+    stmt = stmt.order_by(key)
+
+    if page.stream:
+        return Response(stream_with_context(_stream(session, stmt, serialize, page.stream)),
+                        mimetype=STREAM_FORMATS[page.stream])
+
+    rows = session.execute(stmt.limit(page.limit + 1)).all()
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+    response = jsonify([serialize(row) for row in rows])
+    if has_more:
+        cursor = getattr(rows[-1], key.key)
+        args = request.args.to_dict()
+        args.update(after=cursor, limit=page.limit)
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from backend.lazy import LazyModule
+
+np = LazyModule('numpy')  # Imported on first use, not at startup
+
+# All rates are expressed per minute, so wait times come out in minutes.
+DEFAULT_SERVICE_RATE = 1 / 15  # Assume average service time of 15 minutes
+
+
+@dataclass(frozen=True)
+class QueueMetrics:
+    wait_time: float
+    utilization: float
+    probability_of_waiting: float
+
+
+@dataclass(frozen=True)
+class QueueMetricsBatch:
+    wait_time: np.ndarray
+    utilization: np.ndarray
+    probability_of_waiting: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.wait_time)
+
+    def __getitem__(self, i: int) -> QueueMetrics:
+        return QueueMetrics(float(self.wait_time[i]), float(self.utilization[i]), float(self.probability_of_waiting[i]))
+
+
+def erlang_b(servers: np.ndarray, offered_load: np.ndarray) -> np.ndarray:
+    """Erlang-B blocking probability via the stable recursion B(k) = aB(k-1) / (k + aB(k-1))."""
+    servers = np.asarray(servers, dtype=np.int64)
+    load = np.asarray(offered_load, dtype=np.float64)
+    b = np.ones(np.broadcast(servers, load).shape, dtype=np.float64)
+    for k in range(1, int(servers.max(initial=0)) + 1):
+        step = load * b
+        b = np.where(servers >= k, step / (k + step), b)
+    return b
+
+
+def _score(servers: np.ndarray, arrival_rate: np.ndarray, service_rate: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    servers = np.asarray(servers, dtype=np.int64)
+    arrival_rate = np.asarray(arrival_rate, dtype=np.float64)
+    service_rate = np.asarray(service_rate, dtype=np.float64)
+
+    idle = arrival_rate <= 0
+    capacity = servers * service_rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        load = arrival_rate / service_rate
+        rho = np.where(idle, 0.0, arrival_rate / capacity)
+    stable = idle | ((servers > 0) & (rho < 1))
+
+    # Erlang-C from Erlang-B: C = cB / (c - a(1 - B)); only meaningful where the system is stable.
+    safe_servers = np.where(stable, servers, 0)
+    safe_load = np.where(stable & ~idle, load, 0.0)
+    b = erlang_b(safe_servers, safe_load)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = np.where(idle, 0.0, safe_servers * b / (safe_servers - safe_load * (1 - b)))
+        wq = np.where(idle, 0.0, c / (capacity - arrival_rate))
+
+    wait_time = np.where(stable, wq, np.inf)
+    prob_of_waiting = np.where(stable, c, 1.0)
+    return wait_time, rho, prob_of_waiting
+
+
+class ErlangCEngine:
+    """M/M/c queue scoring with results memoized on (servers, arrival_rate, service_rate)."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache: OrderedDict[Tuple[int, float, float], QueueMetrics] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Tuple[int, float, float]):
+        with self._lock:
+            metrics = self._cache.get(key)
+            if metrics is not None:
+                self._cache.move_to_end(key)
+            return metrics
+
+    def _store(self, key: Tuple[int, float, float], metrics: QueueMetrics):
+        with self._lock:
+            self._cache[key] = metrics
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def metrics(self, servers: int, arrival_rate: float, service_rate: float = DEFAULT_SERVICE_RATE) -> QueueMetrics:
+        """Score a single queue."""
+        return self.batch([servers], [arrival_rate], [service_rate])[0]
+
+    def batch(self, servers, arrival_rates, service_rates=DEFAULT_SERVICE_RATE) -> QueueMetricsBatch:
+        """Score many queues at once; only cache misses are computed, in one vectorized pass."""
+        servers = np.asarray(servers, dtype=np.int64)
+        arrival_rates = np.asarray(arrival_rates, dtype=np.float64)
+        service_rates = np.broadcast_to(np.asarray(service_rates, dtype=np.float64), servers.shape)
+
+        wait_time = np.empty(servers.shape, dtype=np.float64)
+        utilization = np.empty(servers.shape, dtype=np.float64)
+        prob_of_waiting = np.empty(servers.shape, dtype=np.float64)
+
+        keys = [(int(c), float(l), float(m)) for c, l, m in zip(servers, arrival_rates, service_rates)]
+        misses = []
+        for i, key in enumerate(keys):
+            hit = self._lookup(key)
+            if hit is None:
+                misses.append(i)
+            else:
+                wait_time[i], utilization[i], prob_of_waiting[i] = hit.wait_time, hit.utilization, hit.probability_of_waiting
+
+        if misses:
+            idx = np.asarray(misses)
+            wq, rho, pw = _score(servers[idx], arrival_rates[idx], service_rates[idx])
+            wait_time[idx], utilization[idx], prob_of_waiting[idx] = wq, rho, pw
+            for j, i in enumerate(misses):
+                self._store(keys[i], QueueMetrics(float(wq[j]), float(rho[j]), float(pw[j])))
+
+        return QueueMetricsBatch(wait_time, utilization, prob_of_waiting)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._cache), 'max_entries': self.max_entries}
+
+
+engine = ErlangCEngine()
@@ -0,0 +1,241 @@
+"""Hourly OPD queue rollups per hospital.
+
+Queue changes go through ``enqueue`` (``enqueue_many`` for batches) and ``complete`` (``close``), which fold the event into its hour's
+``OPDQueueHourly`` row in the same transaction, so history reads a handful of small rows
+whatever the range. ``backfill`` rebuilds the rows from raw ``OPDQueue`` entries in bulk.
+
+    python -m backend.rollups backfill [--since 2024-01-01T00:00] [--hospital-id 1]
+"""
+from __future__ import annotations
+import argparse
+import heapq
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from backend.extensions import db
+from backend.models import OPDQueue, OPDQueueHourly
+
+# Statuses an entry can leave the queue with; only 'Served' counts towards served and mean wait
+EXIT_STATUSES = ('Served', 'Cancelled')
+BUCKETS = ('hour', 'day')
+INSERT_BATCH_SIZE = 1000
+
+
+def hour_of(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def waiting_length(hospital_id: int) -> int:
+    return db.session.execute(
+        db.select(func.count(OPDQueue.id)).where(OPDQueue.hospital_id == hospital_id, OPDQueue.status == 'Waiting')
+    ).scalar()
+
+
+def _bump(hospital_id: int, hour: datetime, arrivals: int = 0, served: int = 0,
+          wait_minutes: float = 0.0, length: int = 0):
+    """Add to one hour's counters, creating the row on the hour's first event."""
+    for _ in range(2):
+        updated = db.session.execute(
+            db.update(OPDQueueHourly)
+            .where(OPDQueueHourly.hospital_id == hospital_id, OPDQueueHourly.hour == hour)
+            .values(
+                arrivals=OPDQueueHourly.arrivals + arrivals,
+                served=OPDQueueHourly.served + served,
+                wait_minutes_total=OPDQueueHourly.wait_minutes_total + wait_minutes,
+                peak_length=case((OPDQueueHourly.peak_length < length, length), else_=OPDQueueHourly.peak_length),
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(OPDQueueHourly(hospital_id=hospital_id, hour=hour, arrivals=arrivals, served=served,
+                                              wait_minutes_total=wait_minutes, peak_length=length))
+            return
+        except IntegrityError:
+            continue  # Another worker created the row first; add to theirs instead
+
+
+def enqueue(patient_id: int, hospital_id: int) -> OPDQueue:
+    """Add a patient to a hospital's OPD queue."""
+    entry = OPDQueue(patient_id=patient_id, hospital_id=hospital_id, timestamp=datetime.utcnow())
+    db.session.add(entry)
+    db.session.flush()
+    _bump(hospital_id, hour_of(entry.timestamp), arrivals=1, length=waiting_length(hospital_id))
+    db.session.commit()
+    return entry
+
+
+def enqueue_many(entries: List[Tuple[int, int]]) -> None:
+    """Add (patient_id, hospital_id) pairs to their hospitals' OPD queues with one executemany."""
+    if not entries:
+        return
+    at = datetime.utcnow()
+    db.session.execute(db.insert(OPDQueue), [
+        {'patient_id': patient_id, 'hospital_id': hospital_id, 'timestamp': at, 'status': 'Waiting'}
+        for patient_id, hospital_id in entries
+    ])
+    for hospital_id, count in Counter(hospital_id for _, hospital_id in entries).items():
+        _bump(hospital_id, hour_of(at), arrivals=count, length=waiting_length(hospital_id))
+    db.session.commit()
+
+
+def close(entry_id: int, status: str, at: Optional[datetime] = None) -> Optional[OPDQueue]:
+    """``complete`` without the commit, for callers that take the entry out as part of a larger transaction."""
+    if status not in EXIT_STATUSES:
+        raise ValueError(f'status must be one of {list(EXIT_STATUSES)}')
+    at = at or datetime.utcnow()
+    left = db.session.execute(
+        db.update(OPDQueue)
+        .where(OPDQueue.id == entry_id, OPDQueue.status == 'Waiting')
+        .values(status=status, completed_at=at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not left:
+        return None
+    entry = db.session.get(OPDQueue, entry_id)
+    db.session.refresh(entry)
+    served = status == 'Served'
+    _bump(entry.hospital_id, hour_of(at), served=int(served),
+          wait_minutes=(at - entry.timestamp).total_seconds() / 60 if served else 0.0,
+          length=waiting_length(entry.hospital_id) + 1)  # Length just before this entry left
+    return entry
+
+
+def complete(entry_id: int, status: str, at: Optional[datetime] = None) -> Optional[OPDQueue]:
+    """Take a waiting entry out of the queue; returns None if it was not waiting."""
+    entry = close(entry_id, status, at)
+    if entry is None:
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return entry
+
+
+def history(hospital_id: int, start: datetime, end: datetime, bucket: str = 'hour') -> List[Dict[str, Any]]:
+    """Queue figures per hour (or day) between ``start`` and ``end``; quiet periods are omitted."""
+    if bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of {list(BUCKETS)}')
+    rows = db.session.execute(
+        db.select(OPDQueueHourly.hour, OPDQueueHourly.arrivals, OPDQueueHourly.served,
+                  OPDQueueHourly.peak_length, OPDQueueHourly.wait_minutes_total)
+        .where(OPDQueueHourly.hospital_id == hospital_id,
+               OPDQueueHourly.hour >= hour_of(start), OPDQueueHourly.hour < end)
+        .order_by(OPDQueueHourly.hour)
+    ).all()
+
+    buckets: Dict[datetime, List] = {}
+    for hour, arrivals, served, peak, wait in rows:
+        key = hour.replace(hour=0) if bucket == 'day' else hour
+        totals = buckets.setdefault(key, [0, 0, 0, 0.0])
+        totals[0] += arrivals
+        totals[1] += served
+        totals[2] = max(totals[2], peak)
+        totals[3] += wait
+    return [{
+        'timestamp': key.isoformat(),
+        'length': arrivals,  # Entries that joined the queue in the bucket
+        'arrivals': arrivals,
+        'served': served,
+        'peak_length': peak,
+        'mean_wait_minutes': round(wait / served, 2) if served else None
+    } for key, (arrivals, served, peak, wait) in buckets.items()]
+
+
+def _events(since: Optional[datetime], hospital_id: Optional[int]) -> Iterator[Tuple]:
+    """Arrivals and departures in time order, streamed from the raw queue entries."""
+    arrivals = db.select(OPDQueue.timestamp, OPDQueue.hospital_id, OPDQueue.status, OPDQueue.completed_at)
+    departures = db.select(OPDQueue.completed_at, OPDQueue.hospital_id, OPDQueue.status, OPDQueue.timestamp) \
+        .where(OPDQueue.completed_at.isnot(None))
+    if since is not None:
+        arrivals = arrivals.where(OPDQueue.timestamp >= since)
+        departures = departures.where(OPDQueue.completed_at >= since)
+    if hospital_id is not None:
+        arrivals = arrivals.where(OPDQueue.hospital_id == hospital_id)
+        departures = departures.where(OPDQueue.hospital_id == hospital_id)
+
+    def stream(stmt, kind):
+        result = db.session.execute(stmt.execution_options(stream_results=True))
+        for partition in result.partitions(INSERT_BATCH_SIZE):
+            for at, hospital, status, other in partition:
+                yield at, kind, hospital, status, other
+
+    # Arrivals sort before departures at the same instant (kind 0 < 1)
+    return heapq.merge(stream(arrivals.order_by(OPDQueue.timestamp), 0),
+                       stream(departures.order_by(OPDQueue.completed_at), 1),
+                       key=lambda event: (event[0], event[1]))
+
+
+def backfill(since: Optional[datetime] = None, hospital_id: Optional[int] = None) -> int:
+    """Recompute hourly rows from ``since`` (default: all history); returns the number of rows written."""
+    since = hour_of(since) if since else None
+
+    deleted = db.delete(OPDQueueHourly)
+    lengths: Dict[int, int] = {}
+    if since is not None:
+        deleted = deleted.where(OPDQueueHourly.hour >= since)
+        # Entries already waiting when the window opens
+        open_at_start = db.select(OPDQueue.hospital_id, func.count(OPDQueue.id)).where(
+            OPDQueue.timestamp < since,
+            db.or_(OPDQueue.completed_at >= since,
+                   db.and_(OPDQueue.completed_at.is_(None), OPDQueue.status == 'Waiting'))
+        ).group_by(OPDQueue.hospital_id)
+        if hospital_id is not None:
+            open_at_start = open_at_start.where(OPDQueue.hospital_id == hospital_id)
+        lengths = dict(db.session.execute(open_at_start).all())
+    if hospital_id is not None:
+        deleted = deleted.where(OPDQueueHourly.hospital_id == hospital_id)
+
+    rollups: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+    for at, kind, hospital, status, other in _events(since, hospital_id):
+        row = rollups.setdefault((hospital, hour_of(at)), {
+            'hospital_id': hospital, 'hour': hour_of(at),
+            'arrivals': 0, 'served': 0, 'peak_length': 0, 'wait_minutes_total': 0.0
+        })
+        length = lengths.get(hospital, 0)
+        if kind == 0:
+            row['arrivals'] += 1
+            # Entries closed before completion times were recorded never leave; keep them out of the length
+            if status == 'Waiting' or other is not None:
+                length += 1
+            row['peak_length'] = max(row['peak_length'], length)
+        else:
+            row['peak_length'] = max(row['peak_length'], length)
+            length -= 1
+            if status == 'Served':
+                row['served'] += 1
+                row['wait_minutes_total'] += (at - other).total_seconds() / 60
+        lengths[hospital] = length
+
+    db.session.execute(deleted)
+    values = list(rollups.values())
+    for i in range(0, len(values), INSERT_BATCH_SIZE):
+        db.session.execute(db.insert(OPDQueueHourly), values[i:i + INSERT_BATCH_SIZE])
+    db.session.commit()
+    return len(values)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m backend.rollups', description='OPD queue rollup maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+    refill = commands.add_parser('backfill', help='rebuild hourly rollups from raw queue entries')
+    refill.add_argument('--since', type=datetime.fromisoformat, help='ISO-8601 start; defaults to all history')
+    refill.add_argument('--hospital-id', type=int)
+    args = parser.parse_args(argv)
+
+    from backend.app import app
+
+    with app.app_context():
+        written = backfill(args.since, args.hospital_id)
+    print(f"Wrote {written} hourly rollup rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+
+# Clients subscribe to one of three scopes:
+#   hospital_id only          -> 'hospital:<id>'                  everything happening in that hospital
+#   hospital_id + department  -> 'hospital:<id>:department:<id>'  one ward of one hospital
+#   department_id only        -> 'department:<id>'                department-level figures (wait times, beds)
+# Ward subscribers also join the department room, since departments are shared across hospitals.
+
+
+def hospital_room(hospital_id: int) -> str:
+    return f'hospital:{hospital_id}'
+
+
+def ward_room(hospital_id: int, department_id: int) -> str:
+    return f'hospital:{hospital_id}:department:{department_id}'
+
+
+def department_room(department_id: int) -> str:
+    return f'department:{department_id}'
+
+
+def subscription_rooms(hospital_id: Optional[int] = None, department_id: Optional[int] = None) -> List[str]:
+    """Rooms a client joins for the given scope."""
+    if hospital_id is not None and department_id is not None:
+        return [ward_room(hospital_id, department_id), department_room(department_id)]
+    if hospital_id is not None:
+        return [hospital_room(hospital_id)]
+    if department_id is not None:
+        return [department_room(department_id)]
+    return []
+
+
+def targets(hospital_id: Optional[int] = None, department_id: Optional[int] = None) -> List[str]:
+    """Rooms an event about the given hospital and/or department is published to."""
+    if hospital_id is not None:
+        rooms = [hospital_room(hospital_id)]
+        if department_id is not None:
+            rooms.append(ward_room(hospital_id, department_id))
+        return rooms
+    if department_id is not None:
+        return [department_room(department_id)]
+    return []
+
+
+def publish(socketio, event: str, data: Dict[str, Any], hospital_id: Optional[int] = None,
+            department_id: Optional[int] = None, namespace: Optional[str] = None) -> bool:
+    """Emit to the rooms interested in this hospital/department; clients in several of them get it once."""
+    rooms = targets(hospital_id, department_id)
+    if not rooms:
+        return False
+    socketio.emit(event, data, to=rooms, namespace=namespace or '/')
+    return True
+
+
+def _scope(data: Optional[Dict[str, Any]]):
+    data = data or {}
+    hospital_id = data.get('hospital_id')
+    department_id = data.get('department_id')
+    return (int(hospital_id) if hospital_id is not None else None,
+            int(department_id) if department_id is not None else None)
+
+
+def register_subscription_handlers(socketio, namespace: Optional[str] = None):
+    """Add the subscribe/unsubscribe events to a Socket.IO namespace."""
+
+    @socketio.on('subscribe', namespace=namespace)
+    def handle_subscribe(data: Dict[str, Any]):
+        try:
+            rooms = subscription_rooms(*_scope(data))
+        except (TypeError, ValueError):
+            rooms = []
+        if not rooms:
+            emit('error', {'message': 'subscribe needs a hospital_id and/or department_id'}, to=request.sid)
+            return {'rooms': []}
+        for room in rooms:
+            join_room(room)
+        return {'rooms': rooms}
+
+    @socketio.on('unsubscribe', namespace=namespace)
+    def handle_unsubscribe(data: Dict[str, Any]):
+        try:
+            rooms = subscription_rooms(*_scope(data))
+        except (TypeError, ValueError):
+            rooms = []
+        for room in rooms:
+            leave_room(room)
+        return {'rooms': rooms}
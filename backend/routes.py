@@ -1,39 +1,73 @@
-from flask import Blueprint, request, jsonify, render_template
-from models import db, City, Hospital, Patient, OPDQueue, Inventory, Expense
-from extensions import socketio
-import requests
+from flask import Blueprint, current_app, request, jsonify
+from backend.extensions import db
+from backend.models import City, Hospital, Patient, OPDQueue, Inventory, Expense
+from backend.rooms import publish, register_subscription_handlers
+from backend.pagination import date_range, paginate
+from backend import rollups
+from backend import stock
+from backend import expenses
+from backend import flow
+from backend.cache import current as reference_cache
+from backend.snapshot import current as dashboard
 from datetime import datetime, timedelta
 
 main_bp = Blueprint('main', __name__)
 
-@main_bp.route('/')
-def home():
-    return "Welcome to SwasthyaFlow API!"
+
+def init_app(app, socketio):
+    """Serve the blueprint and its ``/socket`` namespace on this app."""
+    app.register_blueprint(main_bp)
+
+    @socketio.on('connect', namespace='/socket')
+    def handle_connect():
+        print('Client connected')
+
+    @socketio.on('disconnect', namespace='/socket')
+    def handle_disconnect():
+        print('Client disconnected')
+
+    register_subscription_handlers(socketio, namespace='/socket')
+
+
+def _socketio():
+    """The SocketIO of the app handling the current request."""
+    return current_app.extensions['socketio']
 
 @main_bp.route('/api/cities', methods=['GET', 'POST'])
 def manage_cities():
     if request.method == 'GET':
-        cities = City.query.all()
-        return jsonify([{'id': c.id, 'name': c.name} for c in cities])
+        try:
+            return reference_cache().response('cities', lambda: paginate(
+                db.session, db.select(City.id, City.name), City.id, lambda c: {'id': c.id, 'name': c.name}))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     elif request.method == 'POST':
         data = request.json
         new_city = City(name=data['name'])
         db.session.add(new_city)
         db.session.commit()
+        reference_cache().invalidate('cities')
         return jsonify({'message': 'City added successfully', 'id': new_city.id}), 201
 
 @main_bp.route('/api/hospitals', methods=['GET', 'POST'])
 def manage_hospitals():
     if request.method == 'GET':
-        hospitals = Hospital.query.all()
-        return jsonify([{
-            'id': h.id, 
-            'name': h.name, 
-            'address': h.address,
-            'total_beds': h.total_beds, 
-            'available_beds': h.available_beds,
-            'city_id': h.city_id
-        } for h in hospitals])
+        query = db.select(Hospital.id, Hospital.name, Hospital.address, Hospital.total_beds,
+                          Hospital.available_beds, Hospital.city_id)
+        city_id = request.args.get('city_id', type=int)
+        if city_id is not None:
+            query = query.where(Hospital.city_id == city_id)
+        try:
+            return reference_cache().response('hospitals', lambda: paginate(db.session, query, Hospital.id, lambda h: {
+                'id': h.id, 
+                'name': h.name, 
+                'address': h.address,
+                'total_beds': h.total_beds, 
+                'available_beds': h.available_beds,
+                'city_id': h.city_id
+            }))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     elif request.method == 'POST':
         data = request.json
         new_hospital = Hospital(
@@ -45,7 +79,8 @@ def manage_hospitals():
         )
         db.session.add(new_hospital)
         db.session.commit()
-        socketio.emit('hospital_update', {
+        reference_cache().invalidate('hospitals')
+        _socketio().emit('hospital_update', {
             'id': new_hospital.id, 
             'name': new_hospital.name, 
             'available_beds': new_hospital.available_beds
@@ -55,29 +90,43 @@ def manage_hospitals():
 @main_bp.route('/api/patients', methods=['GET', 'POST'])
 def manage_patients():
     if request.method == 'GET':
-        patients = Patient.query.all()
-        return jsonify([{
-            'id': p.id, 
-            'name': p.name, 
-            'age': p.age,
-            'gender': p.gender, 
-            'hospital_id': p.hospital_id
-        } for p in patients])
+        query = db.select(Patient.id, Patient.name, Patient.age, Patient.gender, Patient.hospital_id)
+        hospital_id = request.args.get('hospital_id', type=int)
+        if hospital_id is not None:
+            query = query.where(Patient.hospital_id == hospital_id)
+        try:
+            start, end = date_range()
+            if start:
+                query = query.where(Patient.arrival_time >= start)
+            if end:
+                query = query.where(Patient.arrival_time < end)
+            return paginate(db.session, query, Patient.id, lambda p: {
+                'id': p.id, 
+                'name': p.name, 
+                'age': p.age,
+                'gender': p.gender, 
+                'hospital_id': p.hospital_id
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     elif request.method == 'POST':
         data = request.json
         new_patient = Patient(
             name=data['name'], 
             age=data['age'],
             gender=data['gender'], 
-            hospital_id=data['hospital_id']
+            hospital_id=data['hospital_id'],
+            department_id=data['department_id']
         )
         db.session.add(new_patient)
         db.session.commit()
-        socketio.emit('patient_update', {
+        if new_patient.status == 'Waiting':
+            dashboard().adjust('queue', length=1)
+        publish(_socketio(), 'patient_update', {
             'id': new_patient.id, 
             'name': new_patient.name, 
             'hospital_id': new_patient.hospital_id
-        }, namespace='/socket')
+        }, hospital_id=new_patient.hospital_id, namespace='/socket')
         return jsonify({'message': 'Patient registered successfully', 'id': new_patient.id}), 201
 
 @main_bp.route('/api/opd/queue', methods=['GET', 'POST'])
@@ -99,23 +148,37 @@ def manage_opd_queue():
         })
     elif request.method == 'POST':
         data = request.json
-        new_queue_entry = OPDQueue(patient_id=data['patient_id'], hospital_id=data['hospital_id'])
-        db.session.add(new_queue_entry)
-        db.session.commit()
-        socketio.emit('queue_update', {
+        new_queue_entry = rollups.enqueue(data['patient_id'], data['hospital_id'])
+        publish(_socketio(), 'queue_update', {
             'queue_number': new_queue_entry.id,
             'hospital_id': data['hospital_id'],
             'patients_queuing': OPDQueue.query.filter_by(hospital_id=data['hospital_id'], status='Waiting').count()
-        }, namespace='/socket')
+        }, hospital_id=data['hospital_id'], namespace='/socket')
         return jsonify({'message': 'Added to OPD queue', 'queue_number': new_queue_entry.id}), 201
 
+@main_bp.route('/api/opd/queue/<int:entry_id>', methods=['PUT'])
+def update_opd_queue_entry(entry_id):
+    data = request.json
+    service_minutes = data.get('service_minutes')
+    if service_minutes is not None and (isinstance(service_minutes, bool) or not isinstance(service_minutes, (int, float))):
+        return jsonify({'error': 'service_minutes must be a positive number'}), 400
+    try:
+        done = flow.current().complete(entry_id=entry_id, status=data.get('status'), service_minutes=service_minutes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if done is None:
+        OPDQueue.query.get_or_404(entry_id)
+        return jsonify({'error': 'Queue entry is no longer waiting'}), 409
+    return jsonify({'message': 'Queue entry updated', 'queue_number': entry_id, 'status': done.status})
+
 @main_bp.route('/api/beds/<int:hospital_id>', methods=['PUT'])
 def update_beds(hospital_id):
     hospital = Hospital.query.get_or_404(hospital_id)
     data = request.json
     hospital.available_beds = data['available_beds']
     db.session.commit()
-    socketio.emit('bed_update', {'hospital_id': hospital_id, 'available_beds': hospital.available_beds}, namespace='/socket')
+    reference_cache().invalidate('hospitals')
+    publish(_socketio(), 'bed_update', {'hospital_id': hospital_id, 'available_beds': hospital.available_beds}, hospital_id=hospital_id, namespace='/socket')
     return jsonify({'message': 'Bed availability updated successfully'})
 
 @main_bp.route('/api/inventory/<int:hospital_id>', methods=['GET', 'POST'])
@@ -125,74 +188,61 @@ def manage_inventory(hospital_id):
         return jsonify([{'item': item.item_name, 'quantity': item.quantity, 'unit_price': item.unit_price} for item in inventory])
     elif request.method == 'POST':
         data = request.json
-        item = Inventory.query.filter_by(hospital_id=hospital_id, item_name=data['item_name']).first()
-        if item:
-            item.quantity += data['quantity']
-            item.unit_price = data['unit_price']
-        else:
-            item = Inventory(hospital_id=hospital_id, item_name=data['item_name'], quantity=data['quantity'], unit_price=data['unit_price'])
-            db.session.add(item)
-        db.session.commit()
-        socketio.emit('inventory_update', {
+        try:
+            quantities = stock.apply_movements([{'hospital_id': hospital_id, 'item_name': data['item_name'],
+                                                 'delta': data['quantity'], 'unit_price': data['unit_price'],
+                                                 'reason': 'manual'}])
+        except stock.StockError as e:
+            return jsonify({'error': str(e), 'errors': e.errors}), 409
+        dashboard().adjust('inventory', consumables=data['quantity'])
+        publish(_socketio(), 'inventory_update', {
             'hospital_id': hospital_id, 
-            'item': data['item_name'], 
-            'quantity': item.quantity, 
-            'unit_price': item.unit_price
-        }, namespace='/socket')
+            'items': stock.by_hospital(quantities)[hospital_id]
+        }, hospital_id=hospital_id, namespace='/socket')
         return jsonify({'message': 'Inventory updated successfully'}), 200
 
 @main_bp.route('/api/expenses/<int:hospital_id>', methods=['GET', 'POST'])
 def manage_expenses(hospital_id):
     if request.method == 'GET':
-        expenses = Expense.query.filter_by(hospital_id=hospital_id).all()
-        return jsonify([{
-            'id': e.id, 
-            'description': e.description, 
-            'amount': e.amount, 
-            'date': e.date.isoformat()
-        } for e in expenses])
+        query = db.select(Expense.id, Expense.description, Expense.amount, Expense.date, Expense.category).where(Expense.hospital_id == hospital_id)
+        try:
+            start, end = date_range()
+            if start:
+                query = query.where(Expense.date >= start.date())
+            if end:
+                query = query.where(Expense.date < end.date())
+            return paginate(db.session, query, Expense.id, lambda e: {
+                'id': e.id, 
+                'description': e.description, 
+                'amount': e.amount, 
+                'date': e.date.isoformat(),
+                'category': e.category
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     elif request.method == 'POST':
         data = request.json
-        new_expense = Expense(
+        new_expense = expenses.create(
             hospital_id=hospital_id, 
             description=data['description'], 
             amount=data['amount'], 
-            date=datetime.strptime(data['date'], '%Y-%m-%d').date()
+            day=datetime.strptime(data['date'], '%Y-%m-%d').date(),
+            category=data.get('category')
         )
-        db.session.add(new_expense)
-        db.session.commit()
-        socketio.emit('expense_update', {
+        publish(_socketio(), 'expense_update', {
             'hospital_id': hospital_id, 
             'expense_id': new_expense.id, 
             'amount': new_expense.amount
-        }, namespace='/socket')
+        }, hospital_id=hospital_id, namespace='/socket')
         return jsonify({'message': 'Expense added successfully', 'id': new_expense.id}), 201
 
 @main_bp.route('/api/opd/queue/history')
 def get_queue_history():
     hospital_id = request.args.get('hospital_id', 1, type=int)
-    end_time = datetime.utcnow()
-    start_time = end_time - timedelta(hours=24)
-    
-    queue_history = db.session.query(
-        OPDQueue.timestamp,
-        db.func.count(OPDQueue.id).label('queue_length')
-    ).filter(
-        OPDQueue.hospital_id == hospital_id,
-        OPDQueue.timestamp.between(start_time, end_time)
-    ).group_by(
-        db.func.strftime('%Y-%m-%d %H:00:00', OPDQueue.timestamp)
-    ).order_by(OPDQueue.timestamp).all()
-    
-    return jsonify([
-        {'timestamp': entry.timestamp.isoformat(), 'length': entry.queue_length}
-        for entry in queue_history
-    ])
-
-@socketio.on('connect', namespace='/socket')
-def handle_connect():
-    print('Client connected')
-
-@socketio.on('disconnect', namespace='/socket')
-def handle_disconnect():
-    print('Client disconnected')
+    try:
+        start_time, end_time = date_range()
+        end_time = end_time or datetime.utcnow()
+        start_time = start_time or end_time - timedelta(hours=24)
+        return jsonify(rollups.history(hospital_id, start_time, end_time, request.args.get('bucket', 'hour')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[Callable[..., Any], tuple, float]
+
+
+class WorkScheduler:
+    """Bounded background work queue with per-key ordering.
+
+    Tasks sharing a key (e.g. ``('department', 3)``) run one at a time in submission order; tasks
+    with different keys run in parallel on ``workers`` threads. At most ``max_pending`` tasks wait
+    at once: ``submit`` returns False beyond that, and ``retry_after`` tells the caller how long
+    the backlog should take to drain. Every task runs in its own app context, so it gets a fresh
+    session that is removed when the task ends.
+    """
+
+    def __init__(self, app, workers: int = 4, max_pending: int = 1000, metrics=None, name: str = 'work'):
+        self.app = app
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self._pending = 0
+        self._mean_run = 0.0  # Exponentially weighted task run time, seconds
+        self._queues: Dict[Hashable, Deque[Task]] = {}  # Keys with work queued or running
+        self._ready: Deque[Hashable] = deque()  # Keys whose next task can start
+        self._unkeyed = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+        if metrics is not None:
+            metrics.describe('scheduler_tasks_total', 'counter', 'Background tasks by outcome.')
+            metrics.describe('scheduler_task_wait_seconds', 'histogram', 'Time tasks spent queued before starting.')
+            metrics.describe('scheduler_task_run_seconds', 'histogram', 'Time tasks spent running.')
+            metrics.gauge('scheduler_queue_depth', lambda: self._pending, 'Background tasks waiting to start.')
+
+        self._threads = [threading.Thread(target=self._work, name=f'{name}-{i}', daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key: Optional[Hashable], fn: Callable[..., Any], *args) -> bool:
+        """Queue ``fn(*args)`` behind earlier tasks with the same key; False if the queue is full.
+
+        ``key=None`` means the task has no ordering constraint.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.shed += 1
+                self._count('shed')
+                return False
+            if key is None:
+                key = ('unkeyed', next(self._unkeyed))
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ready.append(key)
+                self._wakeup.notify()
+            queue.append((fn, args, time.perf_counter()))
+            self._pending += 1
+            self.submitted += 1
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds a shed client should wait before resending, from the backlog and recent task times."""
+        with self._lock:
+            backlog = self._pending * self._mean_run / max(len(self._threads), 1)
+        return round(max(backlog, 0.5), 1)
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._wakeup.wait()
+                key = self._ready.popleft()
+                fn, args, queued_at = self._queues[key][0]  # Stays queued while running so the key is held
+                self._pending -= 1
+
+            started = time.perf_counter()
+            outcome = 'ok'
+            try:
+                with self.app.app_context():
+                    fn(*args)
+            except Exception as e:
+                outcome = 'error'
+                logger.error(f"Background task {getattr(fn, '__name__', fn)} failed: {str(e)}")
+            finished = time.perf_counter()
+
+            with self._lock:
+                queue = self._queues[key]
+                queue.popleft()
+                if queue:
+                    self._ready.append(key)
+                    self._wakeup.notify()
+                else:
+                    del self._queues[key]
+                self._mean_run += 0.1 * (finished - started - self._mean_run)
+                if outcome == 'ok':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._count(outcome)
+            if self.metrics is not None:
+                self.metrics.observe('scheduler_task_wait_seconds', started - queued_at)
+                self.metrics.observe('scheduler_task_run_seconds', finished - started)
+
+    def _count(self, outcome: str):
+        if self.metrics is not None:
+            self.metrics.inc('scheduler_tasks_total', outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': len(self._threads),
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'active_keys': len(self._queues),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'shed': self.shed,
+            'mean_run_ms': round(self._mean_run * 1000, 2)
+        }
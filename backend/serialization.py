@@ -0,0 +1,118 @@
+"""JSON encoding for HTTP responses and Socket.IO packets, fast when orjson is installed.
+
+``init_app`` routes every ``jsonify`` through ``JSONEncoder``: as the app's ``JSONProvider`` on
+Flask 2.2 and later, as ``app.json_encoder`` before that (the only hook those versions have);
+the module's own ``dumps``/``loads`` are handed to Flask-SocketIO as its ``json`` module.
+With orjson present compact output is produced by it, otherwise by the standard library.
+Either way datetimes, dates and times are written as ISO-8601 (rather than Flask's HTTP-date
+format), numpy scalars and arrays as plain numbers and lists, and NaN as ``null``.
+"""
+from __future__ import annotations
+import dataclasses
+import decimal
+import json as _json
+import math
+import uuid
+from datetime import date, datetime, time
+from typing import Any
+
+try:
+    from flask.json.provider import DefaultJSONProvider as _DefaultJSONProvider
+except ImportError:  # Flask < 2.2: JSONEncoder is installed as app.json_encoder instead
+    _DefaultJSONProvider = None
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def backend_name() -> str:
+    return 'orjson' if orjson is not None else 'json'
+
+
+def _finite(o: Any) -> Any:
+    """``o`` with NaN and infinities replaced by None, as orjson writes them."""
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, dict):
+        return {key: _finite(value) for key, value in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_finite(value) for value in o]
+    return o
+
+
+class JSONEncoder(_json.JSONEncoder):
+    """The types Flask's encoder handles, with ISO-8601 datetimes, numpy support and an orjson fast path.
+
+    The fast path covers compact output, which is what ``jsonify`` produces outside debug
+    mode; pretty-printed output and anything orjson rejects (such as integers wider than
+    64 bits) go through the standard library.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, (datetime, date, time)):
+            return o.isoformat()
+        if hasattr(o, 'tolist') and hasattr(o, 'dtype'):  # numpy scalar or array
+            return o.tolist()
+        if isinstance(o, (decimal.Decimal, uuid.UUID)):
+            return str(o)
+        if dataclasses.is_dataclass(o) and not isinstance(o, type):
+            return dataclasses.asdict(o)
+        if hasattr(o, '__html__'):
+            return str(o.__html__())
+        return super().default(o)
+
+    def encode(self, o: Any) -> str:
+        if orjson is not None and self.indent is None:
+            options = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                return orjson.dumps(o, default=self.default, option=options).decode()
+            except TypeError:
+                pass
+        if self.allow_nan:
+            self.allow_nan = False
+            try:
+                return super().encode(o)
+            except ValueError:
+                return super().encode(_finite(o))
+            finally:
+                self.allow_nan = True
+        return super().encode(o)
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    """``json.dumps`` with ``JSONEncoder``; usable without an app context (socket emits from workers)."""
+    kwargs.setdefault('cls', JSONEncoder)
+    kwargs.setdefault('separators', (',', ':'))
+    return _json.dumps(obj, **kwargs)
+
+
+def loads(s, **kwargs) -> Any:
+    if orjson is not None and not kwargs:
+        return orjson.loads(s)
+    return _json.loads(s, **kwargs)
+
+
+if _DefaultJSONProvider is not None:
+    class JSONProvider(_DefaultJSONProvider):
+        """Flask's provider (mimetype, debug indentation, ``sort_keys``) encoding with ``JSONEncoder``."""
+
+        def dumps(self, obj: Any, **kwargs) -> str:
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return _json.dumps(obj, cls=JSONEncoder, **kwargs)
+
+        def loads(self, s, **kwargs) -> Any:
+            return loads(s, **kwargs)
+else:
+    JSONProvider = None
+
+
+def init_app(app):
+    if JSONProvider is not None:
+        app.json = JSONProvider(app)
+    else:
+        app.json_encoder = JSONEncoder
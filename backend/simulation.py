@@ -0,0 +1,335 @@
+"""Discrete-event OPD simulation for capacity what-if questions.
+
+A ``Scenario`` names a window of the week ("Monday from 10:00 for 4 hours") and what is
+different about it (doctors out, an arrival surge). ``load_inputs`` turns the scenario into
+per-department models seeded from the database: arrival rates for each hour of the week
+from recent ``Patient`` history, doctors on duty from ``Doctor``, the triage priority mix
+from ``TriageEntry`` and bed capacity from ``Bed``. The ``Simulator`` then runs Monte Carlo
+replications across a process pool and caches the percentiles by a hash of the scenario
+and its inputs.
+
+Within a department, doctors serve the most urgent waiting patient first (lower priority
+number wins, then arrival order), as ``TriageQueue`` does. After the consultation a share
+of patients is admitted and needs a free bed, and waits for one to be released if none
+is free. Times are in minutes.
+"""
+from __future__ import annotations
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from itertools import repeat
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import analytics
+from backend.extensions import db
+from backend.lazy import LazyModule
+from backend.models import Bed, Department, Doctor, TriageEntry
+from backend.queueing import DEFAULT_SERVICE_RATE
+
+np = LazyModule('numpy')  # Imported on first use, not at startup
+
+HOURS_PER_WEEK = 7 * 24
+DEFAULT_PRIORITY_MIX = ((1, 0.1), (2, 0.3), (3, 0.6))
+PERCENTILES = (50, 90, 95)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    weekday: int = 0                     # 0 = Monday
+    start_hour: int = 9
+    duration_hours: float = 8.0
+    replications: int = 200
+    seed: int = 0
+    doctors_out: Tuple[Tuple[int, int], ...] = ()   # (department id, doctors missing)
+    arrival_scale: float = 1.0           # Multiplier on historical arrival rates
+    admission_probability: float = 0.1   # Share of patients who need a bed after consultation
+    bed_stay_hours: float = 48.0
+    history_weeks: int = 8
+
+
+@dataclass
+class DepartmentModel:
+    id: int
+    name: str
+    doctors: int
+    service_minutes: float
+    arrival_rates: np.ndarray            # Patients per minute for each hour of the week, Monday 00:00 first
+    priorities: Tuple[Tuple[int, float], ...] = DEFAULT_PRIORITY_MIX
+    beds: int = 0
+    beds_occupied: int = 0
+
+    def fingerprint(self) -> Dict[str, Any]:
+        values = asdict(self)
+        values['arrival_rates'] = [round(float(rate), 6) for rate in self.arrival_rates]
+        return values
+
+
+@dataclass
+class DepartmentOutcome:
+    waits: List[np.ndarray] = field(default_factory=list)
+    priorities: List[np.ndarray] = field(default_factory=list)
+    bed_waits: List[np.ndarray] = field(default_factory=list)
+    unserved: List[int] = field(default_factory=list)
+
+    def extend(self, other: 'DepartmentOutcome'):
+        self.waits += other.waits
+        self.priorities += other.priorities
+        self.bed_waits += other.bed_waits
+        self.unserved += other.unserved
+
+
+def load_inputs(scenario: Scenario, service_minutes: Optional[Dict[int, float]] = None,
+                now: Optional[datetime] = None) -> List[DepartmentModel]:
+    """Per-department models for ``scenario`` from the database; needs an app context.
+
+    History runs up to midnight UTC today so the inputs, and the cache key, stay stable during the day.
+    """
+    service_minutes = service_minutes or {}
+    history_end = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    history_start = history_end - timedelta(weeks=scenario.history_weeks)
+
+    departments = db.session.execute(db.select(Department.id, Department.name).order_by(Department.id)).all()
+    index = {department_id: i for i, (department_id, _) in enumerate(departments)}
+
+    counts = np.zeros((len(departments), HOURS_PER_WEEK))
+    for row in analytics.hour_of_week_counts(history_start, history_end):
+        if row['department_id'] in index:
+            counts[index[row['department_id']], row['hour']] += row['patients']
+    rates = counts / scenario.history_weeks / 60 * scenario.arrival_scale
+
+    doctors = dict(db.session.execute(
+        db.select(Doctor.department_id, db.func.count(Doctor.id))
+        .where(Doctor.is_available == True).group_by(Doctor.department_id)
+    ).all())
+    beds = {department_id: (total, occupied or 0) for department_id, total, occupied in db.session.execute(
+        db.select(Bed.department_id, db.func.count(Bed.id),
+                  db.func.sum(db.case((Bed.is_available == False, 1), else_=0)))
+        .group_by(Bed.department_id)
+    ).all()}
+    mix: Dict[int, List[Tuple[int, float]]] = {}
+    for department_id, priority, count in db.session.execute(
+        db.select(TriageEntry.department_id, TriageEntry.priority, db.func.count(TriageEntry.id))
+        .where(TriageEntry.created_at >= history_start)
+        .group_by(TriageEntry.department_id, TriageEntry.priority)
+        .order_by(TriageEntry.department_id, TriageEntry.priority)
+    ).all():
+        mix.setdefault(department_id, []).append((priority, count))
+
+    out = dict(scenario.doctors_out)
+    models = []
+    for i, (department_id, name) in enumerate(departments):
+        weights = mix.get(department_id)
+        if weights:
+            total = sum(count for _, count in weights)
+            priorities = tuple((priority, round(count / total, 4)) for priority, count in weights)
+        else:
+            priorities = DEFAULT_PRIORITY_MIX
+        bed_total, bed_occupied = beds.get(department_id, (0, 0))
+        models.append(DepartmentModel(
+            id=department_id,
+            name=name,
+            doctors=max(doctors.get(department_id, 0) - out.get(department_id, 0), 0),
+            # Whole minutes keep the cache key from moving with every completed consultation
+            service_minutes=float(round(service_minutes.get(department_id, 1 / DEFAULT_SERVICE_RATE))),
+            arrival_rates=rates[i],
+            priorities=priorities,
+            beds=bed_total,
+            beds_occupied=bed_occupied,
+        ))
+    return models
+
+
+def _arrivals(model: DepartmentModel, scenario: Scenario, rng: np.random.Generator) -> np.ndarray:
+    """Arrival times in the window from the hour-of-week rates, by thinning a homogeneous process."""
+    horizon = scenario.duration_hours * 60
+    first_hour = scenario.weekday * 24 + scenario.start_hour
+    hours = (first_hour + np.arange(int(np.ceil(scenario.duration_hours)))) % HOURS_PER_WEEK
+    window_rates = model.arrival_rates[hours]
+    peak = float(window_rates.max(initial=0.0))
+    if peak <= 0:
+        return np.empty(0)
+    times = np.sort(rng.uniform(0, horizon, rng.poisson(peak * horizon)))
+    keep = rng.random(len(times)) * peak < window_rates[(times // 60).astype(int)]
+    return times[keep]
+
+
+def simulate_department(model: DepartmentModel, scenario: Scenario, rng: np.random.Generator) -> DepartmentOutcome:
+    """One replication for one department; patients still waiting at the end count with their wait so far."""
+    horizon = scenario.duration_hours * 60
+    arrivals = _arrivals(model, scenario, rng)
+    n = len(arrivals)
+    levels, weights = zip(*model.priorities)
+    priorities = rng.choice(np.array(levels), size=n, p=np.array(weights) / sum(weights))
+    service = rng.exponential(model.service_minutes, n)
+    admitted = rng.random(n) < scenario.admission_probability
+    stay = rng.exponential(scenario.bed_stay_hours * 60, n)
+
+    waits = np.full(n, np.nan)
+    bed_waits = []
+    events: List[Tuple[float, int, int]] = [(t, 0, i) for i, t in enumerate(arrivals)]  # (time, kind, patient)
+    free_doctors = model.doctors
+    free_beds = model.beds - model.beds_occupied
+    for release in rng.exponential(scenario.bed_stay_hours * 60, model.beds_occupied):
+        events.append((release, 2, -1))
+    heapq.heapify(events)
+    waiting: List[Tuple[int, float, int]] = []
+    boarding: deque = deque()
+
+    def start(t: float, i: int):
+        waits[i] = t - arrivals[i]
+        heapq.heappush(events, (t + service[i], 1, i))
+
+    while events:
+        t, kind, i = heapq.heappop(events)
+        if t > horizon:
+            break
+        if kind == 0:                    # Arrival
+            if free_doctors:
+                free_doctors -= 1
+                start(t, i)
+            else:
+                heapq.heappush(waiting, (priorities[i], arrivals[i], i))
+        elif kind == 1:                  # Consultation finished
+            if admitted[i]:
+                if free_beds:
+                    free_beds -= 1
+                    bed_waits.append(0.0)
+                    heapq.heappush(events, (t + stay[i], 2, i))
+                else:
+                    boarding.append((t, i))
+            if waiting:
+                start(t, heapq.heappop(waiting)[2])
+            else:
+                free_doctors += 1
+        else:                            # Bed released
+            if boarding:
+                since, j = boarding.popleft()
+                bed_waits.append(t - since)
+                heapq.heappush(events, (t + stay[j], 2, j))
+            else:
+                free_beds += 1
+
+    unserved = np.isnan(waits)
+    waits[unserved] = horizon - arrivals[unserved]
+    bed_waits.extend(horizon - since for since, _ in boarding)
+    return DepartmentOutcome([waits], [priorities], [np.array(bed_waits)], [int(unserved.sum())])
+
+
+def run_replications(models: List[DepartmentModel], scenario: Scenario,
+                     seeds: List[np.random.SeedSequence]) -> Dict[int, DepartmentOutcome]:
+    """Run one replication per seed; module-level so the process pool can pickle it."""
+    outcomes = {model.id: DepartmentOutcome() for model in models}
+    for seed in seeds:
+        for model, department_seed in zip(models, seed.spawn(len(models))):
+            outcomes[model.id].extend(simulate_department(model, scenario, np.random.default_rng(department_seed)))
+    return outcomes
+
+
+def _percentiles(values: np.ndarray) -> Optional[Dict[str, float]]:
+    if not len(values):
+        return None
+    summary = {'mean': round(float(values.mean()), 2)}
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{q}'] = round(float(value), 2)
+    return summary
+
+
+def summarize(models: List[DepartmentModel], outcomes: Dict[int, DepartmentOutcome], replications: int) -> List[Dict[str, Any]]:
+    summary = []
+    for model in models:
+        outcome = outcomes[model.id]
+        waits = np.concatenate(outcome.waits)
+        priorities = np.concatenate(outcome.priorities)
+        summary.append({
+            'department_id': model.id,
+            'department': model.name,
+            'doctors': model.doctors,
+            'beds': model.beds,
+            'mean_arrivals': round(len(waits) / replications, 2),
+            'mean_unserved': round(sum(outcome.unserved) / replications, 2),
+            'wait_minutes': _percentiles(waits),
+            'wait_minutes_by_priority': {
+                str(int(level)): _percentiles(waits[priorities == level]) for level in np.unique(priorities)
+            },
+            'bed_wait_minutes': _percentiles(np.concatenate(outcome.bed_waits)),
+        })
+    return summary
+
+
+def scenario_hash(scenario: Scenario, models: List[DepartmentModel]) -> str:
+    key = {'scenario': asdict(scenario), 'departments': [model.fingerprint() for model in models]}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Simulator:
+    """Runs scenarios across a process pool and keeps the latest results in an LRU cache.
+
+    ``workers=0`` runs replications in the calling process.
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 64):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Spawned, not forked: the pool starts from a request thread, and a fork there would copy
+                # whichever locks other threads (scheduler workers, the broadcaster, DB pools) held
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _simulate(self, models: List[DepartmentModel], scenario: Scenario) -> Dict[int, DepartmentOutcome]:
+        seeds = np.random.SeedSequence(scenario.seed).spawn(scenario.replications)
+        if not self.workers:
+            return run_replications(models, scenario, seeds)
+        chunks = [chunk for chunk in (seeds[i::self.workers * 2] for i in range(self.workers * 2)) if chunk]
+        outcomes = {model.id: DepartmentOutcome() for model in models}
+        for partial in self._executor().map(run_replications, repeat(models), repeat(scenario), chunks):
+            for department_id, outcome in partial.items():
+                outcomes[department_id].extend(outcome)
+        return outcomes
+
+    def run(self, scenario: Scenario, models: List[DepartmentModel]) -> Tuple[Dict[str, Any], bool]:
+        """Percentile waits per department for the scenario, and whether they came from the cache."""
+        key = scenario_hash(scenario, models)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key], True
+            self.misses += 1
+
+        result = {
+            'scenario_hash': key,
+            'scenario': asdict(scenario),
+            'replications': scenario.replications,
+            'departments': summarize(models, self._simulate(models, scenario), scenario.replications),
+        }
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache), 'workers': self.workers}
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import copy
+import threading
+import time
+from typing import Any, Dict
+
+from flask import current_app
+from sqlalchemy import case, func
+
+from backend.extensions import db
+from backend.models import Bed, Inventory, Medicine, Patient
+
+
+class DashboardSnapshot:
+    """Versioned in-memory copy of the dashboard figures, kept current by the write paths.
+
+    New connections are served from here, so a reconnect storm costs no queries.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.updated_at = time.time()
+        self._data: Dict[str, Any] = {
+            'queue': {'length': 0},
+            'beds': {'available': 0, 'occupied': 0},
+            'inventory': {'medicines': 0, 'consumables': 0}
+        }
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['dashboard'] = self
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    def load(self, *sections: str):
+        """Rebuild the given sections (default: all) from the database. Requires an app context."""
+        sections = sections or tuple(self._data)
+        data: Dict[str, Any] = {}
+        if 'queue' in sections:
+            waiting = db.session.execute(db.select(func.count(Patient.id)).filter_by(status='Waiting')).scalar()
+            data['queue'] = {'length': waiting}
+        if 'beds' in sections:
+            available, total = db.session.execute(
+                db.select(func.coalesce(func.sum(case((Bed.is_available == True, 1), else_=0)), 0), func.count(Bed.id))
+            ).one()
+            data['beds'] = {'available': available, 'occupied': total - available}
+        if 'inventory' in sections:
+            medicines = db.session.execute(db.select(func.coalesce(func.sum(Medicine.quantity), 0))).scalar()
+            consumables = db.session.execute(db.select(func.coalesce(func.sum(Inventory.quantity), 0))).scalar()
+            data['inventory'] = {'medicines': medicines, 'consumables': consumables}
+        with self._lock:
+            self._data.update(data)
+            self._touch()
+
+    def set(self, section: str, **values):
+        with self._lock:
+            self._data[section].update(values)
+            self._touch()
+
+    def adjust(self, section: str, **deltas):
+        with self._lock:
+            current = self._data[section]
+            for key, delta in deltas.items():
+                current[key] = max(current[key] + delta, 0)
+            self._touch()
+
+    def payload(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'version': self.version, **copy.deepcopy(self._data)}
+
+    def age_seconds(self) -> float:
+        return time.time() - self.updated_at
+
+
+def current() -> DashboardSnapshot:
+    """The dashboard snapshot of the app handling the current request."""
+    return current_app.extensions['dashboard']
@@ -0,0 +1,119 @@
+"""Inventory stock movements applied as atomic in-database increments.
+
+A batch of movements (receipts, dispensations, adjustments) is applied in one transaction:
+movements for the same item are summed into a single ``quantity = quantity + delta`` UPDATE,
+so concurrent batches never overwrite each other, and every movement is appended to the
+``StockMovement`` ledger. A batch that would take any item below zero, dispense an item the
+hospital does not stock, or name an unknown hospital is rejected as a whole.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.extensions import db
+from backend.models import Hospital, Inventory, StockMovement
+
+Key = Tuple[int, str]
+
+
+class StockError(ValueError):
+    """A batch was rejected; ``errors`` says which items failed and why."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f'{len(errors)} stock movement(s) could not be applied; nothing was changed')
+        self.errors = errors
+
+
+def _increment(key: Key, delta: int, unit_price: Optional[float]) -> bool:
+    """Add ``delta`` to one item, creating it on its first receipt; False if stock would go negative."""
+    hospital_id, item_name = key
+    values = {'quantity': Inventory.quantity + delta}
+    if unit_price is not None:
+        values['unit_price'] = unit_price
+    for _ in range(2):
+        updated = db.session.execute(
+            db.update(Inventory)
+            .where(Inventory.hospital_id == hospital_id, Inventory.item_name == item_name,
+                   Inventory.quantity + delta >= 0)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            return True
+        if delta < 0:
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.add(Inventory(hospital_id=hospital_id, item_name=item_name, quantity=delta,
+                                         unit_price=unit_price or 0.0))
+            return True
+        except IntegrityError:
+            continue  # Another batch created the item first; add to theirs instead
+    return False
+
+
+def _quantities(keys) -> Dict[Key, int]:
+    hospital_ids = {hospital_id for hospital_id, _ in keys}
+    item_names = {item_name for _, item_name in keys}
+    rows = db.session.execute(
+        db.select(Inventory.hospital_id, Inventory.item_name, Inventory.quantity)
+        .where(Inventory.hospital_id.in_(hospital_ids), Inventory.item_name.in_(item_names))
+    ).all()
+    return {(hospital_id, item_name): quantity for hospital_id, item_name, quantity in rows
+            if (hospital_id, item_name) in keys}
+
+
+def apply_movements(movements: List[Dict[str, Any]]) -> Dict[Key, int]:
+    """Apply a batch of movements atomically; returns the new quantity per (hospital_id, item_name).
+
+    Each movement has ``hospital_id``, ``item_name`` and ``delta``, and optionally ``unit_price``
+    (stored on the item), ``reason`` and ``reference`` (kept in the ledger). Raises StockError,
+    with nothing changed, if any item cannot take its movements. Requires an app context.
+    """
+    totals: Dict[Key, int] = {}
+    prices: Dict[Key, float] = {}
+    for movement in movements:
+        key = (movement['hospital_id'], movement['item_name'])
+        totals[key] = totals.get(key, 0) + movement['delta']
+        if movement.get('unit_price') is not None:
+            prices[key] = movement['unit_price']
+
+    try:
+        known = set(db.session.execute(
+            db.select(Hospital.id).where(Hospital.id.in_({hospital_id for hospital_id, _ in totals}))).scalars())
+        errors = [{'hospital_id': hospital_id, 'item_name': item_name, 'error': 'Unknown hospital.'}
+                  for hospital_id, item_name in totals if hospital_id not in known]
+        if not errors:
+            for key, delta in totals.items():
+                if not _increment(key, delta, prices.get(key)):
+                    errors.append({'hospital_id': key[0], 'item_name': key[1], 'delta': delta,
+                                   'error': 'Not enough stock.' if _quantities({key}) else 'Unknown item.'})
+        if errors:
+            raise StockError(errors)
+
+        quantities = _quantities(set(totals))
+        # Walk the batch backwards from the final quantities to get each movement's running balance
+        balance = dict(quantities)
+        ledger = []
+        for movement in reversed(movements):
+            key = (movement['hospital_id'], movement['item_name'])
+            ledger.append({'hospital_id': key[0], 'item_name': key[1], 'delta': movement['delta'],
+                           'quantity_after': balance[key], 'reason': movement.get('reason'),
+                           'reference': movement.get('reference')})
+            balance[key] -= movement['delta']
+        ledger.reverse()
+        db.session.execute(db.insert(StockMovement), ledger)  # executemany
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return quantities
+
+
+def by_hospital(quantities: Dict[Key, int]) -> Dict[int, List[Dict[str, Any]]]:
+    """New quantities grouped per hospital, as sent in one ``inventory_update`` per hospital."""
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for (hospital_id, item_name), quantity in sorted(quantities.items()):
+        grouped.setdefault(hospital_id, []).append({'item': item_name, 'quantity': quantity})
+    return grouped
@@ -0,0 +1,73 @@
+from __future__ import annotations
+from typing import Any, Dict, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.pool import QueuePool
+
+PROFILES = ('baseline', 'tuned')
+
+
+def sqlite_pragmas(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """Per-connection settings for the tuned SQLite profile.
+
+    WAL lets readers carry on while a socket worker commits, and with it ``synchronous=NORMAL``
+    only syncs at checkpoints. ``busy_timeout`` makes writers queue for the lock instead of
+    failing with "database is locked", and the mmap window serves reads from the page cache.
+    """
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+    }
+
+
+def _profile(config: Mapping[str, Any]) -> str:
+    profile = config['STORAGE_PROFILE']
+    if profile not in PROFILES:
+        raise ValueError(f"STORAGE_PROFILE must be one of {PROFILES}, not {profile!r}")
+    return profile
+
+
+def _in_memory(sa_url: URL) -> bool:
+    return sa_url.get_backend_name() == 'sqlite' and sa_url.database in (None, '', ':memory:')
+
+
+def apply_profile(config: Mapping[str, Any], sa_url: URL, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the engine options for ``STORAGE_PROFILE`` to ``SQLALCHEMY_ENGINE_OPTIONS``-style ``options``.
+
+    ``baseline`` leaves the defaults alone (a fresh connection per checkout on SQLite). ``tuned``
+    pools connections so the ``thread_pool`` workers reuse them between tasks; each worker still
+    gets its own session through the app context it pushes, and returns the connection when that
+    context ends.
+    """
+    if _profile(config) == 'baseline' or _in_memory(sa_url):
+        return options  # An in-memory database is a single shared connection already
+
+    if sa_url.get_backend_name() == 'sqlite':
+        options['poolclass'] = QueuePool
+        options['connect_args'] = dict(options.get('connect_args', {}), check_same_thread=False,
+                                       timeout=config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+    else:
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+        options['pool_pre_ping'] = True
+    options['pool_size'] = config['DB_POOL_SIZE']
+    options['max_overflow'] = config['DB_MAX_OVERFLOW']
+    return options
+
+
+def profile_pragmas(config: Mapping[str, Any], sa_url: URL) -> Dict[str, Any]:
+    """PRAGMAs ``STORAGE_PROFILE`` runs on every new connection; none outside tuned file-backed SQLite."""
+    if _profile(config) == 'baseline' or _in_memory(sa_url) or sa_url.get_backend_name() != 'sqlite':
+        return {}  # WAL does not apply in memory
+    return sqlite_pragmas(config)
+
+
+def install_pragmas(engine: Engine, pragmas: Mapping[str, Any]):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
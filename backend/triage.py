@@ -0,0 +1,134 @@
+from __future__ import annotations
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from backend.extensions import db
+from backend.models import TriageEntry
+
+
+class TriageQueue:
+    """Per-department priority queues persisted in ``TriageEntry`` with an in-memory heap index.
+
+    The database row is the source of truth: a claim is a conditional UPDATE that only succeeds
+    while the row is still waiting at the priority the heap saw, so several worker processes can
+    share the queue without handing out the same patient twice. Each process keeps its own heaps
+    and reconciles them with the waiting rows before every claim, picking up entries other
+    workers added, re-prioritised or claimed. All methods need an app context.
+    """
+
+    def __init__(self):
+        self._heaps: Dict[int, List[Tuple[int, int]]] = {}
+        self._live: Dict[int, Tuple[int, int]] = {}  # entry id -> (department id, priority)
+        self._lock = threading.Lock()
+
+    def _index(self, entry_id: int, department_id: int, priority: int):
+        self._live[entry_id] = (department_id, priority)
+        heapq.heappush(self._heaps.setdefault(department_id, []), (priority, entry_id))
+
+    def rebuild(self) -> int:
+        """Reload every waiting entry from the database."""
+        rows = db.session.execute(
+            db.select(TriageEntry.id, TriageEntry.department_id, TriageEntry.priority)
+            .where(TriageEntry.status == 'Waiting')
+        ).all()
+        with self._lock:
+            self._heaps, self._live = {}, {}
+            for entry_id, department_id, priority in rows:
+                self._live[entry_id] = (department_id, priority)
+                self._heaps.setdefault(department_id, []).append((priority, entry_id))
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+        return len(rows)
+
+    def _sync(self, department_id: Optional[int] = None):
+        """Bring the heaps in line with the waiting rows of a department (or all of them).
+
+        Ids are no cursor: another worker's lower id can commit after our higher one, and a
+        priority change leaves the id alone. The covering index keeps this an index-only scan
+        of the waiting entries.
+        """
+        query = db.select(TriageEntry.id, TriageEntry.department_id, TriageEntry.priority) \
+            .where(TriageEntry.status == 'Waiting')
+        if department_id is not None:
+            query = query.where(TriageEntry.department_id == department_id)
+        waiting = {entry_id: (department, priority) for entry_id, department, priority in db.session.execute(query)}
+        for entry_id, (department, _) in list(self._live.items()):
+            if entry_id not in waiting and (department_id is None or department == department_id):
+                del self._live[entry_id]  # Claimed elsewhere; _head drops its heap item
+        for entry_id, live in waiting.items():
+            if self._live.get(entry_id) != live:
+                self._index(entry_id, *live)
+
+    def push(self, patient_id: int, department_id: int, priority: int) -> TriageEntry:
+        entry = TriageEntry(patient_id=patient_id, department_id=department_id, priority=priority)
+        db.session.add(entry)
+        db.session.commit()
+        with self._lock:
+            self._index(entry.id, department_id, priority)
+        return entry
+
+    def _head(self, department_id: Optional[int]) -> Optional[Tuple[int, int]]:
+        """Best live (priority, entry id) for a department, or across all departments."""
+        heaps = [self._heaps.get(department_id, [])] if department_id is not None else list(self._heaps.values())
+        best = None
+        for heap in heaps:
+            # Drop entries that were claimed or re-prioritised since they were pushed
+            while heap and self._live.get(heap[0][1], (None, None))[1] != heap[0][0]:
+                heapq.heappop(heap)
+            if heap and (best is None or heap[0] < best):
+                best = heap[0]
+        return best
+
+    def claim_next(self, department_id: Optional[int] = None, claimed_by: Optional[str] = None) -> Optional[TriageEntry]:
+        """Atomically claim the most urgent waiting entry, oldest first among equal priorities."""
+        with self._lock:
+            self._sync(department_id)
+            while True:
+                head = self._head(department_id)
+                if head is None:
+                    return None
+                priority, entry_id = head
+                entry_department, _ = self._live.pop(entry_id)
+                heapq.heappop(self._heaps[entry_department])
+
+                claimed = db.session.execute(
+                    db.update(TriageEntry)
+                    .where(TriageEntry.id == entry_id, TriageEntry.status == 'Waiting', TriageEntry.priority == priority)
+                    .values(status='Claimed', claimed_at=datetime.utcnow(), claimed_by=claimed_by)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.session.commit()
+                if claimed:
+                    return db.session.get(TriageEntry, entry_id)
+
+                # Lost the race, or another worker changed the priority: re-index if it is still waiting
+                current = db.session.execute(
+                    db.select(TriageEntry.department_id, TriageEntry.priority)
+                    .where(TriageEntry.id == entry_id, TriageEntry.status == 'Waiting')
+                ).first()
+                if current:
+                    self._index(entry_id, current.department_id, current.priority)
+
+    def change_priority(self, entry_id: int, priority: int) -> bool:
+        with self._lock:
+            updated = db.session.execute(
+                db.update(TriageEntry)
+                .where(TriageEntry.id == entry_id, TriageEntry.status == 'Waiting')
+                .values(priority=priority)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if not updated:
+                return False
+            department_id = db.session.execute(
+                db.select(TriageEntry.department_id).where(TriageEntry.id == entry_id)).scalar()
+            self._index(entry_id, department_id, priority)
+            return True
+
+    def size(self, department_id: Optional[int] = None) -> int:
+        with self._lock:
+            if department_id is None:
+                return len(self._live)
+            return sum(1 for dept, _ in self._live.values() if dept == department_id)
@@ -0,0 +1,100 @@
+"""Expense analytics: raw GROUP BY versus monthly rollups, and streaming export.
+
+Seeds ``--expenses`` rows spread over ``--years`` and ``--hospitals``, backfills the monthly
+rollups, then times totals by hospital/month/category both ways and checks they agree. Finally
+it streams the whole table as CSV and NDJSON and reports rows/s and peak Python memory.
+
+    python benchmarks/bench_expenses.py [--expenses 1000000] [--years 5] [--hospitals 20]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+from common import temp_app, timed
+from backend import expenses
+from backend.extensions import db
+from backend.models import City, Expense, Hospital
+
+CATEGORIES = ['Salaries', 'Medicines', 'Consumables', 'Utilities', 'Maintenance', 'Equipment']
+
+
+def seed(count: int, years: int, hospitals: int):
+    db.session.add(City(name='Bench City'))
+    db.session.flush()
+    db.session.add_all([Hospital(name=f'Hospital {i}', city_id=1) for i in range(hospitals)])
+    db.session.flush()
+    rng = np.random.default_rng(3)
+    first = date.today() - timedelta(days=365 * years)
+    days = rng.integers(0, 365 * years, count).tolist()
+    hospital_ids = rng.integers(1, hospitals + 1, count).tolist()
+    categories = rng.choice(CATEGORIES, count).tolist()
+    amounts = np.round(rng.lognormal(6, 1.2, count), 2).tolist()
+    for start in range(0, count, 50000):
+        db.session.execute(db.insert(Expense), [
+            {'hospital_id': hospital_ids[i], 'description': f'Expense {i}', 'amount': amounts[i],
+             'date': first + timedelta(days=days[i]), 'category': categories[i]}
+            for i in range(start, min(start + 50000, count))
+        ])
+    db.session.commit()
+
+
+def raw_totals():
+    """What clients computed from the full expense list, done in SQL over the raw rows."""
+    month = db.func.strftime('%Y-%m', Expense.date)
+    return db.session.execute(
+        db.select(Expense.hospital_id, month, Expense.category, db.func.sum(Expense.amount), db.func.count(Expense.id))
+        .group_by(Expense.hospital_id, month, Expense.category)
+    ).all()
+
+
+def drain(fmt: str):
+    rows, peak = 0, 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for chunk in expenses.export(fmt):
+        rows += chunk.count('\n')
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expenses', type=int, default=1000000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--hospitals', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with temp_app():
+        seed(args.expenses, args.years, args.hospitals)
+        start = time.perf_counter()
+        rows = expenses.backfill()
+        db.session.commit()
+        print(f'Backfilled {rows} monthly rows from {args.expenses} expenses in {time.perf_counter() - start:.1f}s')
+
+        group_by = ['hospital', 'month', 'category']
+        raw_ms = timed(raw_totals, args.repeat)
+        rollup_ms = timed(lambda: expenses.summary(group_by), args.repeat)
+        one_ms = timed(lambda: expenses.summary(['month'], hospital_id=1), args.repeat)
+        raw = {(h, m, c): round(total, 2) for h, m, c, total, _ in raw_totals()}
+        rolled = {(r['hospital'], r['month'], r['category']): r['total'] for r in expenses.summary(group_by)}
+        print(f"{'query':<40} {'ms':>9}")
+        print(f"{'raw GROUP BY hospital/month/category':<40} {raw_ms:>9.1f}")
+        print(f"{'rollup hospital/month/category':<40} {rollup_ms:>9.1f}")
+        print(f"{'rollup one hospital by month':<40} {one_ms:>9.1f}")
+        mismatched = [key for key in raw if abs(raw[key] - rolled.get(key, 0)) > 0.01]
+        print('rollups match raw totals' if not mismatched else f'MISMATCH in {len(mismatched)} groups, e.g. {mismatched[:3]}')
+
+        for fmt in expenses.EXPORT_FORMATS:
+            count, seconds, peak = drain(fmt)
+            print(f'export {fmt:<7} {count:>10} lines in {seconds:.1f}s ({count / seconds:,.0f}/s), '
+                  f'peak {peak / 1024 / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""How /api/patient_flow scales with patient volume.
+
+    python benchmarks/bench_patient_flow.py [--volumes 1000 10000 100000]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common import QueryCounter, temp_app, timed
+from backend.extensions import db
+from backend.models import City, Department, Hospital, Patient
+
+
+def seed(volume: int, departments: int = 8, days: int = 90):
+    rng = np.random.default_rng(volume)
+    db.session.execute(db.delete(Patient))
+    if not db.session.execute(db.select(Department.id).limit(1)).first():
+        db.session.add(City(name='Bench City'))
+        db.session.flush()
+        db.session.add(Hospital(name='Bench Hospital', city_id=1))
+        db.session.add_all([Department(name=f'Dept {i}') for i in range(departments)])
+        db.session.flush()
+
+    now = datetime.utcnow()
+    offsets = rng.uniform(0, days * 86400, volume)
+    dept_ids = rng.integers(1, departments + 1, volume)
+    db.session.execute(db.insert(Patient), [
+        {'name': f'Patient {i}', 'hospital_id': 1, 'department_id': int(dept_ids[i]),
+         'arrival_time': now - timedelta(seconds=float(offsets[i])), 'status': 'Waiting'}
+        for i in range(volume)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--volumes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with temp_app() as (app, _):
+        client = app.test_client()
+        print(f"{'patients':>10} {'window':>7} {'ms':>9} {'queries':>8}")
+        for volume in args.volumes:
+            seed(volume)
+            for days in (7, 30, 90):
+                url = f'/api/patient_flow?days={days}'
+                ms = timed(lambda: client.get(url), args.repeat)
+                with QueryCounter(db.engine) as counter:
+                    client.get(url)
+                print(f'{volume:>10} {days:>7} {ms:>9.1f} {counter.count:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Registration throughput: one `new_patient` event per patient versus batched registration.
+
+Every path does the same work per patient (patient row, OPD queue entry and hourly rollup,
+rate estimate, dashboard and room updates), and a phase only counts once all of its patients
+are queued; any `error` event or rejected row aborts the run rather than flattering a path.
+
+    python benchmarks/bench_patient_registration.py [--patients 2000] [--batch-size 500]
+"""
+import argparse
+import logging
+import time
+
+from common import temp_app
+from backend.extensions import db
+from backend.models import City, Department, Hospital, OPDQueue
+
+
+def queued_count() -> int:
+    return db.session.execute(db.select(db.func.count(OPDQueue.id))).scalar()
+
+
+def wait_for(target: int, sock, timeout: float = 300):
+    """Block until ``target`` patients are queued, failing on any error the server reported."""
+    deadline = time.time() + timeout
+    while queued_count() < target:
+        errors = [packet['args'] for packet in sock.get_received() if packet['name'] == 'error']
+        if errors:
+            raise RuntimeError(f'registration failed: {errors[0]}')
+        if time.time() > deadline:
+            raise TimeoutError(f'only {queued_count()} of {target} patients queued')
+        db.session.remove()
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    logging.getLogger('backend.app').setLevel(logging.CRITICAL)
+
+    with temp_app() as (app, socketio):
+        db.session.add(City(name='Bench City'))
+        db.session.flush()
+        db.session.add(Hospital(name='Bench Hospital', city_id=1))
+        db.session.add_all([Department(name=f'Dept {i}') for i in range(4)])
+        db.session.commit()
+        rows = [{'name': f'Patient {i}', 'hospital_id': 1, 'department_id': i % 4 + 1} for i in range(args.patients)]
+
+        results = {}
+        sock = socketio.test_client(app)
+        start = time.perf_counter()
+        for row in rows:
+            # A full work queue sheds the event; resend after the retry_after it answers with, as a client would
+            ack = sock.emit('new_patient', row, callback=True)
+            while not ack['accepted']:
+                time.sleep(ack['retry_after'])
+                ack = sock.emit('new_patient', row, callback=True)
+        wait_for(args.patients, sock)
+        results['single (new_patient event)'] = time.perf_counter() - start
+
+        client = app.test_client()
+        start = time.perf_counter()
+        for i in range(0, len(rows), args.batch_size):
+            response = client.post('/api/patients/batch', json={'patients': rows[i:i + args.batch_size]})
+            if response.get_json()['rejected']:
+                raise RuntimeError(f"batch rejected rows: {response.get_json()['results'][:3]}")
+        wait_for(2 * args.patients, sock)
+        results[f'batch REST ({args.batch_size}/request)'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, len(rows), args.batch_size):
+            sock.emit('new_patients_batch', {'patients': rows[i:i + args.batch_size]})
+        wait_for(3 * args.patients, sock)
+        results[f'batch socket ({args.batch_size}/event)'] = time.perf_counter() - start
+        sock.disconnect()
+
+        baseline = results['single (new_patient event)']
+        print(f"{'path':<30} {'seconds':>9} {'patients/s':>11} {'speedup':>8}")
+        for path, seconds in results.items():
+            print(f'{path:<30} {seconds:>9.2f} {args.patients / seconds:>11.0f} {baseline / seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
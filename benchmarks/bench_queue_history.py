@@ -0,0 +1,107 @@
+"""OPD queue history: raw-row scan versus hourly rollups.
+
+Seeds ``--days`` of queue entries for one hospital, backfills the rollups, then times the
+old 24-hour GROUP BY over ``OPDQueue`` against rollup reads for a day, a week and the whole
+range. Finally it drives some live traffic through the incremental path and checks that a
+backfill over the same hour reproduces exactly the rows it maintained.
+
+    python benchmarks/bench_queue_history.py [--days 90] [--per-hour 40]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from common import temp_app, timed
+from backend import rollups
+from backend.extensions import db
+from backend.models import City, Hospital, OPDQueue, OPDQueueHourly, Patient
+
+
+def seed(days: int, per_hour: int) -> datetime:
+    """Insert the queue history; returns the hour it ends at."""
+    db.session.add(City(name='Bench City'))
+    db.session.flush()
+    db.session.add(Hospital(name='Bench Hospital', city_id=1))
+    db.session.flush()
+    db.session.execute(db.insert(Patient), [{'name': f'P-{i}', 'hospital_id': 1, 'department_id': 1} for i in range(100)])
+
+    rng = random.Random(7)
+    # History stops a day short of now so the live check below has the current hour to itself
+    end = rollups.hour_of(datetime.utcnow()) - timedelta(days=1)
+    start = end - timedelta(days=days)
+    rows = []
+    for hour in range(days * 24):
+        for _ in range(per_hour):
+            arrived = start + timedelta(hours=hour, seconds=rng.uniform(0, 3600))
+            done = arrived + timedelta(minutes=min(rng.expovariate(1 / 25), 600))
+            served = rng.random() < 0.9
+            rows.append({'patient_id': rng.randint(1, 100), 'hospital_id': 1, 'timestamp': arrived,
+                         'status': 'Served' if served else 'Cancelled', 'completed_at': done})
+        if len(rows) >= 10000:
+            db.session.execute(db.insert(OPDQueue), rows)
+            rows = []
+    if rows:
+        db.session.execute(db.insert(OPDQueue), rows)
+    db.session.commit()
+    return end
+
+
+def raw_history(hospital_id: int, start: datetime, end: datetime):
+    """The query /api/opd/queue/history ran before rollups."""
+    return db.session.query(
+        OPDQueue.timestamp,
+        db.func.count(OPDQueue.id).label('queue_length')
+    ).filter(
+        OPDQueue.hospital_id == hospital_id,
+        OPDQueue.timestamp.between(start, end)
+    ).group_by(
+        db.func.strftime('%Y-%m-%d %H:00:00', OPDQueue.timestamp)
+    ).order_by(OPDQueue.timestamp).all()
+
+
+def rollup_rows(since: datetime):
+    return db.session.execute(
+        db.select(OPDQueueHourly.hospital_id, OPDQueueHourly.hour, OPDQueueHourly.arrivals, OPDQueueHourly.served,
+                  OPDQueueHourly.peak_length, db.func.round(OPDQueueHourly.wait_minutes_total, 6))
+        .where(OPDQueueHourly.hour >= since).order_by(OPDQueueHourly.hour)
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--per-hour', type=int, default=40)
+    args = parser.parse_args()
+
+    with temp_app() as (app, _):
+        now = seed(args.days, args.per_hour)
+        total = db.session.execute(db.select(db.func.count(OPDQueue.id))).scalar()
+
+        start = datetime.utcnow()
+        written = rollups.backfill()
+        print(f"backfill: {written} hourly rows from {total} entries in {(datetime.utcnow() - start).total_seconds():.2f}s")
+
+        day = now - timedelta(hours=24)
+        print(f"raw scan, 24h:         {timed(lambda: raw_history(1, day, now)):8.2f} ms")
+        for label, since in (('24h', day), ('7d', now - timedelta(days=7)), (f'{args.days}d', now - timedelta(days=args.days))):
+            ms = timed(lambda: rollups.history(1, since, now + timedelta(hours=1)))
+            print(f"rollups, {label:<5}hourly: {ms:8.2f} ms")
+        ms = timed(lambda: rollups.history(1, now - timedelta(days=args.days), now, bucket='day'))
+        print(f"rollups, {args.days}d daily:   {ms:8.2f} ms")
+
+        # Live traffic through the incremental path, then a backfill of the same hour must agree
+        live_hour = rollups.hour_of(datetime.utcnow())
+        entries = [rollups.enqueue(i % 100 + 1, 1) for i in range(50)]
+        for i, entry in enumerate(entries[:35]):
+            rollups.complete(entry.id, 'Served' if i % 5 else 'Cancelled')
+        incremental = rollup_rows(live_hour)
+        rollups.backfill(since=live_hour)
+        rebuilt = rollup_rows(live_hour)
+        if incremental != rebuilt:
+            print(f"MISMATCH\n  incremental: {incremental}\n  backfill:    {rebuilt}")
+            raise SystemExit(1)
+        print(f"OK: incremental rollups match a backfill ({incremental})")
+
+
+if __name__ == '__main__':
+    main()
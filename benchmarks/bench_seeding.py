@@ -0,0 +1,53 @@
+"""Seeding throughput: ORM objects added one by one versus the bulk synthetic seeder.
+
+Times ``--orm-patients`` patients added through the session (what ``init_db`` does), then
+``seed_synthetic`` at ``--patients`` patients with a queue entry each, and reports rows/s.
+
+    python benchmarks/bench_seeding.py [--patients 1000000] [--orm-patients 20000]
+"""
+import argparse
+import time
+
+from common import temp_app
+from backend.database import SeedVolumes, seed_synthetic
+from backend.extensions import db
+from backend.models import City, Department, Hospital, Patient
+
+
+def orm_seed(count: int) -> int:
+    db.session.add(City(name='Bench City'))
+    db.session.flush()
+    db.session.add(Hospital(name='Bench Hospital', city_id=1))
+    db.session.add(Department(name='Bench Department'))
+    db.session.flush()
+    for i in range(count):
+        db.session.add(Patient(name=f'Patient {i}', hospital_id=1, department_id=1))
+    db.session.commit()
+    return count + 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--orm-patients', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    with temp_app():
+        start = time.perf_counter()
+        rows = orm_seed(args.orm_patients)
+        results['orm (session.add per row)'] = (rows, time.perf_counter() - start)
+
+    with temp_app():
+        start = time.perf_counter()
+        written = seed_synthetic(SeedVolumes(patients=args.patients), seed=args.seed)
+        results['bulk (seed_synthetic)'] = (sum(written.values()), time.perf_counter() - start)
+
+    print(f"{'path':<28} {'rows':>10} {'seconds':>9} {'rows/s':>10}")
+    for path, (rows, seconds) in results.items():
+        print(f'{path:<28} {rows:>10} {seconds:>9.2f} {rows / seconds:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Bytes on the wire and encode time for the largest payloads, before and after.
+
+"Before" is Flask's stock encoder as ``jsonify`` calls it; "after" is
+``backend.serialization`` (orjson when installed). Each payload is then compressed the way
+``backend.compression`` would send it to a client accepting gzip (and brotli, if installed).
+The payloads mirror ``/api/patients`` (one full page), ``/api/patient_flow?days=90``,
+``/api/opd/queue`` for a busy hospital, and a wait-time socket broadcast.
+
+    python benchmarks/bench_serialization.py [--departments 12] [--queue 500] [--repeat 20]
+"""
+import argparse
+import json
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from common import timed
+from backend import compression, serialization
+from backend.config import Config
+from backend.pagination import MAX_PAGE_SIZE
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+    stock_default = DefaultJSONProvider.default
+except ImportError:  # Flask < 2.2
+    from flask.json import JSONEncoder as FlaskJSONEncoder
+    stock_default = FlaskJSONEncoder().default
+
+
+def payloads(departments: int, queue: int):
+    rng = np.random.default_rng(11)
+    names = [f'Department {i}' for i in range(departments)]
+    patients = [{'id': i, 'name': f'Patient {i}', 'age': int(age), 'gender': ('F', 'M')[i % 2], 'hospital_id': 1 + i % 20}
+                for i, age in enumerate(rng.integers(0, 95, MAX_PAGE_SIZE))]
+
+    first = date.today() - timedelta(days=90)
+    counts = rng.poisson(40, (90, departments)).astype(float)
+    flow = {
+        'daily_flow': {str(first + timedelta(days=d)): {name: counts[d, j] for j, name in enumerate(names)}
+                       for d in range(90)},
+        'statistics': {name: {'mean': float(counts[:, j].mean()), 'median': float(np.median(counts[:, j])),
+                              'std_dev': float(counts[:, j].std()), 'min': float(counts[:, j].min()),
+                              'max': float(counts[:, j].max()), 'trend': float(rng.normal())}
+                       for j, name in enumerate(names)}
+    }
+
+    now = datetime.utcnow()
+    opd = {
+        'queue': [{'id': i, 'patient_id': 1000 + i, 'queue_number': i, 'wait_time': float(i * 3 % 240)} for i in range(queue)],
+        'queue_start_time': now.isoformat(),
+        'estimated_wait_time': queue * 15,
+        'patients_queuing': queue
+    }
+
+    updates = {'updates': [{'department_id': j, 'department': name, 'wait_time': round(float(w), 2)}
+                           for j, (name, w) in enumerate(zip(names, rng.exponential(20, departments)))]}
+    return {'patients page': patients, 'patient_flow 90d': flow, 'opd queue': opd, 'wait_time broadcast': updates}
+
+
+def before(payload) -> str:
+    return json.dumps(payload, default=stock_default, separators=(',', ':'), sort_keys=True)
+
+
+def after(payload) -> str:
+    return serialization.dumps(payload, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--departments', type=int, default=12)
+    parser.add_argument('--queue', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    compressor = compression.Compressor(gzip_level=Config.COMPRESSION_GZIP_LEVEL,
+                                        brotli_quality=Config.COMPRESSION_BROTLI_QUALITY)
+    print(f'encoder: {serialization.backend_name()}, encodings: {compressor.encodings}, '
+          f'threshold {Config.COMPRESSION_MIN_BYTES} bytes')
+    print(f"{'payload':<22} {'':<7} {'encode ms':>10} {'bytes':>9}"
+          + ''.join(f' {encoding + " bytes":>11} {encoding + " ms":>8}' for encoding in compressor.encodings))
+    for name, payload in payloads(args.departments, args.queue).items():
+        for label, encode in (('before', before), ('after', after)):
+            body = encode(payload).encode()
+            line = f'{name:<22} {label:<7} {timed(lambda: encode(payload), args.repeat):>10.3f} {len(body):>9}'
+            if label == 'after' and len(body) >= Config.COMPRESSION_MIN_BYTES:
+                for encoding in compressor.encodings:
+                    size = len(compressor._encoder(encoding).finish(body))
+                    seconds = timed(lambda: compressor._encoder(encoding).finish(body), args.repeat)
+                    line += f' {size:>11} {seconds:>8.3f}'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
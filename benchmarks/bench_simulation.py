@@ -0,0 +1,110 @@
+"""What-if simulation: accuracy check, process-pool speedup and the scenario cache.
+
+1. A stationary single-priority queue without beds is M/M/c, so the simulated mean wait
+   must land near the Erlang-C figure from backend.queueing.
+2. The same replications run in-process and across the pool; results must be identical.
+3. /api/simulation is called twice for "Monday 10:00, two cardiologists out" against seeded
+   history; the second call must be a cache hit.
+
+    python benchmarks/bench_simulation.py [--replications 400] [--workers 4]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common import temp_app
+from backend import queueing, simulation
+from backend.extensions import db
+from backend.models import Bed, City, Department, Doctor, Hospital, Patient
+
+
+def check_against_erlang_c(replications: int):
+    servers, arrival_rate, service_minutes = 3, 0.16, 15.0  # 80% utilisation
+    model = simulation.DepartmentModel(id=1, name='M/M/3', doctors=servers, service_minutes=service_minutes,
+                                       arrival_rates=np.full(simulation.HOURS_PER_WEEK, arrival_rate),
+                                       priorities=((1, 1.0),))
+    scenario = simulation.Scenario(duration_hours=200, replications=replications, admission_probability=0.0)
+    outcome = simulation.run_replications([model], scenario, np.random.SeedSequence(1).spawn(replications))[1]
+    # Drop the warm-up of each run: patients arriving in the first 10 hours start from an empty queue
+    waits = np.concatenate([w[int(len(w) * 0.05):] for w in outcome.waits])
+    expected = queueing.engine.metrics(servers, arrival_rate, 1 / service_minutes).wait_time
+    error = abs(waits.mean() - expected) / expected
+    print(f"M/M/3 at 80%: simulated mean wait {waits.mean():.2f} min, Erlang-C {expected:.2f} min ({error:.1%} off)")
+    return error < 0.1
+
+
+def seed_history(weeks: int):
+    db.session.add(City(name='Sim City'))
+    db.session.flush()
+    db.session.add(Hospital(name='Sim Hospital', city_id=1))
+    names = ['Emergency', 'Cardiology', 'Pediatrics', 'Orthopedics']
+    db.session.add_all([Department(name=name) for name in names])
+    db.session.flush()
+    db.session.add_all([Doctor(name=f'Dr {i}', department_id=i % 4 + 1) for i in range(12)])
+    db.session.execute(db.insert(Bed), [
+        {'bed_number': f'B-{i}', 'department_id': i % 4 + 1, 'is_available': i % 3 != 0} for i in range(40)
+    ])
+    rng = random.Random(3)
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for hour in range(weeks * 7 * 24):
+        at = end - timedelta(hours=hour + 1)
+        busy = 8 <= at.hour < 18
+        for department_id in range(1, 5):
+            for _ in range(rng.randint(4, 9) if busy else rng.randint(0, 2)):
+                rows.append({'name': 'P', 'hospital_id': 1, 'department_id': department_id, 'status': 'Served',
+                             'arrival_time': at + timedelta(seconds=rng.uniform(0, 3600))})
+    db.session.execute(db.insert(Patient), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replications', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    ok = check_against_erlang_c(100)
+
+    with temp_app() as (app, _):
+        print(f"seeded {seed_history(8)} historical arrivals")
+        scenario = simulation.Scenario(weekday=0, start_hour=10, duration_hours=4,
+                                       replications=args.replications, doctors_out=((2, 2),))
+        models = simulation.load_inputs(scenario)
+
+        results = {}
+        for workers in (0, args.workers):
+            simulator = simulation.Simulator(workers=workers, cache_size=0)
+            simulator.run(scenario, models)  # Start the pool outside the timing
+            start = time.perf_counter()
+            results[workers], _ = simulator.run(scenario, models)
+            print(f"{args.replications} replications, workers={workers}: {time.perf_counter() - start:.2f}s")
+            simulator.shutdown()
+        same = results[0]['departments'] == results[args.workers]['departments']
+        print(f"pool and in-process results identical: {same}")
+        ok &= same
+
+        client = app.test_client()
+        body = {'weekday': 0, 'start_hour': 10, 'duration_hours': 4, 'replications': args.replications,
+                'doctors_out': {'2': 2}}
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            response = client.post('/api/simulation', json=body).get_json()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"/api/simulation: first {timings[0]:.0f} ms, repeat {timings[1]:.1f} ms (cached={response['cached']})")
+        ok &= response['cached']
+        for department in response['departments']:
+            print(f"  {department['department']:<12} doctors={department['doctors']} "
+                  f"arrivals={department['mean_arrivals']:>6} wait={department['wait_minutes']}")
+
+    print('OK' if ok else 'FAILED')
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Startup time: import, app build and first request, each in a fresh interpreter.
+
+The first run starts on an empty database, so it creates the schema and demo data; the rest
+are restarts against that database, which only check for pending migrations. For each run it
+reports interpreter+import time, ``get_app`` time, the first ``/api/queue_data`` request and
+whether numpy had been imported before that request.
+
+    python benchmarks/bench_startup.py [--runs 5] [--database sqlite:///path.db]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from backend.app import get_app
+imported = time.perf_counter()
+app, socketio = get_app({'AUTO_MIGRATE': True})
+built = time.perf_counter()
+numpy_at_build = 'numpy' in sys.modules
+status = app.test_client().get('/api/queue_data').status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'build': built - imported, 'first_request': served - built,
+                  'numpy_at_build': numpy_at_build, 'status': status}))
+"""
+
+
+def probe(url: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=url)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--database', help='database URL to start against (default: a new temporary SQLite file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database or 'sqlite:///' + os.path.join(tmp, 'startup.db')
+        runs = [probe(url) for _ in range(args.runs)]
+
+    print(f"{'run':<8} {'process s':>10} {'import s':>9} {'build s':>8} {'1st req s':>10} {'numpy':>6} {'status':>7}")
+    for i, run in enumerate(runs):
+        label = 'first' if i == 0 else 'restart'
+        print(f"{label:<8} {run['process']:>10.3f} {run['import']:>9.3f} {run['build']:>8.3f} "
+              f"{run['first_request']:>10.3f} {'yes' if run['numpy_at_build'] else 'no':>6} {run['status']:>7}")
+    if len(runs) > 1:
+        restarts = runs[1:]
+        print(f"median restart: {statistics.median(r['process'] for r in restarts):.3f}s process, "
+              f"{statistics.median(r['import'] + r['build'] for r in restarts):.3f}s import+build")
+
+
+if __name__ == '__main__':
+    main()
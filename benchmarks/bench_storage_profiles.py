@@ -0,0 +1,101 @@
+"""Concurrent read/write benchmark for the storage profiles.
+
+Writer threads register patients one commit at a time, as the socket workers do, while
+reader threads poll the queue statistics behind /api/queue_data. Each profile runs against
+its own fresh SQLite file; "database is locked" and other errors are counted, not raised.
+
+    python benchmarks/bench_storage_profiles.py [--seconds 5] [--writers 4] [--readers 8]
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.exc import OperationalError
+
+from common import temp_app
+from backend import analytics
+from backend.extensions import db
+from backend.models import City, Department, Doctor, Hospital, Patient
+from backend.storage import PROFILES
+
+
+def seed(departments: int, patients: int):
+    db.session.add(City(name='Bench City'))
+    db.session.flush()
+    db.session.add(Hospital(name='Bench Hospital', city_id=1))
+    db.session.add_all([Department(name=f'Dept {i}') for i in range(departments)])
+    db.session.flush()
+    db.session.add_all([Doctor(name=f'Dr {i}', department_id=i % departments + 1) for i in range(departments * 2)])
+    db.session.execute(db.insert(Patient), [
+        {'name': f'P-{i}', 'hospital_id': 1, 'department_id': i % departments + 1} for i in range(patients)
+    ])
+    db.session.commit()
+
+
+def run_profile(profile: str, args) -> dict:
+    with temp_app(STORAGE_PROFILE=profile) as (app, _):
+        seed(args.departments, args.patients)
+        deadline = time.perf_counter() + args.seconds
+        latencies = {'write': [], 'read': []}
+        errors = {'write': 0, 'read': 0}
+        lock = threading.Lock()
+
+        def write(i: int):
+            patient = Patient(name=f'W-{i}', hospital_id=1, department_id=i % args.departments + 1)
+            db.session.add(patient)
+            db.session.commit()
+
+        def read(i: int):
+            analytics.department_queue_stats()
+
+        def worker(kind: str, op):
+            done, failed, i = [], 0, 0
+            while time.perf_counter() < deadline:
+                with app.app_context():
+                    start = time.perf_counter()
+                    try:
+                        op(i)
+                        done.append(time.perf_counter() - start)
+                    except OperationalError:
+                        db.session.rollback()
+                        failed += 1
+                i += 1
+            with lock:
+                latencies[kind].extend(done)
+                errors[kind] += failed
+
+        threads = [threading.Thread(target=worker, args=('write', write)) for _ in range(args.writers)]
+        threads += [threading.Thread(target=worker, args=('read', read)) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = {'profile': profile}
+        for kind in ('write', 'read'):
+            samples = np.array(latencies[kind]) * 1000
+            result[f'{kind}s_per_s'] = len(samples) / args.seconds
+            result[f'{kind}_p95_ms'] = float(np.percentile(samples, 95)) if len(samples) else float('nan')
+            result[f'{kind}_errors'] = errors[kind]
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--departments', type=int, default=4)
+    parser.add_argument('--patients', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'writes/s':>10} {'write p95':>10} {'w err':>6} {'reads/s':>10} {'read p95':>10} {'r err':>6}")
+    for profile in PROFILES:
+        r = run_profile(profile, args)
+        print(f"{r['profile']:<10} {r['writes_per_s']:>10.1f} {r['write_p95_ms']:>8.1f}ms {r['write_errors']:>6} "
+              f"{r['reads_per_s']:>10.1f} {r['read_p95_ms']:>8.1f}ms {r['read_errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
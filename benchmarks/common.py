@@ -0,0 +1,67 @@
+from __future__ import annotations
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# backend.app builds its shared app on first use; keep it off the checked-in database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from backend.extensions import db
+
+
+@contextmanager
+def temp_app(**config):
+    """A new application bound to a throwaway SQLite database with an empty schema.
+
+    Extra keyword arguments override app config before anything is built, so they reach the
+    storage profile, the scheduler and every other component, as they would in production.
+    """
+    from backend.app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        # The schema exists before the app is built, so its startup warm-ups find empty tables
+        engine = create_engine(url)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        app, socketio = create_app(dict(config, SQLALCHEMY_DATABASE_URI=url))
+        with app.app_context():
+            yield app, socketio
+            app.extensions['wait_time_broadcaster'].stop()
+            db.session.remove()
+            db.engine.dispose()
+
+
+class QueryCounter:
+    """Counts SQL statements issued through the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Best wall-clock time of ``repeat`` calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
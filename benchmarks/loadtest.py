@@ -0,0 +1,315 @@
+"""Mixed REST and Socket.IO load test against a seeded database.
+
+Boots the app against a fresh SQLite file seeded by ``backend.database.seed_synthetic`` (or an
+existing database with ``--database``), then runs ``--concurrency`` clients that draw operations
+from the weighted mix in ``OPERATIONS`` until ``--requests`` have been sent. Every client has its
+own HTTP and Socket.IO test client; a socket event counts as done when its result event (or an
+``error``) comes back. Operations the app does not serve are skipped and listed as such.
+
+Reports p50/p95/p99 latency and throughput per operation. Queries per request come from a
+separate single-client pass, so concurrent traffic and background ticks do not blur the counts.
+Results are saved as JSON; ``--compare`` prints the change against an earlier run.
+
+    python benchmarks/loadtest.py [--requests 2000] [--concurrency 8] [--patients 100000]
+    python benchmarks/loadtest.py --database sqlite:////tmp/seeded.db --compare benchmarks/results/<run>.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from common import QueryCounter
+from backend.database import SeedVolumes, seed_synthetic
+from backend.extensions import db
+from backend.models import Bed, Department, Hospital, Patient
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# name -> (weight, kind, path the app must serve for the operation to run)
+OPERATIONS = {
+    'GET /api/queue_data': (30, 'rest', '/api/queue_data'),
+    'GET /api/patient_flow': (10, 'rest', '/api/patient_flow'),
+    'GET /api/opd/queue': (20, 'rest', '/api/opd/queue'),
+    'POST /api/allocate_bed': (10, 'rest', '/api/allocate_bed'),
+    'socket new_patient': (20, 'socket', None),
+    'socket update_bed_status': (10, 'socket', None),
+}
+
+
+class Client:
+    """One simulated user: an HTTP client, a socket subscribed to its hospital, and the beds it may toggle."""
+
+    _names = itertools.count()
+
+    def __init__(self, app, socketio, world: Dict[str, Any], index: int, timeout: float):
+        self.http = app.test_client()
+        self.socket = socketio.test_client(app)
+        self.hospital_id = world['hospitals'][index % len(world['hospitals'])]
+        self.world = world
+        self.beds = world['toggle_beds'][index::world['clients']]  # (bed_id, is_available) pairs, disjoint per client
+        self.timeout = timeout
+        self.rng = random.Random(index)
+        self.socket.emit('subscribe', {'hospital_id': self.hospital_id})
+        self.socket.get_received()
+
+    def close(self):
+        self.socket.disconnect()
+
+    def _await(self, match: Callable[[str, Dict[str, Any]], bool]) -> bool:
+        """Wait for a matching event; False on an ``error`` event or timeout."""
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            for message in self.socket.get_received():
+                args = message['args'][0] if message['args'] else {}
+                if message['name'] == 'error':
+                    return False
+                if match(message['name'], args):
+                    return True
+            time.sleep(0.0005)
+        return False
+
+    def run(self, name: str) -> bool:
+        """Send one operation and wait for it to finish; returns whether it succeeded."""
+        if name == 'GET /api/queue_data':
+            return self.http.get('/api/queue_data').status_code == 200
+        if name == 'GET /api/patient_flow':
+            days = self.rng.choice((7, 30, 90))
+            return self.http.get(f'/api/patient_flow?days={days}').status_code == 200
+        if name == 'GET /api/opd/queue':
+            return self.http.get(f'/api/opd/queue?hospital_id={self.hospital_id}').status_code == 200
+        if name == 'POST /api/allocate_bed':
+            response = self.http.post('/api/allocate_bed', json={
+                'patient_id': self.rng.randint(1, self.world['patients']),
+                'department_id': self.rng.choice(self.world['allocation_departments'])})
+            return response.status_code == 200
+        if name == 'socket new_patient':
+            patient = f'Load {next(self._names)}'
+            self.socket.emit('new_patient', {'name': patient, 'hospital_id': self.hospital_id,
+                                             'department_id': self.rng.choice(self.world['departments'])})
+            return self._await(lambda event, data: event == 'patient_added' and data.get('name') == patient)
+        if name == 'socket update_bed_status':
+            if not self.beds:
+                return False
+            bed_id, available = self.beds[self.rng.randrange(len(self.beds))]
+            self.socket.emit('update_bed_status', {'bed_id': bed_id, 'available': not available,
+                                                   'hospital_id': self.hospital_id})
+            done = self._await(lambda event, data: event == 'bed_status_updated' and data.get('bed_id') == bed_id)
+            if done:
+                self.beds[self.beds.index((bed_id, available))] = (bed_id, not available)
+            return done
+        raise ValueError(f'unknown operation {name}')
+
+
+@contextmanager
+def seeded_database(args):
+    """URL of the database to test: ``--database`` as given, or a temporary file seeded for this run."""
+    if args.database:
+        yield args.database
+        return
+    from backend.app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = 'sqlite:///' + os.path.join(tmp, 'loadtest.db')
+        # The schema exists before the app is built, so its startup warm-ups find empty tables
+        engine = create_engine(url)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        # A throwaway app bound to this file does the seeding; the measured app is built afterwards
+        seeder, _ = create_app({'SQLALCHEMY_DATABASE_URI': url})
+        with seeder.app_context():
+            start = time.perf_counter()
+            written = seed_synthetic(SeedVolumes(patients=args.patients, days=args.days), seed=args.seed)
+            print(f'Seeded {sum(written.values())} rows in {time.perf_counter() - start:.1f}s')
+            db.session.remove()
+            db.engine.dispose()
+        seeder.extensions['wait_time_broadcaster'].stop()
+        yield url
+
+
+def describe_world(clients: int) -> Dict[str, Any]:
+    """Ids the workload draws from. Beds in half the departments are left to ``update_bed_status`` so
+    ``allocate_bed`` never claims a bed a client is about to toggle."""
+    departments = db.session.execute(db.select(Department.id).order_by(Department.id)).scalars().all()
+    toggle_departments = departments[len(departments) // 2:]
+    beds = db.session.execute(
+        db.select(Bed.id, Bed.is_available).where(Bed.department_id.in_(toggle_departments)).order_by(Bed.id)
+    ).all()
+    return {
+        'clients': clients,
+        'departments': departments,
+        'allocation_departments': departments[:len(departments) // 2] or departments,
+        'hospitals': db.session.execute(db.select(Hospital.id).order_by(Hospital.id)).scalars().all(),
+        'patients': db.session.execute(db.select(db.func.max(Patient.id))).scalar() or 1,
+        'toggle_beds': [(bed_id, bool(available)) for bed_id, available in beds],
+    }
+
+
+def load(app, socketio, world, mix: List[str], args) -> Dict[str, Any]:
+    """Run the concurrent phase; returns per-operation latency samples, failures and the wall time."""
+    rng = random.Random(args.seed)
+    weights = [OPERATIONS[name][0] for name in mix]
+    plan = iter(rng.choices(mix, weights=weights, k=args.requests))
+    lock = threading.Lock()
+    samples = {name: [] for name in mix}
+    failures = {name: 0 for name in mix}
+
+    def client_loop(index: int):
+        with app.app_context():
+            client = Client(app, socketio, world, index, args.timeout)
+            try:
+                while True:
+                    with lock:
+                        name = next(plan, None)
+                    if name is None:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        ok = client.run(name)
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        samples[name].append(elapsed)
+                        failures[name] += not ok
+            finally:
+                client.close()
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'samples': samples, 'failures': failures, 'seconds': time.perf_counter() - start}
+
+
+def count_queries(app, socketio, mix: List[str], runs: int) -> Dict[str, float]:
+    """Mean SQL statements per operation, one client at a time."""
+    counts = {}
+    with app.app_context():
+        world = describe_world(1)  # Bed states have moved on during the load phase
+        client = Client(app, socketio, world, 0, timeout=10)
+        try:
+            for name in mix:
+                with QueryCounter(db.engine) as counter:
+                    for _ in range(runs):
+                        client.run(name)
+                counts[name] = counter.count / runs
+        finally:
+            client.close()
+    return counts
+
+
+def summarize(samples: List[float], failures: int, seconds: float, queries: Optional[float]) -> Dict[str, Any]:
+    ms = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (float('nan'),) * 3
+    return {
+        'requests': len(ms),
+        'failures': failures,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'throughput_rps': round(len(ms) / seconds, 1) if seconds else 0.0,
+        'queries_per_request': round(queries, 2) if queries is not None else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"{'operation':<28} {'reqs':>6} {'fail':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for name, row in report['operations'].items():
+        queries = '-' if row['queries_per_request'] is None else f"{row['queries_per_request']:.1f}"
+        line = (f"{name:<28} {row['requests']:>6} {row['failures']:>5} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {row['throughput_rps']:>8.1f} {queries:>8}")
+        before = (baseline or {}).get('operations', {}).get(name)
+        if before and before['p95_ms']:
+            line += f" {row['p95_ms'] / before['p95_ms']:>11.2f}x"
+        print(line)
+    for name in report['skipped']:
+        print(f'{name:<28} skipped: not served by this app')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--database', help='run against this database URL instead of seeding a temporary one')
+    parser.add_argument('--patients', type=int, default=100000, help='patients to seed')
+    parser.add_argument('--days', type=int, default=90, help='days of history to seed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', choices=list(OPERATIONS), help='restrict the mix to these operations')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds to wait for a socket result event')
+    parser.add_argument('--query-runs', type=int, default=10, help='runs per operation in the query-count pass')
+    parser.add_argument('--output', help=f'where to write the JSON results (default: {RESULTS_DIR}/<commit>-<time>.json)')
+    parser.add_argument('--compare', help='an earlier results file to compare p95 latency against')
+    args = parser.parse_args()
+    logging.getLogger('backend.app').setLevel(logging.WARNING)
+
+    with seeded_database(args) as url:
+        from backend.app import create_app
+
+        # Built after seeding so bed free lists and estimates start warm
+        app, socketio = create_app({'SQLALCHEMY_DATABASE_URI': url})
+        served = {rule.rule for rule in app.url_map.iter_rules()}
+        mix = [name for name in (args.only or OPERATIONS) if OPERATIONS[name][2] in (None, *served)]
+        skipped = [name for name in (args.only or OPERATIONS) if name not in mix]
+
+        with app.app_context():
+            world = describe_world(args.concurrency)
+        result = load(app, socketio, world, mix, args)
+        queries = count_queries(app, socketio, mix, args.query_runs)
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    all_samples = [s for name in mix for s in result['samples'][name]]
+    report = {
+        'commit': git_commit(),
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'seconds': round(result['seconds'], 3),
+        'operations': {name: summarize(result['samples'][name], result['failures'][name], result['seconds'],
+                                       queries.get(name)) for name in mix},
+        'total': summarize(all_samples, sum(result['failures'].values()), result['seconds'], None),
+        'skipped': skipped,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    total = report['total']
+    print(f"total: {total['requests']} requests in {report['seconds']:.1f}s ({total['throughput_rps']:.1f}/s), "
+          f"p95 {total['p95_ms']:.1f}ms, {total['failures']} failed")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['commit'] or 'nocommit'}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Concurrency stress test for bed allocation: parallel admissions must never share a bed.
+
+Several allocators (standing in for separate worker processes, each with its own free lists)
+race many threads for fewer beds than there are patients. Exits non-zero on any double booking.
+
+    python benchmarks/stress_bed_allocation.py [--beds 200] [--patients 600] [--threads 16] [--workers 3]
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+
+from common import temp_app
+from backend.beds import BedAllocator
+from backend.extensions import db
+from backend.models import Bed, City, Department, Hospital, Patient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--beds', type=int, default=200)
+    parser.add_argument('--patients', type=int, default=600)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--departments', type=int, default=2)
+    args = parser.parse_args()
+
+    with temp_app() as (app, _):
+        db.session.add(City(name='Stress City'))
+        db.session.flush()
+        db.session.add(Hospital(name='Stress Hospital', city_id=1))
+        db.session.add_all([Department(name=f'Ward {i}') for i in range(args.departments)])
+        db.session.flush()
+        db.session.execute(db.insert(Bed), [
+            {'bed_number': f'B-{i}', 'department_id': i % args.departments + 1, 'is_available': True}
+            for i in range(args.beds)
+        ])
+        db.session.execute(db.insert(Patient), [
+            {'name': f'P-{i}', 'hospital_id': 1, 'department_id': i % args.departments + 1}
+            for i in range(args.patients)
+        ])
+        db.session.commit()
+
+        allocators = [BedAllocator() for _ in range(args.workers)]
+        for allocator in allocators:
+            allocator.load()
+
+        claims, failures = [], []
+        lock = threading.Lock()
+        next_patient = iter(range(1, args.patients + 1))
+
+        def admit(allocator: BedAllocator):
+            with app.app_context():
+                while True:
+                    with lock:
+                        patient_id = next(next_patient, None)
+                    if patient_id is None:
+                        return
+                    try:
+                        bed = allocator.claim(patient_id % args.departments + 1, patient_id)
+                    except Exception as e:
+                        db.session.rollback()
+                        with lock:
+                            failures.append(repr(e))
+                        continue
+                    if bed:
+                        with lock:
+                            claims.append((bed.id, patient_id))
+
+        threads = [threading.Thread(target=admit, args=(allocators[i % args.workers],)) for i in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        db.session.remove()
+        stored = db.session.execute(db.select(Bed.id, Bed.patient_id).where(Bed.is_available == False)).all()
+        doubled = [bed_id for bed_id, n in Counter(bed_id for bed_id, _ in claims).items() if n > 1]
+        mismatched = set(claims) ^ {(bed_id, patient_id) for bed_id, patient_id in stored}
+
+        print(f'{len(claims)} claims for {args.beds} beds by {args.threads} threads over {args.workers} allocators '
+              f'in {elapsed:.2f}s ({len(failures)} errors)')
+        if doubled or mismatched or len(claims) > args.beds:
+            print(f'FAIL: double-booked beds {doubled[:10]}, {len(mismatched)} claims disagree with the database')
+            sys.exit(1)
+        print('OK: no bed was allocated twice')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Concurrency stress test for stock movements: parallel batches must not lose updates.
+
+Threads post batches of receipts and dispensations against a few items through
+``/api/inventory/movements``, then the final quantities are checked against the starting stock
+plus every accepted delta, and against the ledger. Exits non-zero on any mismatch.
+
+    python benchmarks/stress_stock_movements.py [--batches 400] [--batch-size 50] [--threads 16] [--items 5]
+"""
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from common import temp_app
+from backend.extensions import db
+from backend.models import City, Hospital, Inventory, StockMovement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, default=400)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=10000, help='starting quantity of each item')
+    args = parser.parse_args()
+    logging.getLogger('backend.app').setLevel(logging.CRITICAL)
+
+    with temp_app() as (app, _):
+        db.session.add(City(name='Stress City'))
+        db.session.flush()
+        db.session.add(Hospital(name='Stress Hospital', city_id=1))
+        db.session.execute(db.insert(Inventory), [
+            {'hospital_id': 1, 'item_name': f'Item {i}', 'quantity': args.stock, 'unit_price': 1.0}
+            for i in range(args.items)
+        ])
+        db.session.commit()
+
+        applied, rejected = Counter(), []
+        lock = threading.Lock()
+        next_batch = iter(range(args.batches))
+
+        def post():
+            client = app.test_client()
+            while True:
+                with lock:
+                    batch = next(next_batch, None)
+                if batch is None:
+                    return
+                rng = random.Random(batch)
+                movements = [{'hospital_id': 1, 'item_name': f'Item {rng.randrange(args.items)}',
+                              'delta': rng.choice((-1, -2, -5, 3, 10))} for _ in range(args.batch_size)]
+                response = client.post('/api/inventory/movements', json={'movements': movements})
+                with lock:
+                    if response.status_code == 200:
+                        for m in movements:
+                            applied[m['item_name']] += m['delta']
+                    else:
+                        rejected.append(response.status_code)
+
+        threads = [threading.Thread(target=post) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        db.session.remove()
+        stored = dict(db.session.execute(db.select(Inventory.item_name, Inventory.quantity)).all())
+        ledger = dict(db.session.execute(
+            db.select(StockMovement.item_name, db.func.sum(StockMovement.delta)).group_by(StockMovement.item_name)
+        ).all())
+        lost = {item: (args.stock + applied[item], quantity) for item, quantity in stored.items()
+                if quantity != args.stock + applied[item] or ledger.get(item, 0) != applied[item]}
+
+        accepted = args.batches - len(rejected)
+        print(f'{accepted} batches of {args.batch_size} applied, {len(rejected)} rejected, by {args.threads} threads '
+              f'in {elapsed:.2f}s ({accepted * args.batch_size / elapsed:.0f} movements/s)')
+        if lost:
+            print(f'FAIL: expected vs stored quantity {lost}')
+            sys.exit(1)
+        print('OK: every accepted movement is reflected in the stock and the ledger')
+
+
+if __name__ == '__main__':
+    main()
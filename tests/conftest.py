@@ -0,0 +1,30 @@
+from __future__ import annotations
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app import create_app
+from backend.extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A fresh app on its own SQLite file, with the schema and demo data created at startup."""
+    app, _ = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'AUTO_MIGRATE': True,
+    })
+    with app.app_context():
+        yield app
+        app.extensions['wait_time_broadcaster'].stop()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
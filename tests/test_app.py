@@ -0,0 +1,42 @@
+from backend.app import create_app
+from backend.extensions import db
+
+
+def test_create_app_builds_components_from_config_overrides(tmp_path):
+    app, _ = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'config.db'),
+        'AUTO_MIGRATE': True,
+        'COMPRESSION_MIN_BYTES': 64,
+        'REFERENCE_CACHE_TTL_SECONDS': 7,
+        'USER_CACHE_MAX_ENTRIES': 3,
+        'SIMULATION_WORKERS': 0,
+        'SIMULATION_MAX_REPLICATIONS': 5,
+    })
+    assert app.extensions['compressor'].min_size == 64
+    assert app.extensions['reference_cache'].ttl == 7
+    assert app.extensions['user_cache'].max_entries == 3
+
+    response = app.test_client().post('/api/simulation', json={'replications': 6})
+    assert response.status_code == 400
+    assert 'replications' in response.get_json()['errors']
+
+
+def test_tuned_storage_profile_puts_sqlite_in_wal_mode(tmp_path):
+    app, _ = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'tuned.db'),
+        'STORAGE_PROFILE': 'tuned',
+    })
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(db.text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_metrics_count_the_sql_each_request_runs(client):
+    assert client.get('/api/queue_data').status_code == 200
+    text = client.get('/metrics').get_data(as_text=True)
+    counted = [line for line in text.splitlines() if line.startswith('sql_statements_total{handler="http:get_queue_data"}')]
+    assert counted and float(counted[0].split()[-1]) > 0
@@ -0,0 +1,45 @@
+from werkzeug.security import generate_password_hash
+
+from backend.beds import BedAllocator
+from backend.extensions import db
+from backend.models import Bed, Department, User
+
+
+def log_in(client):
+    db.session.add(User(username='nurse', password=generate_password_hash('secret'), role='nurse'))
+    db.session.commit()
+    assert client.post('/login', json={'username': 'nurse', 'password': 'secret'}).status_code == 200
+
+
+def test_admission_takes_a_bed_in_the_patients_department(client):
+    log_in(client)
+    cardiology = Department.query.filter_by(name='Cardiology').one()
+    response = client.post('/api/admit_patient', json={
+        'name': 'Admitted', 'age': 60, 'gender': 'Female', 'hospital_id': 1, 'department_id': cardiology.id})
+    assert response.status_code == 201
+
+    bed = Bed.query.filter_by(patient_id=response.get_json()['patient_id']).one()
+    assert bed.department_id == cardiology.id and not bed.is_available
+    assert client.get(f'/api/bed_availability?department_id={cardiology.id}').get_json()['occupied'] == 1
+
+
+def test_admission_requires_a_department(client):
+    log_in(client)
+    response = client.post('/api/admit_patient', json={'name': 'Nowhere', 'age': 30, 'gender': 'Male', 'hospital_id': 1})
+    assert response.status_code == 400
+    assert 'department_id' in response.get_json()
+
+
+def test_refreshing_a_free_list_picks_up_beds_added_elsewhere(app):
+    burns = Department(name='Burns')
+    db.session.add(burns)
+    db.session.commit()
+    allocator = BedAllocator()
+    allocator.load()
+    assert allocator.availability(burns.id) == {'total': 0, 'available': 0, 'occupied': 0}
+
+    db.session.add_all([Bed(bed_number='B-1', department_id=burns.id), Bed(bed_number='B-2', department_id=burns.id)])
+    db.session.commit()
+    assert allocator.claim(burns.id) is not None
+    assert allocator.availability(burns.id) == {'total': 2, 'available': 1, 'occupied': 1}
+    assert allocator.by_department()[burns.id] == allocator.availability(burns.id)
@@ -0,0 +1,53 @@
+import time
+
+from backend.broadcast import WaitTimeBroadcaster
+
+
+class FakeSocketIO:
+    async_mode = 'threading'
+
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+def test_a_department_that_loses_its_score_is_sent_once_as_null():
+    socketio, scores = FakeSocketIO(), {1: 12.0}
+    broadcaster = WaitTimeBroadcaster(
+        socketio, lambda dirty: {d: {'department': 'Cardiology', 'wait_time': scores.get(d)} for d in dirty})
+    broadcaster.stop()  # No tick loop; the test flushes by hand
+
+    broadcaster.mark_dirty([1])
+    assert broadcaster.flush() == [{'department': 'Cardiology', 'wait_time': 12.0, 'department_id': 1}]
+
+    del scores[1]  # Last doctor went off duty
+    broadcaster.mark_dirty([1])
+    assert broadcaster.flush() == [{'department': 'Cardiology', 'wait_time': None, 'department_id': 1}]
+    broadcaster.mark_dirty([1])
+    assert broadcaster.flush() == []
+
+    scores[1] = 12.0  # Back on duty with the same figure, which clients no longer show
+    broadcaster.mark_dirty([1])
+    assert [update['wait_time'] for update in broadcaster.flush()] == [12.0]
+    assert len(socketio.emitted) == 3
+
+
+def test_stop_ends_the_tick_loop():
+    socketio = FakeSocketIO()
+    broadcaster = WaitTimeBroadcaster(socketio, lambda dirty: {d: {'wait_time': 5.0} for d in dirty}, tick=0.01)
+    broadcaster.mark_dirty([1])
+    task = broadcaster._task
+    deadline = time.time() + 5
+    while not socketio.emitted and time.time() < deadline:
+        time.sleep(0.01)
+    assert socketio.emitted
+
+    broadcaster.stop(timeout=5)
+    assert not task.is_alive()
+    broadcaster.mark_dirty([2])
+    assert broadcaster._task is None
@@ -0,0 +1,65 @@
+import gzip
+
+from backend import cache
+from backend.cache import ReferenceCache
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: clock[0])
+    reference = ReferenceCache(ttl=60)
+    loads = []
+
+    def load():
+        loads.append(clock[0])
+        return len(loads)
+
+    assert reference.get('cities', 'all', load) == 1
+    clock[0] += 59
+    assert reference.get('cities', 'all', load) == 1
+    clock[0] += 2
+    assert reference.get('cities', 'all', load) == 2
+    assert (reference.hits['cities'], reference.misses['cities']) == (1, 2)
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    reference = ReferenceCache(max_entries=2)
+    reference.get('cities', 'a', lambda: 'A')
+    reference.get('cities', 'b', lambda: 'B')
+    reference.get('cities', 'a', lambda: 'stale')  # Touch a, so b is the oldest
+    reference.get('cities', 'c', lambda: 'C')
+
+    assert reference.evictions == 1
+    assert reference.get('cities', 'a', lambda: 'reloaded') == 'A'
+    assert reference.get('cities', 'b', lambda: 'reloaded') == 'reloaded'
+
+
+def test_writes_invalidate_cached_lists(app, client):
+    stats = app.extensions['reference_cache']
+    first = client.get('/api/hospitals?city_id=1').get_json()
+    assert client.get('/api/hospitals?city_id=1').get_json() == first
+    assert stats.hits['hospitals'] == 1
+
+    client.post('/api/hospitals', json={'name': 'New General', 'address': '1 Main St', 'total_beds': 10, 'city_id': 1})
+    assert 'New General' in [hospital['name'] for hospital in client.get('/api/hospitals?city_id=1').get_json()]
+
+    hospital_id = first[0]['id']
+    client.put(f'/api/beds/{hospital_id}', json={'available_beds': 3})
+    hospitals = {hospital['id']: hospital for hospital in client.get('/api/hospitals?city_id=1').get_json()}
+    assert hospitals[hospital_id]['available_beds'] == 3
+    assert stats.misses['hospitals'] == 3
+
+
+def test_compressed_responses_revalidate_with_their_weak_etag(app, client):
+    app.extensions['compressor'].min_size = 0
+    first = client.get('/api/cities?limit=1000', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'].startswith('W/')
+    assert gzip.decompress(first.data)
+
+    repeat = client.get('/api/cities?limit=1000',
+                        headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'] == first.headers['ETag']
+    assert app.extensions['reference_cache'].not_modified == 1
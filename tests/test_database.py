@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from backend.database import SeedVolumes, seed_synthetic
+from backend.extensions import db
+from backend.models import OPDQueue, Patient
+
+
+def test_seeded_patients_wait_exactly_as_long_as_their_queue_entries(app):
+    volumes = SeedVolumes(cities=2, hospitals_per_city=2, doctors=10, beds=50, patients=2000, days=3, waiting_hours=0.25)
+    written = seed_synthetic(volumes, seed=1, now=datetime(2024, 3, 4, 12, 0))  # A busy Monday noon
+    assert written['patient'] == written['opd_queue'] == 2000
+
+    mismatched = db.session.execute(
+        db.select(db.func.count()).select_from(Patient).join(OPDQueue, OPDQueue.patient_id == Patient.id)
+        .where(Patient.status != OPDQueue.status)).scalar()
+    assert mismatched == 0
@@ -0,0 +1,34 @@
+from flask import g
+from werkzeug.security import generate_password_hash
+
+from backend.extensions import db
+from backend.models import User
+
+
+def get(client, path):
+    # Before Flask 2.2 requests reuse the fixture's app context, and with it the user Flask-Login
+    # kept on g; drop it so every request goes through the user loader, as it does in production
+    g.pop('_login_user', None)
+    return client.get(path)
+
+
+def test_a_role_change_reaches_the_next_request(app, client):
+    user = User(username='clerk', password=generate_password_hash('secret'), role='patient')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    assert client.post('/login', json={'username': 'clerk', 'password': 'secret'}).status_code == 200
+
+    assert get(client, '/api/staff_only').status_code == 403
+    assert get(client, '/api/check_login').get_json()['user']['role'] == 'patient'
+    user_cache = app.extensions['user_cache']
+    assert user_cache.hits >= 1  # The identity is being served from the cache
+
+    db.session.get(User, user_id).role = 'nurse'
+    db.session.commit()
+    assert get(client, '/api/staff_only').status_code == 200
+    assert get(client, '/api/check_login').get_json()['user']['role'] == 'nurse'
+
+    db.session.get(User, user_id).role = 'patient'
+    db.session.commit()
+    assert get(client, '/api/staff_only').status_code == 403
@@ -0,0 +1,43 @@
+from backend.models import Inventory, StockMovement
+
+
+def quantity(item_name, hospital_id=1):
+    return Inventory.query.filter_by(hospital_id=hospital_id, item_name=item_name).one().quantity
+
+
+def test_update_inventory_applies_movements_through_the_ledger(client):
+    before = quantity('Bandages')
+    response = client.post('/api/update_inventory', json={'movements': [
+        {'hospital_id': 1, 'item_name': 'Bandages', 'delta': 20, 'reason': 'receipt'},
+        {'hospital_id': 1, 'item_name': 'Bandages', 'delta': -5, 'reason': 'dispensed'},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['items'] == {'1': [{'item': 'Bandages', 'quantity': before + 15}]}
+    assert quantity('Bandages') == before + 15
+    assert [(m.delta, m.quantity_after) for m in StockMovement.query.order_by(StockMovement.id)] == \
+        [(20, before + 20), (-5, before + 15)]
+
+    # A batch that would go below zero changes nothing
+    response = client.post('/api/update_inventory', json=[
+        {'hospital_id': 1, 'item_name': 'Bandages', 'delta': -(before + 16)}])
+    assert response.status_code == 409
+    assert quantity('Bandages') == before + 15
+
+
+def test_a_batch_that_would_go_below_zero_rolls_back_every_movement(client):
+    bandages, before_movements = quantity('Bandages'), StockMovement.query.count()
+    response = client.post('/api/inventory/movements', json={'movements': [
+        {'hospital_id': 1, 'item_name': 'Bandages', 'delta': 50, 'reason': 'receipt'},
+        {'hospital_id': 1, 'item_name': 'Bandages', 'delta': -(bandages + 51), 'reason': 'dispensed'},
+    ]})
+    assert response.status_code == 409
+    errors = response.get_json()['errors']
+    assert [(e['hospital_id'], e['item_name']) for e in errors] == [(1, 'Bandages')]
+    assert quantity('Bandages') == bandages
+    assert StockMovement.query.count() == before_movements
+
+
+def test_legacy_totals_payload_is_rejected_with_a_pointer_to_movements(client):
+    response = client.post('/api/update_inventory', json={'medicines': 10, 'consumables': 20})
+    assert response.status_code == 400
+    assert 'movements' in response.get_json()['error']
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+from backend import migrations
+from backend.extensions import db
+
+# The tables the migrations touch, as the first release created them
+BASELINE_SCHEMA = [
+    'CREATE TABLE city (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL)',
+    'CREATE TABLE hospital (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, address VARCHAR(200), '
+    'total_beds INTEGER, available_beds INTEGER, city_id INTEGER NOT NULL REFERENCES city (id))',
+    'CREATE TABLE department (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE)',
+    'CREATE TABLE patient (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, age INTEGER, gender VARCHAR(10), '
+    'hospital_id INTEGER NOT NULL REFERENCES hospital (id), department_id INTEGER NOT NULL REFERENCES department (id))',
+    'CREATE TABLE opd_queue (id INTEGER PRIMARY KEY, patient_id INTEGER NOT NULL REFERENCES patient (id), '
+    'hospital_id INTEGER NOT NULL REFERENCES hospital (id), timestamp DATETIME, status VARCHAR(20))',
+    'CREATE TABLE inventory (id INTEGER PRIMARY KEY, hospital_id INTEGER NOT NULL REFERENCES hospital (id), '
+    'item_name VARCHAR(100) NOT NULL, quantity INTEGER, unit_price FLOAT)',
+    'CREATE TABLE expense (id INTEGER PRIMARY KEY, hospital_id INTEGER NOT NULL REFERENCES hospital (id), '
+    'description VARCHAR(200) NOT NULL, amount FLOAT NOT NULL, date DATE)',
+    'CREATE TABLE bed (id INTEGER PRIMARY KEY, bed_number VARCHAR(50) NOT NULL, is_available BOOLEAN, '
+    'department_id INTEGER NOT NULL REFERENCES department (id))',
+]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def baseline(engine):
+    with engine.begin() as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql("INSERT INTO city (id, name) VALUES (1, 'City')")
+        conn.exec_driver_sql("INSERT INTO hospital (id, name, city_id) VALUES (1, 'Hospital', 1)")
+        conn.exec_driver_sql("INSERT INTO department (id, name) VALUES (1, 'Emergency')")
+        conn.exec_driver_sql("INSERT INTO patient (id, name, hospital_id, department_id) VALUES (1, 'Old Patient', 1, 1)")
+        conn.exec_driver_sql("INSERT INTO inventory (hospital_id, item_name, quantity, unit_price) "
+                             "VALUES (1, 'Gloves', 10, 1.0), (1, 'Gloves', 5, 1.0)")
+        conn.exec_driver_sql("INSERT INTO expense (hospital_id, description, amount, date) "
+                             "VALUES (1, 'Rent', 100.0, '2024-03-05'), (1, 'Power', 50.0, '2024-03-20')")
+    return engine
+
+
+def test_upgrade_brings_a_baseline_database_forward(baseline):
+    assert migrations.upgrade(baseline) == [step.version for step in migrations.MIGRATIONS]
+    with baseline.connect() as conn:
+        assert migrations.current_version(conn) == migrations.MIGRATIONS[-1].version
+        columns = {column['name'] for column in inspect(conn).get_columns('patient')}
+        assert {'arrival_time', 'status'} <= columns
+        assert conn.exec_driver_sql("SELECT status FROM patient").all() == [('Waiting',)]
+        assert conn.exec_driver_sql("SELECT DISTINCT category FROM expense").all() == [('General',)]
+        assert conn.exec_driver_sql("SELECT hospital_id, month, category, total, count FROM expense_monthly").all() == \
+            [(1, '2024-03-01', 'General', 150.0, 2)]
+        assert conn.exec_driver_sql("SELECT item_name, quantity FROM inventory").all() == [('Gloves', 15)]
+        indexes = {index['name'] for index in inspect(conn).get_indexes('opd_queue')}
+        assert 'ix_opd_queue_hospital_status_timestamp' in indexes
+
+    # Every migration has been recorded, so a second run is a no-op
+    assert migrations.upgrade(baseline) == []
+
+
+def test_check_indexes_finds_an_index_for_every_hot_query(engine):
+    db.metadata.create_all(engine)
+    migrations.stamp(engine)
+    results = migrations.check_indexes(engine)
+    assert len(results) == len(migrations.HOT_QUERIES)
+    assert [name for name, plan, ok in results if not ok] == []
@@ -0,0 +1,66 @@
+from backend.extensions import db
+from backend.models import OPDQueueHourly, Patient
+
+
+def add_patient(hospital_id=1, department_id=1):
+    patient = Patient(name='Test Patient', hospital_id=hospital_id, department_id=department_id)
+    db.session.add(patient)
+    db.session.commit()
+    return patient.id
+
+
+def hourly(hospital_id=1):
+    """Arrivals, served, peak length and total wait over the hospital's hourly rows (the test may cross an hour)."""
+    return db.session.execute(
+        db.select(db.func.sum(OPDQueueHourly.arrivals), db.func.sum(OPDQueueHourly.served),
+                  db.func.max(OPDQueueHourly.peak_length), db.func.sum(OPDQueueHourly.wait_minutes_total))
+        .where(OPDQueueHourly.hospital_id == hospital_id)).one()
+
+
+def test_completing_an_entry_updates_its_hourly_bucket(client):
+    response = client.post('/api/opd/queue', json={'patient_id': add_patient(), 'hospital_id': 1})
+    assert response.status_code == 201
+    entry_id = response.get_json()['queue_number']
+    arrivals, served, peak, _ = hourly()
+    assert (arrivals, served, peak) == (1, 0, 1)
+
+    response = client.put(f'/api/opd/queue/{entry_id}', json={'status': 'Served'})
+    assert response.status_code == 200
+    arrivals, served, _, wait = hourly()
+    assert (arrivals, served) == (1, 1)
+    assert wait >= 0
+
+    history = client.get('/api/opd/queue/history?hospital_id=1').get_json()
+    assert sum(row['served'] for row in history) == 1
+    assert history[-1]['mean_wait_minutes'] is not None
+
+    # Only waiting entries can leave the queue
+    assert client.put(f'/api/opd/queue/{entry_id}', json={'status': 'Served'}).status_code == 409
+
+
+def test_serving_through_the_route_agrees_across_queue_data_and_history(app, client):
+    from backend.models import Department
+    department = db.session.get(Department, 1).name
+    snapshot = app.extensions['patient_flow'].dashboard
+
+    def waiting():
+        return next(row['waiting_patients'] for row in client.get('/api/queue_data').get_json()
+                    if row['department'] == department)
+
+    def served():
+        return sum(row['served'] for row in client.get('/api/opd/queue/history?hospital_id=1').get_json())
+
+    patient_id = add_patient()
+    entry_id = client.post('/api/opd/queue', json={'patient_id': patient_id, 'hospital_id': 1}).get_json()['queue_number']
+    snapshot.load('queue')  # The patient was added behind its back
+    waiting_before, served_before, length_before = waiting(), served(), snapshot.payload()['queue']['length']
+
+    response = client.put(f'/api/opd/queue/{entry_id}', json={'status': 'Served', 'service_minutes': 12})
+    assert response.status_code == 200
+    assert waiting() == waiting_before - 1
+    assert served() == served_before + 1
+    assert snapshot.payload()['queue']['length'] == length_before - 1
+    db.session.expire_all()
+    assert db.session.get(Patient, patient_id).status == 'Served'
+
+    assert client.put(f'/api/opd/queue/{entry_id}', json={'status': 'Served', 'service_minutes': -1}).status_code == 400
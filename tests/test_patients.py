@@ -0,0 +1,25 @@
+from backend.extensions import db
+from backend.models import OPDQueue, OPDQueueHourly, Patient
+
+
+def test_batch_registration_queues_patients_and_returns_their_ids(client):
+    queued_before = OPDQueue.query.count()
+    response = client.post('/api/patients/batch', json={'patients': [
+        {'name': 'First', 'hospital_id': 1, 'department_id': 1},
+        {'name': 'Unknown hospital', 'hospital_id': 10 ** 6, 'department_id': 1},
+        {'name': 'Second', 'hospital_id': 1, 'department_id': 2},
+    ]})
+    assert response.status_code == 201
+    summary = response.get_json()
+    assert (summary['created'], summary['rejected']) == (2, 1)
+
+    first, rejected, second = summary['results']
+    assert rejected['status'] == 'rejected' and 'patient_id' not in rejected
+    assert db.session.get(Patient, first['patient_id']).name == 'First'
+    assert db.session.get(Patient, second['patient_id']).name == 'Second'
+
+    entries = OPDQueue.query.filter(OPDQueue.patient_id.in_([first['patient_id'], second['patient_id']])).all()
+    assert {(entry.hospital_id, entry.status) for entry in entries} == {(1, 'Waiting')}
+    assert len(entries) == 2 and OPDQueue.query.count() == queued_before + 2
+    assert db.session.execute(
+        db.select(db.func.sum(OPDQueueHourly.arrivals)).where(OPDQueueHourly.hospital_id == 1)).scalar() >= 2
@@ -0,0 +1,68 @@
+import math
+
+import pytest
+
+from backend.queueing import ErlangCEngine
+
+
+def reference(servers, arrival_rate, service_rate):
+    """Textbook M/M/c wait, utilization and probability of waiting, summed in log space."""
+    load = arrival_rate / service_rate
+    rho = load / servers
+    log_terms = [k * math.log(load) - math.lgamma(k + 1) for k in range(servers)]
+    log_tail = servers * math.log(load) - math.lgamma(servers + 1) - math.log(1 - rho)
+    peak = max(log_terms + [log_tail])
+    c = math.exp(log_tail - peak) / (sum(math.exp(t - peak) for t in log_terms) + math.exp(log_tail - peak))
+    return c / (servers * service_rate - arrival_rate), rho, c
+
+
+@pytest.mark.parametrize('servers, arrival_rate, service_rate, wait, probability', [
+    (1, 0.5, 1.0, 1.0, 0.5),      # M/M/1: Wq = rho / (mu - lambda)
+    (2, 1.0, 1.0, 1 / 3, 1 / 3),  # M/M/2 at half load
+])
+def test_known_queues(servers, arrival_rate, service_rate, wait, probability):
+    metrics = ErlangCEngine().metrics(servers, arrival_rate, service_rate)
+    assert metrics.wait_time == pytest.approx(wait)
+    assert metrics.probability_of_waiting == pytest.approx(probability)
+    assert metrics.utilization == pytest.approx(arrival_rate / (servers * service_rate))
+
+
+@pytest.mark.parametrize('servers, arrival_rate, service_rate', [
+    (3, 0.15, 1 / 15), (8, 0.5, 1 / 15), (20, 1.2, 1 / 15), (500, 30.0, 1 / 15), (500, 33.2, 1 / 15),
+])
+def test_matches_the_textbook_formula_including_large_departments(servers, arrival_rate, service_rate):
+    metrics = ErlangCEngine().metrics(servers, arrival_rate, service_rate)
+    wait, rho, probability = reference(servers, arrival_rate, service_rate)
+    assert metrics.wait_time == pytest.approx(wait, rel=1e-9, abs=1e-12)
+    assert metrics.utilization == pytest.approx(rho)
+    assert metrics.probability_of_waiting == pytest.approx(probability, rel=1e-9, abs=1e-12)
+    assert 0 <= metrics.probability_of_waiting <= 1
+
+
+@pytest.mark.parametrize('servers, arrival_rate', [(2, 2 * 1 / 15), (2, 1.0), (0, 0.1)])
+def test_unstable_queues_wait_forever(servers, arrival_rate):
+    metrics = ErlangCEngine().metrics(servers, arrival_rate, 1 / 15)
+    assert math.isinf(metrics.wait_time)
+    assert metrics.probability_of_waiting == 1.0
+
+
+def test_idle_queues_do_not_wait():
+    metrics = ErlangCEngine().metrics(3, 0.0, 1 / 15)
+    assert (metrics.wait_time, metrics.utilization, metrics.probability_of_waiting) == (0.0, 0.0, 0.0)
+
+
+def test_batch_agrees_with_scalar_scoring():
+    servers = [1, 2, 3, 500, 2, 0, 4]
+    arrivals = [0.5, 1.0, 0.15, 30.0, 1.0, 0.1, 0.0]
+    rates = [1.0, 1.0, 1 / 15, 1 / 15, 1 / 15, 1 / 15, 1 / 15]
+    batch = ErlangCEngine().batch(servers, arrivals, rates)
+    scalar = ErlangCEngine()
+    assert len(batch) == len(servers)
+    for i, args in enumerate(zip(servers, arrivals, rates)):
+        assert batch[i] == scalar.metrics(*args)
+
+    # A second batch is answered from the cache with the same figures
+    cached = ErlangCEngine()
+    cached.batch(servers[:3], arrivals[:3], rates[:3])
+    again = cached.batch(servers, arrivals, rates)
+    assert [again[i] for i in range(len(servers))] == [batch[i] for i in range(len(servers))]
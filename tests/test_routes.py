@@ -0,0 +1,62 @@
+from backend.models import City
+
+
+def test_cities_are_paginated_by_keyset(client):
+    first = client.get('/api/cities?limit=3')
+    assert first.status_code == 200
+    assert [city['id'] for city in first.get_json()] == [1, 2, 3]
+    assert first.headers['X-Next-Cursor'] == '3'
+
+    second = client.get('/api/cities?limit=3&after=3')
+    assert [city['id'] for city in second.get_json()] == [4, 5, 6]
+
+    rest = client.get('/api/cities?after=6')
+    assert len(rest.get_json()) == City.query.count() - 6
+    assert 'X-Next-Cursor' not in rest.headers
+
+
+def test_hospitals_filter_and_reject_bad_limits(client):
+    response = client.get('/api/hospitals?city_id=1')
+    assert response.status_code == 200
+    assert {hospital['city_id'] for hospital in response.get_json()} == {1}
+
+    assert client.get('/api/hospitals?limit=0').status_code == 400
+
+
+def test_reference_lists_answer_matching_etags_with_304(client):
+    first = client.get('/api/cities?limit=3')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    repeat = client.get('/api/cities?limit=3', headers={'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+
+    # Adding a city invalidates the cached list, so the old ETag no longer matches
+    everything = client.get('/api/cities?limit=1000')
+    client.post('/api/cities', json={'name': 'Newtown'})
+    changed = client.get('/api/cities?limit=1000', headers={'If-None-Match': everything.headers['ETag']})
+    assert changed.status_code == 200
+    assert 'Newtown' in [city['name'] for city in changed.get_json()]
+
+    hospitals = client.get('/api/hospitals?city_id=1')
+    assert client.get('/api/hospitals?city_id=1',
+                      headers={'If-None-Match': hospitals.headers['ETag']}).status_code == 304
+
+
+def test_write_routes_keep_the_dashboard_snapshot_current(app, client):
+    snapshot = app.extensions['dashboard']
+    snapshot.load()
+    before = snapshot.payload()
+
+    response = client.post('/api/patients', json={'name': 'Walk-in', 'age': 40, 'gender': 'F',
+                                                  'hospital_id': 1, 'department_id': 1})
+    assert response.status_code == 201
+    response = client.post('/api/inventory/1', json={'item_name': 'Bandages', 'quantity': 7, 'unit_price': 2.5})
+    assert response.status_code == 200
+
+    after = snapshot.payload()
+    assert after['queue']['length'] == before['queue']['length'] + 1
+    assert after['inventory']['consumables'] == before['inventory']['consumables'] + 7
+    snapshot.load()
+    assert {k: v for k, v in snapshot.payload().items() if k != 'version'} == \
+        {k: v for k, v in after.items() if k != 'version'}
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Patient
+from backend.scheduler import WorkScheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def blocker():
+    started, release = threading.Event(), threading.Event()
+
+    def task():
+        started.set()
+        release.wait(5)
+    return task, started, release
+
+
+def test_tasks_with_a_key_run_in_order_and_shed_beyond_max_pending(app):
+    work = WorkScheduler(app, workers=2, max_pending=3)
+    ran = []
+    task, started, release = blocker()
+    assert work.submit('a', task)
+    assert started.wait(5)  # Running, so no longer pending; key 'a' is held
+
+    assert work.submit('a', ran.append, 1)
+    assert work.submit('a', ran.append, 2)
+    assert work.submit('b', ran.append, 'b')
+    assert wait_for(lambda: ran == ['b'])  # Other keys are not held up by the blocked one
+
+    assert work.submit('a', ran.append, 3)
+    assert not work.submit('a', ran.append, 4)  # Two waiting behind the blocker plus one: full
+    assert work.stats()['shed'] == 1 and work.retry_after() >= 0.5
+
+    release.set()
+    assert wait_for(lambda: len(ran) == 4)
+    assert ran == ['b', 1, 2, 3]
+
+
+def test_busy_events_and_department_ordering_reach_socket_clients(tmp_path):
+    app, socketio = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'busy.db'),
+        'AUTO_MIGRATE': True,
+        'THREAD_POOL_WORKERS': 2,
+        'WORK_QUEUE_LIMIT': 2,
+    })
+    work = app.extensions['work_scheduler']
+    task, started, release = blocker()
+    work.submit(('department', 1), task)
+    assert started.wait(5)
+
+    socket = socketio.test_client(app)
+    patient = {'name': 'First', 'hospital_id': 1, 'department_id': 1}
+    assert socket.emit('new_patient', patient, callback=True) == {'accepted': True}
+    batch = {'patients': [dict(patient, name='Second')]}
+    assert socket.emit('new_patients_batch', batch, callback=True) == {'accepted': True}
+
+    shed = socket.emit('new_patient', dict(patient, name='Third'), callback=True)
+    assert shed['accepted'] is False and shed['retry_after'] >= 0.5
+    busy = [packet['args'][0] for packet in socket.get_received() if packet['name'] == 'busy']
+    assert busy == [{'event': 'new_patient', 'retry_after': shed['retry_after']}]
+
+    with app.app_context():
+        def names():
+            db.session.remove()
+            return db.session.execute(db.select(Patient.name).where(Patient.name.in_(['First', 'Second', 'Third']))
+                                      .order_by(Patient.id)).scalars().all()
+        assert names() == []  # The batch waits behind the department's blocked key too
+        release.set()
+        assert wait_for(lambda: names() == ['First', 'Second'])
+        db.session.remove()
+        db.engine.dispose()
+    socket.disconnect()
+    app.extensions['wait_time_broadcaster'].stop()
@@ -0,0 +1,49 @@
+import time
+
+from backend.extensions import db
+from backend.models import OPDQueue, Patient
+
+
+def status(patient_id):
+    db.session.remove()
+    return db.session.get(Patient, patient_id).status
+
+
+def test_patient_served_rejects_non_positive_service_times(app):
+    patient = Patient(name='Served', hospital_id=1, department_id=1)
+    db.session.add(patient)
+    db.session.commit()
+    patient_id = patient.id  # Each socket event ends by removing this thread's session
+    socket = app.extensions['socketio'].test_client(app)
+
+    for bad in (0, -5, 'soon'):
+        ack = socket.emit('patient_served', {'patient_id': patient_id, 'service_minutes': bad}, callback=True)
+        assert ack['accepted'] is False and 'service_minutes' in ack['errors']
+    assert 'error' in [packet['name'] for packet in socket.get_received()]
+
+    ack = socket.emit('patient_served', {'patient_id': patient_id, 'service_minutes': 12.5}, callback=True)
+    assert ack == {'accepted': True}
+    deadline = time.time() + 5
+    while status(patient_id) != 'Served' and time.time() < deadline:
+        time.sleep(0.01)
+    assert status(patient_id) == 'Served'
+    socket.disconnect()
+
+
+def test_patient_served_closes_their_queue_entry(app, client):
+    patient = Patient(name='Queued', hospital_id=1, department_id=1)
+    db.session.add(patient)
+    db.session.commit()
+    patient_id = patient.id
+    entry_id = client.post('/api/opd/queue', json={'patient_id': patient_id, 'hospital_id': 1}).get_json()['queue_number']
+    served_before = sum(row['served'] for row in client.get('/api/opd/queue/history?hospital_id=1').get_json())
+    socket = app.extensions['socketio'].test_client(app)
+
+    assert socket.emit('patient_served', {'patient_id': patient_id}, callback=True) == {'accepted': True}
+    deadline = time.time() + 5
+    while status(patient_id) != 'Served' and time.time() < deadline:
+        time.sleep(0.01)
+    assert db.session.get(OPDQueue, entry_id).status == 'Served'
+    assert sum(row['served'] for row in client.get('/api/opd/queue/history?hospital_id=1').get_json()) == served_before + 1
+    assert entry_id not in [row['id'] for row in client.get('/api/opd/queue?hospital_id=1').get_json()['queue']]
+    socket.disconnect()
@@ -0,0 +1,36 @@
+from backend.extensions import db
+from backend.models import Patient
+from backend.triage import TriageQueue
+
+
+def add_patient(department_id=1):
+    patient = Patient(name='Triage Patient', hospital_id=1, department_id=department_id)
+    db.session.add(patient)
+    db.session.commit()
+    return patient.id
+
+
+def test_claims_see_entries_pushed_by_another_worker_with_lower_ids(app):
+    first, second = TriageQueue(), TriageQueue()
+    first.rebuild()
+    second.rebuild()
+
+    urgent = second.push(add_patient(), 1, priority=1).id
+    routine = first.push(add_patient(), 1, priority=5).id
+    assert urgent < routine
+
+    assert first.claim_next(1).id == urgent
+    assert first.claim_next(1).id == routine
+    assert second.claim_next(1) is None
+
+
+def test_claims_see_priority_changes_made_by_another_worker(app):
+    first, second = TriageQueue(), TriageQueue()
+    first.rebuild()
+    routine = first.push(add_patient(), 1, priority=5).id
+    soon = first.push(add_patient(), 1, priority=3).id
+    second.rebuild()
+
+    assert second.change_priority(routine, 1)
+    assert first.claim_next(1).id == routine
+    assert first.claim_next(1).id == soon